@@ -0,0 +1,176 @@
+# Estoque em qualquer data e conferência do estoque contra o histórico.
+#
+# - Retratos (snapshots): tirar_snapshot() grava a quantidade de todos os produtos e o
+#   último id do histórico incluído. Rode periodicamente (ex.: todo dia pelo cron).
+# - estoque_em(instante) parte do retrato mais recente até o instante e soma só as
+#   movimentações gravadas depois dele (quantidade_atual - quantidade_anterior). O trecho do
+#   histórico é delimitado por id: as escritas são serializadas (BEGIN IMMEDIATE), então os
+#   ids seguem a ordem de data_movimentacao e o último id até o instante sai de uma busca
+#   binária na chave primária. Movimentações que a retenção já tirou do banco são relidas
+#   dos arquivos mensais (retencao.py).
+# - verificar_estoque() relê o histórico uma vez, em ordem de id, refazendo o saldo de cada
+#   produto, e aponta quebras na sequência (quantidade_anterior diferente do saldo) e
+#   produtos cujo produtos.quantidade não bate com o histórico.
+
+from collections import namedtuple
+
+import banco
+
+# Divergência encontrada na conferência; "historico_id" é a movimentação onde a sequência
+# quebrou (None para diferenças no saldo final)
+Divergencia = namedtuple('Divergencia', 'produto_id historico_id esperado encontrado motivo')
+
+MOTIVO_SEQUENCIA = "quantidade anterior não confere com o saldo"
+MOTIVO_ESTOQUE = "estoque diferente do histórico"
+MOTIVO_AUSENTE = "produto com saldo no histórico não existe"
+MOTIVO_SEM_HISTORICO = "produto sem histórico"
+
+# Movimentações somadas por produto num trecho (id_inicial, id_final] do histórico; "acao" é
+# a da última movimentação do trecho (coluna solta com MAX no SQLite)
+SQL_DELTAS = '''
+    SELECT produto_id, SUM(quantidade_atual - quantidade_anterior), acao, MAX(id)
+    FROM historico
+    WHERE id > ? AND id <= ?{filtro}
+    GROUP BY produto_id
+'''
+
+# Função para gravar um retrato do estoque atual
+# Retorna o id do retrato, ou None se nada mudou no histórico desde o último.
+def tirar_snapshot():
+    with banco.transacao() as conn:
+        ultimo_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM historico').fetchone()[0]
+        anterior = conn.execute('SELECT ultimo_historico_id FROM snapshots ORDER BY id DESC LIMIT 1').fetchone()
+        if anterior is not None and anterior[0] == ultimo_id:
+            return None
+
+        snapshot_id = conn.execute(
+            'INSERT INTO snapshots (data, ultimo_historico_id) VALUES (?, ?)', (banco.agora(), ultimo_id),
+        ).lastrowid
+        conn.execute('''
+            INSERT INTO snapshot_estoque (snapshot_id, produto_id, quantidade)
+            SELECT ?, id, quantidade FROM produtos
+        ''', (snapshot_id,))
+    return snapshot_id
+
+# Função para listar os retratos gravados: [(id, data, ultimo_historico_id)]
+def listar_snapshots():
+    return banco.conectar_db().execute('SELECT id, data, ultimo_historico_id FROM snapshots ORDER BY data').fetchall()
+
+# Função para achar o último id do histórico com data_movimentacao <= instante
+# Busca binária entre "menor" (já conhecido como anterior ao instante) e "maior".
+def ultimo_id_ate(conn, instante, menor, maior):
+    while menor < maior:
+        meio = (menor + maior + 1) // 2
+        linha = conn.execute(
+            'SELECT id, data_movimentacao FROM historico WHERE id >= ? ORDER BY id LIMIT 1', (meio,),
+        ).fetchone()
+        if linha is None or linha[1] > instante:
+            maior = meio - 1
+        else:
+            menor = linha[0]
+    return menor
+
+# Função para obter o último id do histórico já movido para os arquivos (retencao.py)
+def ultimo_arquivado(conn):
+    return conn.execute('SELECT ultimo_arquivado_id FROM retencao_controle WHERE id = 1').fetchone()[0]
+
+# Função para achar o último id gravado até o instante, no banco ou nos arquivos
+def ultimo_id_no_instante(conn, instante):
+    arquivado = ultimo_arquivado(conn)
+    primeiro = conn.execute('SELECT data_movimentacao FROM historico WHERE id > ? ORDER BY id LIMIT 1', (arquivado,)).fetchone()
+    if arquivado and (primeiro is None or primeiro[0] > instante):
+        import retencao
+        return retencao.ultimo_id_arquivado_ate(instante)
+    maior = conn.execute('SELECT COALESCE(MAX(id), 0) FROM historico').fetchone()[0]
+    return ultimo_id_ate(conn, instante, arquivado, maior)
+
+# Função para calcular o estoque de todos os produtos (ou só de "produto_id") no instante
+# (epoch) informado. Retorna {produto_id: quantidade} com os produtos que existiam então.
+def estoque_em(instante, produto_id=None):
+    return estoque_ate_id(ultimo_id_no_instante(banco.conectar_db(), instante), produto_id)
+
+# Função para calcular o estoque depois da movimentação "fim" (id do histórico)
+# Parte do retrato mais recente que já inclui até "fim"; o trecho que saiu do banco pela
+# retenção é relido dos arquivos mensais.
+def estoque_ate_id(fim, produto_id=None):
+    conn = banco.conectar_db()
+    filtro = ' AND produto_id = ?' if produto_id is not None else ''
+    extra = [produto_id] if produto_id is not None else []
+
+    retrato = conn.execute(
+        'SELECT id, ultimo_historico_id, data FROM snapshots WHERE ultimo_historico_id <= ? ORDER BY ultimo_historico_id DESC, id DESC LIMIT 1',
+        (fim,),
+    ).fetchone()
+    if retrato is not None:
+        snapshot_id, inicio, data_retrato = retrato
+        cursor = conn.execute(
+            f'SELECT produto_id, quantidade FROM snapshot_estoque WHERE snapshot_id = ?{filtro}', [snapshot_id] + extra,
+        )
+        estoque = dict(cursor)
+    else:
+        inicio = data_retrato = 0
+        estoque = {}
+
+    arquivado = ultimo_arquivado(conn)
+    if inicio < arquivado:
+        import retencao
+        for _, movimentado, acao, anterior, atual, *_ in retencao.ler_arquivo(produto_id, data_retrato, apos_id=inicio, ate_id=min(fim, arquivado)):
+            if acao == banco.ACAO_EXCLUSAO:
+                estoque.pop(movimentado, None)
+            else:
+                estoque[movimentado] = estoque.get(movimentado, 0) + atual - anterior
+        inicio = arquivado
+
+    if inicio < fim:
+        for movimentado, delta, acao, _ in conn.execute(SQL_DELTAS.format(filtro=filtro), [inicio, fim] + extra):
+            if acao == banco.ACAO_EXCLUSAO:
+                estoque.pop(movimentado, None)
+            else:
+                estoque[movimentado] = estoque.get(movimentado, 0) + delta
+    return estoque
+
+# Função para conferir produtos.quantidade contra o histórico numa única leitura em ordem de id
+# Com "desde_snapshot" parte do último retrato e relê só as movimentações posteriores a ele;
+# sem ele, parte do retrato gravado no limite do histórico arquivado (se houver).
+# Retorna a lista de Divergencia encontradas.
+def verificar_estoque(desde_snapshot=False):
+    conn = banco.conectar_db()
+    saldos = {}
+    inicio = 0
+
+    if desde_snapshot:
+        retrato = conn.execute('SELECT id, ultimo_historico_id FROM snapshots ORDER BY id DESC LIMIT 1').fetchone()
+    else:
+        retrato = conn.execute(
+            'SELECT id, ultimo_historico_id FROM snapshots WHERE ultimo_historico_id = ? ORDER BY id DESC LIMIT 1', (ultimo_arquivado(conn),),
+        ).fetchone()
+    if retrato is not None:
+        inicio = retrato[1]
+        saldos = dict(conn.execute('SELECT produto_id, quantidade FROM snapshot_estoque WHERE snapshot_id = ?', (retrato[0],)))
+
+    divergencias = []
+    excluidos = set()
+    cursor = conn.execute(
+        'SELECT id, produto_id, acao, quantidade_anterior, quantidade_atual FROM historico WHERE id > ? ORDER BY id', (inicio,),
+    )
+    for movimentacao_id, produto_id, acao, anterior, atual in cursor:
+        saldo = saldos.get(produto_id)
+        if saldo is not None and saldo != anterior:
+            divergencias.append(Divergencia(produto_id, movimentacao_id, saldo, anterior, MOTIVO_SEQUENCIA))
+        saldos[produto_id] = atual
+        if acao == banco.ACAO_EXCLUSAO:
+            excluidos.add(produto_id)
+        else:
+            excluidos.discard(produto_id)
+
+    for produto_id, quantidade in conn.execute('SELECT id, quantidade FROM produtos ORDER BY id'):
+        saldo = saldos.pop(produto_id, None)
+        if saldo is None:
+            divergencias.append(Divergencia(produto_id, None, None, quantidade, MOTIVO_SEM_HISTORICO))
+        elif saldo != quantidade:
+            divergencias.append(Divergencia(produto_id, None, saldo, quantidade, MOTIVO_ESTOQUE))
+
+    for produto_id, saldo in sorted(saldos.items()):
+        if produto_id not in excluidos and saldo != 0:
+            divergencias.append(Divergencia(produto_id, None, saldo, None, MOTIVO_AUSENTE))
+    return divergencias
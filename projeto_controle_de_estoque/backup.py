@@ -0,0 +1,226 @@
+# Cópia de segurança do banco com as vendas rodando, pela API de backup do SQLite.
+#
+# - fazer_backup() copia o banco em passos de "paginas" páginas com uma pausa entre eles,
+#   lendo por uma conexão própria que segura uma transação de leitura durante toda a cópia.
+#   Em WAL essa leitura fixa um retrato do banco e não bloqueia as vendas: o que é gravado
+#   depois fica de fora da cópia em vez de fazê-la recomeçar do início (o que a API de
+#   backup faz quando a origem muda entre passos sem uma leitura aberta). Os passos curtos
+#   dividem o disco com as vendas. Se ainda assim a cópia recomeçar mais de
+#   REINICIOS_MAXIMOS vezes (ex.: banco fora do modo WAL), o resto é copiado num passo só;
+#   os recomeços e esse passo único ficam no manifesto e aparecem no comando backup.
+# - Cada cópia entra no manifesto da pasta com o sha256 do arquivo e a "versão dos dados"
+#   (sequências das tabelas, migração e marcas da retenção/retratos); o cron pode chamar o
+#   backup com frequência que ele não copia nada se o banco não mudou desde a última cópia.
+# - verificar_backup() confere o sha256 com o manifesto e roda PRAGMA integrity_check.
+# - restaurar_backup() verifica a cópia, guarda o banco atual (se mudou) e copia o backup
+#   por cima com a mesma API, num passo só. Pare o serviço e feche a interface antes.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import banco
+
+# Pasta das cópias e o manifesto com uma linha JSON por cópia
+DIRETORIO_BACKUPS = 'backups'
+MANIFESTO = 'manifesto.jsonl'
+
+# Páginas copiadas por passo e pausa (segundos) entre os passos
+PAGINAS_POR_PASSO = 1024
+PAUSA_ENTRE_PASSOS = 0.005
+
+# Recomeços tolerados antes de copiar o resto num passo só
+REINICIOS_MAXIMOS = 3
+
+# Cópias mantidas por banco (as mais antigas são apagadas)
+MANTER_BACKUPS = 14
+
+# Erros listados, no máximo, pelo integrity_check de uma cópia
+LIMITE_ERROS_INTEGRIDADE = 10
+
+# Bytes lidos por vez ao calcular o sha256
+BLOCO_HASH = 1 << 20
+
+# Erro interno para interromper a cópia em passos quando ela recomeça demais
+class _RecomecosDemais(Exception):
+    pass
+
+# Função para trocar a pasta das cópias
+def configurar_backups(diretorio):
+    global DIRETORIO_BACKUPS
+    DIRETORIO_BACKUPS = diretorio
+
+# Função para calcular o sha256 de um arquivo
+def sha256_arquivo(caminho):
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(BLOCO_HASH), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+# Função para obter a "versão dos dados" de um banco sem ler as tabelas
+# Toda escrita em produtos também grava no histórico (AUTOINCREMENT), então as sequências
+# mudam a cada alteração; user_version e as marcas cobrem migrações, retenção e retratos.
+# (schema_version não serve: a API de backup muda esse contador na cópia.)
+def versao_dados(conn):
+    partes = [f"migracao={conn.execute('PRAGMA user_version').fetchone()[0]}"]
+    partes += [f"{nome}={seq}" for nome, seq in conn.execute('SELECT name, seq FROM sqlite_sequence ORDER BY name')]
+    partes.append(f"retratos={conn.execute('SELECT COALESCE(MAX(id), 0) FROM snapshots').fetchone()[0]}")
+    partes.append(f"arquivado={conn.execute('SELECT ultimo_arquivado_id FROM retencao_controle WHERE id = 1').fetchone()[0]}")
+    return ';'.join(partes)
+
+# Função para ler o manifesto de uma pasta de cópias: lista de dicionários, do mais antigo
+def ler_manifesto(diretorio=None):
+    caminho = os.path.join(diretorio or DIRETORIO_BACKUPS, MANIFESTO)
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+def gravar_manifesto(diretorio, entradas):
+    caminho = os.path.join(diretorio, MANIFESTO)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        for entrada in entradas:
+            arquivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+    os.replace(caminho + '.tmp', caminho)
+
+# Função para copiar "origem" para "destino" (conexões abertas) em passos
+# A pausa fica no progress: o "sleep" do Connection.backup só vale quando o passo dá BUSY.
+# Retorna (recomeços, passo_unico): quantas vezes a cópia recomeçou porque o banco mudou no
+# meio dela e se o fim foi copiado num passo só.
+def copiar_em_passos(origem, destino, paginas, pausa):
+    estado = {'restantes': None, 'reinicios': 0}
+
+    def progresso(status, restantes, total):
+        if estado['restantes'] is not None and restantes > estado['restantes']:
+            estado['reinicios'] += 1
+            if estado['reinicios'] > REINICIOS_MAXIMOS:
+                raise _RecomecosDemais()
+        estado['restantes'] = restantes
+        if restantes and pausa:
+            time.sleep(pausa)
+
+    if paginas > 0:
+        try:
+            origem.backup(destino, pages=paginas, progress=progresso)
+            return estado['reinicios'], False
+        except _RecomecosDemais:
+            pass
+    origem.backup(destino)
+    return estado['reinicios'], paginas > 0
+
+# Função para fazer uma cópia do banco atual na pasta de cópias
+# Sem "forcar", não copia nada se a versão dos dados for a mesma da última cópia deste banco.
+# Retorna a entrada gravada no manifesto, ou None se a cópia foi pulada.
+def fazer_backup(diretorio=None, paginas=PAGINAS_POR_PASSO, pausa=PAUSA_ENTRE_PASSOS, forcar=False, manter=MANTER_BACKUPS):
+    diretorio = diretorio or DIRETORIO_BACKUPS
+    conn = banco.conectar_db()
+    origem = os.path.splitext(os.path.basename(banco.caminho_atual()))[0]
+    versao = versao_dados(conn)
+
+    entradas = ler_manifesto(diretorio)
+    anteriores = [entrada for entrada in entradas if entrada['origem'] == origem]
+    if not forcar and anteriores and anteriores[-1]['versao_dados'] == versao:
+        return None
+
+    os.makedirs(diretorio, exist_ok=True)
+    nome = f"{origem}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db"
+    caminho = os.path.join(diretorio, nome)
+    parcial = caminho + '.parcial'
+
+    inicio = time.perf_counter()
+    # A leitura aberta em "fonte" fixa o retrato copiado: as escritas das outras conexões
+    # (inclusive as desta thread, por conectar_db) não fazem a cópia recomeçar
+    fonte = banco.abrir_conexao(banco.caminho_atual())
+    destino = sqlite3.connect(parcial, isolation_level=None)
+    try:
+        fonte.execute('BEGIN')
+        fonte.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        try:
+            reinicios, passo_unico = copiar_em_passos(fonte, destino, paginas, pausa)
+        finally:
+            fonte.execute('COMMIT')
+        # A cópia herda o modo WAL; em DELETE ela fica num arquivo só, que o sha256 cobre
+        destino.execute('PRAGMA journal_mode = DELETE')
+        versao = versao_dados(destino)
+        paginas_copiadas = destino.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        destino.close()
+        fonte.close()
+    os.replace(parcial, caminho)
+
+    entrada = {
+        'arquivo': nome,
+        'origem': origem,
+        'data': banco.agora(),
+        'sha256': sha256_arquivo(caminho),
+        'bytes': os.path.getsize(caminho),
+        'paginas': paginas_copiadas,
+        'versao_dados': versao,
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'reinicios': reinicios,
+        'passo_unico': passo_unico,
+    }
+    entradas.append(entrada)
+    anteriores.append(entrada)
+
+    descartadas = anteriores[:-manter] if manter else []
+    for antiga in descartadas:
+        try:
+            os.remove(os.path.join(diretorio, antiga['arquivo']))
+        except FileNotFoundError:
+            pass
+    gravar_manifesto(diretorio, [e for e in entradas if e not in descartadas])
+    return entrada
+
+# Função para conferir uma cópia: sha256 do manifesto e PRAGMA integrity_check
+# Retorna a lista de problemas encontrados (vazia se a cópia está boa).
+def verificar_backup(caminho):
+    diretorio, nome = os.path.split(caminho)
+    if not os.path.exists(caminho):
+        return [f"{caminho} não existe"]
+
+    problemas = []
+    entrada = next((e for e in reversed(ler_manifesto(diretorio or '.')) if e['arquivo'] == nome), None)
+    if entrada is None:
+        problemas.append("cópia fora do manifesto (sha256 não conferido)")
+    elif sha256_arquivo(caminho) != entrada['sha256']:
+        problemas.append("sha256 diferente do gravado no manifesto")
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(caminho)}?mode=ro", uri=True)
+    try:
+        resultado = [linha[0] for linha in conn.execute(f'PRAGMA integrity_check({LIMITE_ERROS_INTEGRIDADE})')]
+    except sqlite3.DatabaseError as erro:
+        resultado = [str(erro)]
+    finally:
+        conn.close()
+    if resultado != ['ok']:
+        problemas += resultado
+    return problemas
+
+# Função para listar as cópias da pasta: [(caminho, entrada do manifesto)], da mais antiga
+def listar_backups(diretorio=None):
+    diretorio = diretorio or DIRETORIO_BACKUPS
+    return [(os.path.join(diretorio, entrada['arquivo']), entrada) for entrada in ler_manifesto(diretorio)]
+
+# Função para restaurar uma cópia sobre o banco atual
+# A cópia é verificada antes (ValueError com os problemas, se houver) e, com "guardar_atual",
+# o banco atual ganha uma cópia antes de ser sobrescrito (pulada se não mudou).
+# Retorna a entrada da cópia de segurança do banco atual, ou None.
+def restaurar_backup(caminho, guardar_atual=True, diretorio=None):
+    problemas = verificar_backup(caminho)
+    if problemas:
+        raise ValueError(f"Cópia {caminho} com problemas: " + '; '.join(problemas))
+
+    guardada = fazer_backup(diretorio, paginas=-1) if guardar_atual else None
+
+    fonte = sqlite3.connect(f"file:{os.path.abspath(caminho)}?mode=ro", uri=True)
+    try:
+        fonte.backup(banco.conectar_db())
+    finally:
+        fonte.close()
+    banco.criar_tabela()
+    return guardada
@@ -0,0 +1,621 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import instrumentacao
+
+# Caminho do banco de dados SQLite usado pela aplicação
+CAMINHO_DB = 'mercadinho.db'
+
+# Pragmas aplicados a cada conexão nova:
+# - auto_vacuum incremental (só vale para bancos novos, antes da primeira tabela) deixa a
+#   retenção devolver o espaço do histórico arquivado aos poucos (retencao.py)
+# - WAL permite leituras enquanto outra conexão escreve
+# - synchronous NORMAL só faz fsync no checkpoint do WAL, não a cada commit
+# - cache de 64 MiB, mmap de 256 MiB e tabelas temporárias em memória
+PRAGMAS = (
+    'PRAGMA auto_vacuum = INCREMENTAL',
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# Quantidade de comandos preparados mantidos em cache por conexão
+COMANDOS_EM_CACHE = 256
+
+# Ações gravadas no histórico
+ACAO_CRIACAO = "Produto criado"
+ACAO_ATUALIZACAO = "Produto atualizado"
+ACAO_VENDA = "Venda simulada"
+ACAO_VENDA_LOTE = "Venda em lote"
+ACAO_IMPORTACAO = "Produto importado"
+ACAO_EXCLUSAO = "Produto excluído"
+ACAO_PONTO_REPOSICAO = "Ponto de reposição alterado"
+
+# Ações que representam saída por venda (usadas nos relatórios)
+ACOES_VENDA = (ACAO_VENDA, ACAO_VENDA_LOTE)
+
+# Limite de parâmetros por consulta "IN (...)" (o SQLite antigo aceita no máximo 999)
+TAMANHO_BLOCO_IN = 900
+
+SQL_INSERIR_HISTORICO = '''
+    INSERT INTO historico (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Linha de um lote que não foi aplicada e o motivo
+LinhaRejeitada = namedtuple('LinhaRejeitada', 'posicao produto_id quantidade motivo')
+
+# Erro para movimentações de um produto que não existe (mais)
+class ProdutoNaoEncontrado(Exception):
+    def __init__(self, produto_id):
+        super().__init__(f"Produto ID {produto_id} não encontrado!")
+        self.produto_id = produto_id
+
+# Erro para cadastro com algum campo em branco
+class CamposVazios(ValueError):
+    def __init__(self):
+        super().__init__("Todos os campos devem ser preenchidos!")
+
+# Erro para saídas maiores que o estoque disponível
+class EstoqueInsuficiente(Exception):
+    def __init__(self, produto_id, disponivel, solicitado):
+        super().__init__("Quantidade vendida é maior que a disponível!")
+        self.produto_id = produto_id
+        self.disponivel = disponivel
+        self.solicitado = solicitado
+
+_log = logging.getLogger(__name__)
+
+_local = threading.local()
+_conexoes_abertas = []
+_trava_conexoes = threading.Lock()
+_observadores = []
+
+# Função para trocar o arquivo do banco de dados (ex.: benchmarks e testes manuais)
+def configurar_banco(caminho):
+    global CAMINHO_DB
+    CAMINHO_DB = caminho
+
+# Função para obter o arquivo do banco usado pela thread atual
+def caminho_atual():
+    return getattr(_local, 'caminho', None) or CAMINHO_DB
+
+# Gerenciador de contexto para a thread atual usar outro arquivo de banco (ex.: uma filial)
+# Tudo o que chama conectar_db() dentro do bloco lê e grava nesse arquivo; as outras
+# threads continuam no banco configurado.
+@contextmanager
+def usar_banco(caminho):
+    anterior = getattr(_local, 'caminho', None)
+    _local.caminho = caminho
+    try:
+        yield
+    finally:
+        _local.caminho = anterior
+
+# Função para abrir uma conexão nova já com os pragmas ajustados
+# A conexão fica em modo autocommit; escritas agrupadas usam transacao().
+def abrir_conexao(caminho):
+    conn = sqlite3.connect(caminho, cached_statements=COMANDOS_EM_CACHE, check_same_thread=False, isolation_level=None,
+                           factory=instrumentacao.classe_conexao())
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Função para conectar ao banco de dados SQLite
+# Cada thread mantém uma única conexão de longa duração por arquivo, reaproveitada
+# em todas as chamadas; não feche a conexão devolvida, use fechar_conexoes().
+def conectar_db():
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+
+    caminho = caminho_atual()
+    conn = conexoes.get(caminho)
+    if conn is None:
+        conn = abrir_conexao(caminho)
+        conexoes[caminho] = conn
+        with _trava_conexoes:
+            _conexoes_abertas.append((conexoes, caminho, conn))
+    return conn
+
+# Função para fechar todas as conexões abertas (ao encerrar a aplicação)
+def fechar_conexoes():
+    with _trava_conexoes:
+        abertas = list(_conexoes_abertas)
+        _conexoes_abertas.clear()
+    for conexoes, caminho, conn in abertas:
+        conexoes.pop(caminho, None)
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+# Gerenciador de contexto para uma transação de escrita
+# BEGIN IMMEDIATE reserva a escrita logo no início, então a leitura-verificação-escrita
+# dentro do bloco não pode ser intercalada com a de outro terminal. Chamadas aninhadas
+# reaproveitam a transação já aberta e tudo é gravado num único COMMIT.
+@contextmanager
+def transacao():
+    conn = conectar_db()
+    if conn.in_transaction:
+        yield conn
+        return
+
+    caminho = caminho_atual()
+    conn.execute('BEGIN IMMEDIATE')
+    _local.alteracoes = {}
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        _local.alteracoes = {}
+        raise
+    conn.execute('COMMIT')
+
+    # A transação já foi gravada: a falha de um observador é registrada no log e não
+    # chega a quem chamou, que trataria a escrita como perdida
+    alteracoes, _local.alteracoes = _local.alteracoes, {}
+    if alteracoes:
+        for funcao in list(_observadores):
+            try:
+                funcao(caminho, alteracoes)
+            except Exception:
+                _log.exception("Falha no observador %r após o COMMIT", funcao)
+
+# Gerenciador de contexto para um trecho que pode ser desfeito sem abortar a transação aberta
+# Usado dentro de transacao(): se o bloco falhar, só as suas escritas (e as alterações que
+# ele anotou para os observadores) são descartadas e o erro segue para quem chamou.
+@contextmanager
+def ponto_salvamento(nome='operacao'):
+    conn = conectar_db()
+    anotadas = getattr(_local, 'alteracoes', None) or {}
+    alteracoes = {produto_id: None if campos is None else dict(campos) for produto_id, campos in anotadas.items()}
+    conn.execute(f'SAVEPOINT {nome}')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute(f'ROLLBACK TO {nome}')
+        conn.execute(f'RELEASE {nome}')
+        _local.alteracoes = alteracoes
+        raise
+    conn.execute(f'RELEASE {nome}')
+
+# Função para ser avisado, após cada COMMIT, dos produtos alterados na transação
+# A função recebe o caminho do banco e um dicionário {produto_id: campos alterados},
+# com None para produtos removidos.
+def observar_produtos(funcao):
+    _observadores.append(funcao)
+
+def remover_observador(funcao):
+    if funcao in _observadores:
+        _observadores.remove(funcao)
+
+# Função para anotar a alteração de um produto na transação corrente
+# "campos" traz só o que mudou (ex.: {'quantidade': 3}); None indica remoção.
+def registrar_alteracao(produto_id, campos):
+    alteracoes = getattr(_local, 'alteracoes', None)
+    if alteracoes is None:
+        return
+    if campos is None or alteracoes.get(produto_id, {}) is None:
+        alteracoes[produto_id] = None if campos is None else dict(campos)
+    else:
+        alteracoes.setdefault(produto_id, {}).update(campos)
+
+# Migração 1: tabelas originais do aplicativo
+def migracao_tabelas_iniciais(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            preco REAL NOT NULL,
+            quantidade INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS historico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER,
+            acao TEXT,
+            quantidade_anterior INTEGER,
+            quantidade_atual INTEGER,
+            preco_anterior REAL,
+            preco_atual REAL,
+            data_movimentacao TEXT,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id)
+        )
+    ''')
+
+# Migração 2: data_movimentacao passa de texto em hora local para epoch inteiro (UTC)
+def migracao_data_epoch(conn):
+    conn.execute('''
+        CREATE TABLE historico_nova (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER,
+            acao TEXT,
+            quantidade_anterior INTEGER,
+            quantidade_atual INTEGER,
+            preco_anterior REAL,
+            preco_atual REAL,
+            data_movimentacao INTEGER,
+            FOREIGN KEY (produto_id) REFERENCES produtos(id)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO historico_nova
+        SELECT id, produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual,
+               CAST(strftime('%s', data_movimentacao, 'utc') AS INTEGER)
+        FROM historico
+    ''')
+    conn.execute('DROP TABLE historico')
+    conn.execute('ALTER TABLE historico_nova RENAME TO historico')
+
+# Migração 3: índices para o histórico por produto e para a busca por nome
+def migracao_indices(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_historico_produto_data ON historico (produto_id, data_movimentacao)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos (nome)')
+
+# Migração 4: índice de texto (FTS5 trigram) para busca por trecho do nome, índice sem
+# distinção de maiúsculas para busca por prefixo e índices para os filtros de preço e estoque
+def migracao_busca(conn):
+    conn.execute('DROP INDEX IF EXISTS idx_produtos_nome')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_produtos_nome_nocase ON produtos (nome COLLATE NOCASE)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_produtos_preco ON produtos (preco)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_produtos_quantidade ON produtos (quantidade)')
+
+    # SQLite compilado sem FTS5: a busca por trecho cai para LIKE sem índice
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE produtos_fts USING fts5(nome, content='produtos', content_rowid='id', tokenize='trigram')
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    conn.execute('''
+        CREATE TRIGGER produtos_fts_insert AFTER INSERT ON produtos BEGIN
+            INSERT INTO produtos_fts (rowid, nome) VALUES (new.id, new.nome);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER produtos_fts_delete AFTER DELETE ON produtos BEGIN
+            INSERT INTO produtos_fts (produtos_fts, rowid, nome) VALUES ('delete', old.id, old.nome);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER produtos_fts_update AFTER UPDATE OF nome ON produtos BEGIN
+            INSERT INTO produtos_fts (produtos_fts, rowid, nome) VALUES ('delete', old.id, old.nome);
+            INSERT INTO produtos_fts (rowid, nome) VALUES (new.id, new.nome);
+        END
+    ''')
+    conn.execute("INSERT INTO produtos_fts (produtos_fts) VALUES ('rebuild')")
+
+# Migração 5: resumo diário por produto (vendas, receita e estoque de fechamento),
+# alimentado a partir do histórico usando o último id já processado como marca d'água
+def migracao_resumo_diario(conn):
+    conn.execute('''
+        CREATE TABLE resumo_diario (
+            produto_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            unidades_vendidas INTEGER NOT NULL DEFAULT 0,
+            receita REAL NOT NULL DEFAULT 0,
+            estoque_fechamento INTEGER,
+            ultimo_historico_id INTEGER NOT NULL,
+            PRIMARY KEY (produto_id, dia)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX idx_resumo_diario_dia ON resumo_diario (dia)')
+    conn.execute('''
+        CREATE TABLE resumo_controle (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_historico_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT INTO resumo_controle (id, ultimo_historico_id) VALUES (1, 0)')
+
+# Migração 6: retratos (snapshots) periódicos do estoque de todos os produtos, com o último
+# id do histórico já incluído em cada um (auditoria.py)
+def migracao_snapshots(conn):
+    conn.execute('''
+        CREATE TABLE snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data INTEGER NOT NULL,
+            ultimo_historico_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_snapshots_data ON snapshots (data)')
+    conn.execute('''
+        CREATE TABLE snapshot_estoque (
+            snapshot_id INTEGER NOT NULL,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_id, produto_id)
+        ) WITHOUT ROWID
+    ''')
+
+# Migração 7: controle da retenção do histórico (último id já movido para os arquivos
+# mensais, retencao.py)
+def migracao_retencao(conn):
+    conn.execute('''
+        CREATE TABLE retencao_controle (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_arquivado_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT INTO retencao_controle (id, ultimo_arquivado_id) VALUES (1, 0)')
+
+# Migração 8: ponto de reposição por produto (NULL = padrão do reposicao.py)
+def migracao_ponto_reposicao(conn):
+    conn.execute('ALTER TABLE produtos ADD COLUMN ponto_reposicao INTEGER')
+
+# Migração 9: pasta dos arquivos mensais de cada banco (NULL = ainda não arquivou nada)
+def migracao_diretorio_arquivo(conn):
+    conn.execute('ALTER TABLE retencao_controle ADD COLUMN diretorio_arquivo TEXT')
+
+# Migrações do esquema, em ordem; PRAGMA user_version guarda quantas já foram aplicadas.
+# Nunca altere uma migração publicada, acrescente uma nova no fim da lista.
+MIGRACOES = (
+    migracao_tabelas_iniciais,
+    migracao_data_epoch,
+    migracao_indices,
+    migracao_busca,
+    migracao_resumo_diario,
+    migracao_snapshots,
+    migracao_retencao,
+    migracao_ponto_reposicao,
+    migracao_diretorio_arquivo,
+)
+
+# Função para atualizar o esquema do banco no próprio arquivo, uma migração por transação
+def migrar_banco():
+    conn = conectar_db()
+    versao = conn.execute('PRAGMA user_version').fetchone()[0]
+    for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+        with transacao() as conn:
+            migracao(conn)
+            conn.execute(f'PRAGMA user_version = {numero}')
+    if versao < len(MIGRACOES):
+        conn.execute('ANALYZE')
+
+# Função para criar as tabelas se não existirem e aplicar as migrações pendentes
+def criar_tabela():
+    migrar_banco()
+
+# Função para obter o instante atual no formato gravado em data_movimentacao
+def agora():
+    return int(time.time())
+
+# Função para formatar uma data_movimentacao (epoch) em hora local para exibição
+def formatar_data(data_movimentacao):
+    return datetime.fromtimestamp(data_movimentacao).strftime('%Y-%m-%d %H:%M:%S')
+
+# Função para converter uma data AAAA-MM-DD (meia-noite local) em epoch
+# "dias" desloca a data, ex.: dias=1 dá o início do dia seguinte (fim exclusivo de um intervalo).
+def interpretar_data(texto, dias=0):
+    try:
+        data = datetime.strptime(texto.strip(), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Data inválida: {texto} (use AAAA-MM-DD)") from None
+    return int((data + timedelta(days=dias)).timestamp())
+
+# Função para carregar os produtos da tabela
+def carregar_produtos():
+    conn = conectar_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM produtos')
+    return cursor.fetchall()
+
+# Função para carregar o histórico do produto
+def carregar_historico(produto_id):
+    conn = conectar_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM historico WHERE produto_id = ? ORDER BY data_movimentacao, id', (produto_id,))
+    return cursor.fetchall()
+
+# Função para adicionar uma movimentação ao histórico
+def adicionar_historico(produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual):
+    data_movimentacao = agora()
+    with transacao() as conn:
+        conn.execute(SQL_INSERIR_HISTORICO, (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao))
+
+# Função para registrar uma movimentação de estoque (delta negativo é saída)
+# Atualização e histórico entram no mesmo COMMIT; a saída só acontece se ainda houver
+# estoque no momento do UPDATE, então duas vendas simultâneas nunca deixam o saldo negativo.
+def registrar_movimento(produto_id, delta, acao):
+    with transacao() as conn:
+        resultado = conn.execute('SELECT quantidade, preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()
+        if resultado is None:
+            raise ProdutoNaoEncontrado(produto_id)
+        quantidade_anterior, preco = resultado
+
+        cursor = conn.execute(
+            'UPDATE produtos SET quantidade = quantidade + ? WHERE id = ? AND quantidade + ? >= 0',
+            (delta, produto_id, delta),
+        )
+        if cursor.rowcount == 0:
+            raise EstoqueInsuficiente(produto_id, quantidade_anterior, -delta)
+
+        quantidade_atual = quantidade_anterior + delta
+        adicionar_historico(produto_id, acao, quantidade_anterior, quantidade_atual, preco, preco)
+        registrar_alteracao(produto_id, {'quantidade': quantidade_atual})
+    return quantidade_atual
+
+# Função para listar os produtos com movimentação no histórico depois do id "ultimo"
+# Quem guarda produtos em memória (cache_produtos, reposicao) a chama, numa transação de
+# leitura, quando o PRAGMA data_version acusa escrita de outra conexão: toda escrita em
+# produtos grava no histórico, então basta reler esses produtos. As escritas deste processo
+# também aparecem (o data_version não separa as nossas das de fora) e são relidas junto.
+# Retorna (maior id do histórico, ids dos produtos), ou (maior id, None) se o histórico
+# voltou atrás (ex.: backup restaurado) e é preciso recarregar tudo.
+def produtos_movimentados(conn, ultimo):
+    maior = conn.execute('SELECT COALESCE(MAX(id), 0) FROM historico').fetchone()[0]
+    if maior < ultimo:
+        return maior, None
+    cursor = conn.execute('SELECT DISTINCT produto_id FROM historico WHERE id > ? AND id <= ?', (ultimo, maior))
+    return maior, [linha[0] for linha in cursor]
+
+# Função para carregar quantidade e preço de vários produtos de uma vez
+def carregar_estoque(conn, produto_ids):
+    produto_ids = list(produto_ids)
+    estoque = {}
+    for inicio in range(0, len(produto_ids), TAMANHO_BLOCO_IN):
+        bloco = produto_ids[inicio:inicio + TAMANHO_BLOCO_IN]
+        marcadores = ', '.join('?' * len(bloco))
+        cursor = conn.execute(f'SELECT id, quantidade, preco FROM produtos WHERE id IN ({marcadores})', bloco)
+        for produto_id, quantidade, preco in cursor:
+            estoque[produto_id] = [quantidade, preco]
+    return estoque
+
+# Função para aplicar um lote de vendas (pares produto_id, quantidade), ex.: um dia de cupons do PDV
+# O lote inteiro é validado em memória e gravado numa única transação com executemany:
+# um UPDATE por produto com o saldo final e todas as linhas do histórico de uma vez.
+# Linhas inválidas ou sem estoque são rejeitadas sem impedir as demais.
+# Retorna a quantidade de linhas aplicadas e a lista de LinhaRejeitada, na ordem das linhas.
+def registrar_vendas_em_lote(linhas, acao=ACAO_VENDA_LOTE):
+    data_movimentacao = agora()
+    rejeitadas = []
+    historico = []
+
+    # Linhas que não são um par (produto_id, quantidade) com id inteiro são recusadas antes
+    # de consultar o banco (ex.: lotes recebidos pelo serviço em JSON)
+    validas = []
+    for posicao, linha in enumerate(linhas):
+        try:
+            produto_id, quantidade = linha
+        except (TypeError, ValueError):
+            rejeitadas.append(LinhaRejeitada(posicao, None, None, "Linha inválida"))
+            continue
+        if isinstance(produto_id, bool) or not isinstance(produto_id, int):
+            rejeitadas.append(LinhaRejeitada(posicao, produto_id, quantidade, "Produto inválido"))
+            continue
+        validas.append((posicao, produto_id, quantidade))
+
+    with transacao() as conn:
+        estoque = carregar_estoque(conn, {produto_id for _, produto_id, _ in validas})
+
+        for posicao, produto_id, quantidade in validas:
+            produto = estoque.get(produto_id)
+            if produto is None:
+                rejeitadas.append(LinhaRejeitada(posicao, produto_id, quantidade, "Produto não encontrado"))
+                continue
+            if isinstance(quantidade, bool) or not isinstance(quantidade, int) or quantidade <= 0:
+                rejeitadas.append(LinhaRejeitada(posicao, produto_id, quantidade, "Quantidade inválida"))
+                continue
+            quantidade_anterior, preco = produto
+            if quantidade > quantidade_anterior:
+                rejeitadas.append(LinhaRejeitada(posicao, produto_id, quantidade, "Estoque insuficiente"))
+                continue
+
+            produto[0] = quantidade_anterior - quantidade
+            historico.append((produto_id, acao, quantidade_anterior, produto[0], preco, preco, data_movimentacao))
+
+        alterados = {linha[0] for linha in historico}
+        conn.executemany('UPDATE produtos SET quantidade = ? WHERE id = ?', ((estoque[produto_id][0], produto_id) for produto_id in alterados))
+        conn.executemany(SQL_INSERIR_HISTORICO, historico)
+        for produto_id in alterados:
+            registrar_alteracao(produto_id, {'quantidade': estoque[produto_id][0]})
+
+    rejeitadas.sort(key=lambda rejeitada: rejeitada.posicao)
+    return len(historico), rejeitadas
+
+# Função para aplicar vários movimentos (produto_id, delta, acao) numa única transação
+# Usada na gravação em grupo (gravador.py e serviço de estoque): cada movimento é conferido
+# na ordem, como em registrar_movimento, contra o saldo já ajustado pelos anteriores, e tudo
+# é gravado com executemany. Retorna, na ordem dos movimentos, a nova quantidade ou a
+# exceção que registrar_movimento teria lançado (o movimento recusado não é gravado).
+def aplicar_movimentos(movimentos):
+    movimentos = list(movimentos)
+    data_movimentacao = agora()
+    resultados = []
+    historico = []
+
+    with transacao() as conn:
+        estoque = carregar_estoque(conn, {produto_id for produto_id, _, _ in movimentos})
+
+        for produto_id, delta, acao in movimentos:
+            produto = estoque.get(produto_id)
+            if produto is None:
+                resultados.append(ProdutoNaoEncontrado(produto_id))
+                continue
+            quantidade_anterior, preco = produto
+            if quantidade_anterior + delta < 0:
+                resultados.append(EstoqueInsuficiente(produto_id, quantidade_anterior, -delta))
+                continue
+
+            produto[0] = quantidade_anterior + delta
+            historico.append((produto_id, acao, quantidade_anterior, produto[0], preco, preco, data_movimentacao))
+            resultados.append(produto[0])
+
+        alterados = {linha[0] for linha in historico}
+        conn.executemany('UPDATE produtos SET quantidade = ? WHERE id = ?', ((estoque[produto_id][0], produto_id) for produto_id in alterados))
+        conn.executemany(SQL_INSERIR_HISTORICO, historico)
+        for produto_id in alterados:
+            registrar_alteracao(produto_id, {'quantidade': estoque[produto_id][0]})
+
+    return resultados
+
+# Função para validar e converter os campos de um produto (tela de cadastro e importação)
+# Lança CamposVazios se faltar algum campo e ValueError se preço/quantidade forem inválidos.
+def validar_produto(nome, preco, quantidade):
+    nome, preco, quantidade = ('' if valor is None else str(valor) for valor in (nome, preco, quantidade))
+    if not nome or not preco or not quantidade:
+        raise CamposVazios()
+
+    try:
+        return nome, float(preco), int(quantidade)
+    except ValueError:
+        raise ValueError("Preço deve ser um número e Quantidade deve ser um inteiro!") from None
+
+# Função para cadastrar um produto junto com o histórico de criação
+def criar_produto(nome, preco, quantidade):
+    with transacao() as conn:
+        cursor = conn.execute('INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)', (nome, preco, quantidade))
+        produto_id = cursor.lastrowid
+        adicionar_historico(produto_id, ACAO_CRIACAO, 0, quantidade, preco, preco)
+        registrar_alteracao(produto_id, {'nome': nome, 'preco': preco, 'quantidade': quantidade})
+    return produto_id
+
+# Função para alterar nome, preço e quantidade de um produto registrando o histórico
+def editar_produto(produto_id, nome, preco, quantidade):
+    with transacao() as conn:
+        resultado = conn.execute('SELECT quantidade, preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()
+        if resultado is None:
+            raise ProdutoNaoEncontrado(produto_id)
+        quantidade_anterior, preco_anterior = resultado
+
+        conn.execute('UPDATE produtos SET nome = ?, preco = ?, quantidade = ? WHERE id = ?', (nome, preco, quantidade, produto_id))
+        adicionar_historico(produto_id, ACAO_ATUALIZACAO, quantidade_anterior, quantidade, preco_anterior, preco)
+        registrar_alteracao(produto_id, {'nome': nome, 'preco': preco, 'quantidade': quantidade})
+
+# Função para excluir um produto
+# A exclusão entra no histórico (quantidade vai a zero) para o estoque poder ser
+# reconstruído em qualquer data a partir das movimentações.
+def excluir_produto(produto_id):
+    with transacao() as conn:
+        resultado = conn.execute('SELECT quantidade, preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()
+        conn.execute('DELETE FROM produtos WHERE id = ?', (produto_id,))
+        if resultado is not None:
+            adicionar_historico(produto_id, ACAO_EXCLUSAO, resultado[0], 0, resultado[1], resultado[1])
+        registrar_alteracao(produto_id, None)
+
+# Função para definir o ponto de reposição de um produto (None volta ao padrão)
+# A alteração entra no histórico sem mudar a quantidade, para outros processos que
+# acompanham o histórico (reposicao.py) perceberem o novo ponto.
+def definir_ponto_reposicao(produto_id, ponto):
+    if ponto is not None and (not isinstance(ponto, int) or ponto < 0):
+        raise ValueError("Ponto de reposição deve ser um inteiro maior ou igual a zero!")
+    with transacao() as conn:
+        resultado = conn.execute('SELECT quantidade, preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()
+        if resultado is None:
+            raise ProdutoNaoEncontrado(produto_id)
+        quantidade, preco = resultado
+
+        conn.execute('UPDATE produtos SET ponto_reposicao = ? WHERE id = ?', (ponto, produto_id))
+        adicionar_historico(produto_id, ACAO_PONTO_REPOSICAO, quantidade, quantidade, preco, preco)
+        registrar_alteracao(produto_id, {'ponto_reposicao': ponto})
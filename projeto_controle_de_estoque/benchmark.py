@@ -0,0 +1,825 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import backup
+import banco
+import busca
+import cliente
+import graficos
+import gravador
+import historico
+import relatorio
+import reposicao
+import resumo
+
+# Função para popular um banco novo com produtos sintéticos
+# Os produtos entram antes das demais migrações, que montam índices e FTS de uma vez.
+def popular_banco(caminho, total_produtos):
+    banco.configurar_banco(caminho)
+    with banco.transacao() as conn:
+        banco.migracao_tabelas_iniciais(conn)
+        conn.execute('PRAGMA user_version = 1')
+        conn.executemany(
+            'INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)',
+            ((f"Produto {i}", 1.0 + i % 100, 10 ** 9) for i in range(total_produtos)),
+        )
+    banco.criar_tabela()
+    banco.fechar_conexoes()
+
+# Venda no formato antigo: uma conexão nova por função, sem pragmas, dois commits
+def venda_conexao_por_chamada(caminho, produto_id):
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    cursor.execute('SELECT quantidade FROM produtos WHERE id = ?', (produto_id,))
+    quantidade_atual = cursor.fetchone()[0]
+    cursor.execute('UPDATE produtos SET quantidade = ? WHERE id = ?', (quantidade_atual - 1, produto_id))
+    conn.commit()
+    preco = cursor.execute('SELECT preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()[0]
+
+    conn_historico = sqlite3.connect(caminho)
+    conn_historico.execute('''
+        INSERT INTO historico (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (produto_id, "Venda simulada", quantidade_atual, quantidade_atual - 1, preco, preco, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    conn_historico.commit()
+    conn_historico.close()
+    conn.close()
+
+# Venda usando a conexão de longa duração e uma única transação por movimento
+def venda_conexao_persistente(caminho, produto_id):
+    banco.registrar_movimento(produto_id, -1, banco.ACAO_VENDA)
+
+# Função para medir operações por segundo de uma função de venda
+def medir(funcao, caminho, operacoes, total_produtos):
+    inicio = time.perf_counter()
+    for i in range(operacoes):
+        funcao(caminho, 1 + i % total_produtos)
+    return operacoes / (time.perf_counter() - inicio)
+
+# Benchmark: conexão por chamada (antes) x conexão persistente com WAL (depois)
+def benchmark_conexao(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        antes = os.path.join(pasta, 'antes.db')
+        depois = os.path.join(pasta, 'depois.db')
+
+        popular_banco(antes, args.produtos)
+        # O banco "antes" volta ao journal padrão, como um mercadinho.db antigo
+        conn = sqlite3.connect(antes)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+        popular_banco(depois, args.produtos)
+
+        ops_antes = medir(venda_conexao_por_chamada, antes, args.operacoes, args.produtos)
+
+        banco.configurar_banco(depois)
+        ops_depois = medir(venda_conexao_persistente, depois, args.operacoes, args.produtos)
+        banco.fechar_conexoes()
+
+    print(f"Vendas com conexão por chamada: {ops_antes:10.0f} ops/s")
+    print(f"Vendas com conexão persistente: {ops_depois:10.0f} ops/s")
+    print(f"Ganho: {ops_depois / ops_antes:.1f}x")
+
+# Benchmark: fechamento do dia com um lote de vendas aplicado de uma vez
+def benchmark_lote(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        popular_banco(os.path.join(pasta, 'lote.db'), args.produtos)
+        banco.configurar_banco(os.path.join(pasta, 'lote.db'))
+
+        sorteio = random.Random(42)
+        linhas = [(sorteio.randint(1, args.produtos), sorteio.randint(1, 5)) for _ in range(args.linhas)]
+
+        inicio = time.perf_counter()
+        aplicadas, rejeitadas = banco.registrar_vendas_em_lote(linhas)
+        duracao = time.perf_counter() - inicio
+        banco.fechar_conexoes()
+
+    print(f"{aplicadas} linhas aplicadas, {len(rejeitadas)} rejeitadas em {duracao:.3f}s ({args.linhas / duracao:.0f} linhas/s)")
+
+# Função para criar um mercadinho.db no esquema antigo (sem índices, data em texto)
+def popular_historico_antigo(caminho, total_produtos, total_historico):
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('BEGIN')
+    banco.migracao_tabelas_iniciais(conn)
+    conn.execute('''
+        WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+        INSERT INTO produtos (nome, preco, quantidade) SELECT 'Produto ' || x, 1.0, 100 FROM seq
+    ''', (total_produtos,))
+    conn.execute('''
+        WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+        INSERT INTO historico (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao)
+        SELECT x % ? + 1, 'Venda simulada', 10, 9, 1.0, 1.0, datetime(1600000000 + x, 'unixepoch', 'localtime') FROM seq
+    ''', (total_historico, total_produtos))
+    conn.execute('COMMIT')
+    conn.close()
+
+# Função para medir o tempo médio de carregar_historico em milissegundos
+def medir_historico(total_produtos, consultas):
+    sorteio = random.Random(7)
+    inicio = time.perf_counter()
+    for _ in range(consultas):
+        banco.carregar_historico(sorteio.randint(1, total_produtos))
+    return (time.perf_counter() - inicio) / consultas * 1000
+
+# Benchmark: consulta do histórico de um produto antes e depois das migrações
+def benchmark_historico(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'historico.db')
+        popular_historico_antigo(caminho, args.produtos, args.linhas)
+        banco.configurar_banco(caminho)
+
+        antes = medir_historico(args.produtos, args.consultas)
+
+        inicio = time.perf_counter()
+        banco.migrar_banco()
+        duracao_migracao = time.perf_counter() - inicio
+
+        depois = medir_historico(args.produtos, args.consultas)
+        banco.fechar_conexoes()
+
+    print(f"Histórico com {args.linhas} linhas e {args.produtos} produtos")
+    print(f"Consulta sem índice: {antes:10.2f} ms")
+    print(f"Consulta com índice: {depois:10.2f} ms")
+    print(f"Migração no arquivo existente: {duracao_migracao:.1f}s")
+
+# Benchmark: busca por prefixo, por trecho e com filtros num catálogo grande
+def benchmark_busca(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'busca.db')
+        popular_banco(caminho, args.produtos)
+        banco.configurar_banco(caminho)
+
+        consultas = [
+            ("prefixo curto", dict(termo="Pr")),
+            ("trecho", dict(termo="uto 12345")),
+            ("trecho comum", dict(termo="duto")),
+            ("faixa de preço", dict(preco_min=10, preco_max=12)),
+            ("trecho + estoque baixo", dict(termo="uto 9", estoque_max=busca.LIMITE_ESTOQUE_BAIXO)),
+        ]
+        for nome, filtros in consultas:
+            inicio = time.perf_counter()
+            for _ in range(args.repeticoes):
+                ids = busca.buscar_produtos(**filtros)
+            duracao = (time.perf_counter() - inicio) / args.repeticoes * 1000
+            print(f"{nome:25s} {duracao:8.2f} ms ({len(ids)} resultados)")
+        banco.fechar_conexoes()
+
+# Função para gerar vendas sintéticas no histórico (esquema atual) espalhadas por "dias"
+def popular_vendas(caminho, total_produtos, total_historico, dias):
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    conn.execute('BEGIN')
+    conn.execute('''
+        WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+        INSERT INTO historico (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao)
+        SELECT x % ? + 1, ?, 1000, 999, 1.0, 1.0, ? + x * ? FROM seq
+    ''', (total_historico, total_produtos, banco.ACAO_VENDA, int(time.time()) - dias * 86400, dias * 86400 // total_historico))
+    conn.execute('COMMIT')
+    conn.close()
+
+# Benchmark: relatório mensal lendo o histórico bruto x lendo o resumo diário
+def benchmark_resumo(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'resumo.db')
+        popular_banco(caminho, args.produtos)
+        popular_vendas(caminho, args.produtos, args.linhas, args.dias)
+        banco.configurar_banco(caminho)
+        conn = banco.conectar_db()
+
+        inicio = time.perf_counter()
+        resumo.atualizar_resumo()
+        carga_inicial = time.perf_counter() - inicio
+
+        banco.registrar_vendas_em_lote([(1 + i % args.produtos, 1) for i in range(1000)])
+        inicio = time.perf_counter()
+        resumo.atualizar_resumo()
+        incremental = time.perf_counter() - inicio
+
+        # Fechamento do mês anterior, lendo o histórico bruto e lendo o resumo
+        fim_mes = conn.execute("SELECT strftime('%s', 'now', 'localtime', 'start of month', 'utc')").fetchone()[0]
+        inicio_mes = conn.execute("SELECT strftime('%s', 'now', 'localtime', 'start of month', '-1 month', 'utc')").fetchone()[0]
+
+        inicio = time.perf_counter()
+        conn.execute('''
+            SELECT produto_id, SUM(quantidade_anterior - quantidade_atual), SUM((quantidade_anterior - quantidade_atual) * preco_atual)
+            FROM historico WHERE acao IN (?, ?) AND data_movimentacao >= ? AND data_movimentacao < ? GROUP BY produto_id
+        ''', banco.ACOES_VENDA + (int(inicio_mes), int(fim_mes))).fetchall()
+        bruto = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        conn.execute('''
+            SELECT produto_id, SUM(unidades_vendidas), SUM(receita)
+            FROM resumo_diario WHERE dia >= ? AND dia < ? GROUP BY produto_id
+        ''', resumo.intervalo_dias(conn, int(inicio_mes), int(fim_mes))).fetchall()
+        materializado = time.perf_counter() - inicio
+
+        # Todos os meses de todos os anos
+        inicio = time.perf_counter()
+        conn.execute('''
+            SELECT strftime('%Y-%m', dia), produto_id, SUM(unidades_vendidas), SUM(receita)
+            FROM resumo_diario GROUP BY 1, 2
+        ''').fetchall()
+        todos_meses = time.perf_counter() - inicio
+        banco.fechar_conexoes()
+
+    print(f"Histórico com {args.linhas} vendas em {args.dias} dias")
+    print(f"Carga inicial do resumo:          {carga_inicial:8.2f} s")
+    print(f"Atualização após 1000 vendas:     {incremental * 1000:8.2f} ms")
+    print(f"Fechamento do mês pelo histórico: {bruto * 1000:8.2f} ms")
+    print(f"Fechamento do mês pelo resumo:    {materializado * 1000:8.2f} ms")
+    print(f"Todos os meses pelo resumo:       {todos_meses * 1000:8.2f} ms")
+
+# Metas de inicialização a frio da linha de comando, em milissegundos
+METAS_INICIALIZACAO_MS = {
+    'estoque --help': 150,
+    'estoque vender': 200,
+}
+
+# Módulos pesados que a linha de comando não pode carregar sem necessidade
+MODULOS_PESADOS = ('tkinter', 'matplotlib', 'openpyxl', 'pyarrow')
+
+# Benchmark: tempo de inicialização a frio da linha de comando
+def benchmark_inicializacao(args):
+    pasta_projeto = os.path.dirname(os.path.abspath(__file__))
+    estoque = os.path.join(pasta_projeto, 'estoque.py')
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'inicio.db')
+        popular_banco(caminho, 10)
+        comandos = {
+            'estoque --help': [sys.executable, estoque, '--help'],
+            'estoque vender': [sys.executable, estoque, '--banco', caminho, 'vender', '1', '1'],
+        }
+
+        for nome, comando in comandos.items():
+            tempos = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                subprocess.run(comando, check=True, stdout=subprocess.DEVNULL)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            mediana = statistics.median(tempos)
+            meta = METAS_INICIALIZACAO_MS[nome]
+            situacao = "ok" if mediana <= meta else "ACIMA DA META"
+            print(f"{nome:20s} mediana {mediana:7.1f} ms (meta {meta} ms) {situacao}")
+
+    verificacao = (
+        'import sys, estoque; '
+        f'print(",".join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))'
+    )
+    carregados = subprocess.run([sys.executable, '-c', verificacao], cwd=pasta_projeto, capture_output=True, text=True, check=True).stdout.strip()
+    print(f"Módulos pesados carregados pelo import: {carregados or 'nenhum'}")
+
+# Benchmark: tempo e pico de memória (RSS) do relatório em cada formato de saída
+# Cada formato roda num processo separado da linha de comando, para o pico ser só dele.
+def benchmark_formatos(args):
+    estoque = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'estoque.py')
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'formatos.db')
+        popular_banco(caminho, args.produtos)
+        popular_vendas(caminho, args.produtos, args.produtos, 30)
+        banco.configurar_banco(caminho)
+        resumo.atualizar_resumo()
+        banco.fechar_conexoes()
+
+        print(f"Relatório com {args.produtos} produtos")
+        for formato in args.formatos:
+            saida = os.path.join(pasta, 'relatorio.' + formato)
+            comando = [sys.executable, estoque, '--banco', caminho, 'relatorio', '--formato', formato, '--saida', saida, '--sem-grafico']
+            inicio = time.perf_counter()
+            processo = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            _, status, uso = os.wait4(processo.pid, 0)
+            duracao = time.perf_counter() - inicio
+            erro = processo.stderr.read().decode(errors='replace').strip().splitlines()
+            processo.stderr.close()
+
+            if os.waitstatus_to_exitcode(status) != 0:
+                print(f"{formato:8s} falhou: {erro[-1] if erro else status}")
+                continue
+            tamanho = sum(os.path.getsize(os.path.join(pasta, nome)) for nome in os.listdir(pasta) if nome.startswith('relatorio'))
+            # ru_maxrss vem em KiB no Linux
+            print(f"{formato:8s} {duracao:7.2f} s  pico RSS {uso.ru_maxrss / 1024:7.1f} MiB  arquivos {tamanho / 2 ** 20:7.1f} MiB")
+            for nome in os.listdir(pasta):
+                if nome.startswith('relatorio'):
+                    os.remove(os.path.join(pasta, nome))
+
+# Consultas que alimentam cada modo de gráfico
+DADOS_GRAFICOS = {
+    'top': graficos.mais_vendidos,
+    'faixas': graficos.faixas_preco,
+    'estoque': graficos.estoque_catalogo_por_dia,
+}
+
+# Benchmark: tempo dos gráficos (consulta agregada + desenho) conforme o catálogo cresce
+def benchmark_graficos(args):
+    try:
+        import matplotlib  # noqa: F401
+        desenhar = True
+    except ImportError:
+        desenhar = False
+        print("matplotlib não instalado: medindo só as consultas")
+
+    for total in args.produtos:
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'graficos.db')
+            popular_banco(caminho, total)
+            popular_vendas(caminho, total, total, 365)
+            banco.configurar_banco(caminho)
+            resumo.atualizar_resumo()
+            conn = banco.conectar_db()
+
+            for modo in graficos.MODOS:
+                inicio = time.perf_counter()
+                pontos = len(DADOS_GRAFICOS[modo](conn))
+                consulta = time.perf_counter() - inicio
+
+                desenho = 0.0
+                if desenhar:
+                    inicio = time.perf_counter()
+                    graficos.gerar_grafico(conn, modo, os.path.join(pasta, f'{modo}.{args.extensao}'))
+                    desenho = time.perf_counter() - inicio - consulta
+                print(f"{total:9d} produtos  {modo:8s} {pontos:5d} pontos  consulta {consulta * 1000:8.1f} ms  desenho {desenho * 1000:8.1f} ms")
+            banco.fechar_conexoes()
+
+# Um terminal do teste de carga: vende 1 unidade de produtos aleatórios, uma venda por vez
+# "alvo" é o endereço do serviço (modo servico) ou o arquivo do banco (modo direto).
+# Retorna as latências (ms) das vendas e quantas falharam.
+def terminal(modo, alvo, vendas, total_produtos, semente):
+    if modo == 'servico':
+        loja = cliente.ClienteEstoque(alvo)
+    else:
+        banco.configurar_banco(alvo)
+        loja = cliente.OperacoesLocais()
+
+    sorteio = random.Random(semente)
+    latencias = []
+    falhas = 0
+    for _ in range(vendas):
+        produto_id = sorteio.randint(1, total_produtos)
+        inicio = time.perf_counter()
+        try:
+            loja.registrar_movimento(produto_id, -1, banco.ACAO_VENDA)
+        except (sqlite3.OperationalError, banco.EstoqueInsuficiente, OSError):
+            falhas += 1
+            continue
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias, falhas
+
+# Função para iniciar o serviço de estoque num processo separado e ler o endereço escolhido
+def iniciar_servico(caminho):
+    estoque = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'estoque.py')
+    processo = subprocess.Popen(
+        [sys.executable, estoque, '--banco', caminho, 'servir', '--endereco', '127.0.0.1:0'],
+        stdout=subprocess.PIPE, text=True,
+    )
+    linha = processo.stdout.readline()
+    return processo, linha.split()[4]
+
+# Benchmark: N terminais vendendo ao mesmo tempo, direto no arquivo x pelo serviço
+def benchmark_terminais(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in args.modos:
+            caminho = os.path.join(pasta, f'{modo}.db')
+            popular_banco(caminho, args.produtos)
+            servidor = None
+            alvo = caminho
+            if modo == 'servico':
+                servidor, alvo = iniciar_servico(caminho)
+
+            inicio = time.perf_counter()
+            with multiprocessing.Pool(args.terminais) as pool:
+                resultados = pool.starmap(terminal, [(modo, alvo, args.vendas, args.produtos, semente) for semente in range(args.terminais)])
+            duracao = time.perf_counter() - inicio
+
+            if servidor is not None:
+                servidor.terminate()
+                servidor.wait()
+
+            latencias = sorted(latencia for parcial, _ in resultados for latencia in parcial)
+            falhas = sum(falhas for _, falhas in resultados)
+            conn = sqlite3.connect(caminho)
+            vendidas = conn.execute('SELECT ? * ? - SUM(quantidade) FROM produtos', (args.produtos, 10 ** 9)).fetchone()[0]
+            movimentos = conn.execute('SELECT COUNT(*) FROM historico WHERE acao = ?', (banco.ACAO_VENDA,)).fetchone()[0]
+            conn.close()
+
+            percentis = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else [0.0] * 99
+            print(f"{modo:8s} {args.terminais} terminais: {len(latencias) / duracao:8.0f} vendas/s  "
+                  f"p50 {percentis[49]:6.2f} ms  p95 {percentis[94]:6.2f} ms  p99 {percentis[98]:6.2f} ms  falhas {falhas}")
+            situacao = "ok" if vendidas == movimentos == len(latencias) else "DIVERGENTE"
+            print(f"         conferência: {len(latencias)} vendas, {vendidas} unidades baixadas, {movimentos} no histórico ({situacao})")
+
+# Benchmark: movimentos/s com várias threads vendendo, uma transação por movimento x
+# gravação em grupo (gravador.py) nos dois modos de durabilidade. As vendas passam por
+# cliente.OperacoesLocais, o caminho da interface e da linha de comando no modo local; no
+# modo 'atraso' os Futures não são esperados e o tempo inclui gravar a fila no fim.
+def benchmark_gravador(args):
+    cenarios = {
+        'direto NORMAL': ('direto', 'NORMAL'),
+        'direto FULL': ('direto', 'FULL'),
+        'grupo commit (FULL)': ('commit', None),
+        'grupo atraso (NORMAL)': ('atraso', None),
+    }
+
+    with tempfile.TemporaryDirectory(dir=args.pasta) as pasta:
+        for nome, (modo, synchronous) in cenarios.items():
+            caminho = os.path.join(pasta, f'{modo}_{synchronous}.db')
+            popular_banco(caminho, args.produtos)
+            banco.configurar_banco(caminho)
+            gravador.configurar_gravacao(modo)
+            loja = cliente.OperacoesLocais()
+
+            def vender(semente):
+                if synchronous is not None:
+                    banco.conectar_db().execute(f'PRAGMA synchronous = {synchronous}')
+                sorteio = random.Random(semente)
+                for _ in range(args.movimentos):
+                    loja.registrar_movimento(sorteio.randint(1, args.produtos), -1, banco.ACAO_VENDA)
+
+            threads = [threading.Thread(target=vender, args=(semente,)) for semente in range(args.threads)]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            gravador.encerrar_gravacao()
+            duracao = time.perf_counter() - inicio
+
+            gravados = banco.conectar_db().execute('SELECT COUNT(*) FROM historico WHERE acao = ?', (banco.ACAO_VENDA,)).fetchone()[0]
+            banco.fechar_conexoes()
+            print(f"{nome:24s} {gravados / duracao:9.0f} movimentos/s ({gravados} gravados em {duracao:.2f} s)")
+
+# Benchmark: vazão de simular_venda sem backup e com cópias seguidas rodando em outra thread,
+# para cada tamanho de passo (páginas) da API de backup
+def benchmark_backup(args):
+    with tempfile.TemporaryDirectory(dir=args.pasta) as pasta:
+        caminho = os.path.join(pasta, 'mercadinho.db')
+        popular_banco(caminho, args.produtos)
+        popular_vendas(caminho, args.produtos, args.historico, 365)
+        banco.configurar_banco(caminho)
+        banco.criar_tabela()
+        print(f"Banco de {os.path.getsize(caminho) / 2 ** 20:.1f} MiB, {args.segundos:.0f} s por cenário")
+
+        cenarios = [('sem backup', None)] + [(f"backup {paginas} páginas/passo" if paginas > 0 else "backup passo único", paginas)
+                                             for paginas in args.paginas]
+        base = None
+        for nome, paginas in cenarios:
+            parar = threading.Event()
+            copias = []
+
+            def copiar():
+                while not parar.is_set():
+                    copias.append(backup.fazer_backup(os.path.join(pasta, 'backups'), paginas, args.pausa / 1000, forcar=True, manter=1))
+
+            contexto = {'sorteio': random.Random(1), 'produtos': args.produtos}
+            copiador = threading.Thread(target=copiar) if paginas is not None else None
+            if copiador is not None:
+                copiador.start()
+            latencias = []
+            fim = time.perf_counter() + args.segundos
+            while time.perf_counter() < fim:
+                inicio = time.perf_counter()
+                operacao_simular_venda(contexto)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            parar.set()
+            if copiador is not None:
+                copiador.join()
+
+            medidas = resumir_latencias(latencias)
+            vazao = len(latencias) / args.segundos
+            base = base or vazao
+            linha = f"{nome:28s} {vazao:8.0f} vendas/s ({vazao / base:5.1%}) p50 {medidas['p50_ms']:6.3f} ms p99 {medidas['p99_ms']:7.3f} ms"
+            if copias:
+                linha += (f"  {len(copias)} cópias, {statistics.mean(c['segundos'] for c in copias):.2f} s cada, "
+                          f"{sum(c['reinicios'] for c in copias)} recomeços, "
+                          f"{sum(c['passo_unico'] for c in copias)} em passo único")
+            print(linha)
+        banco.fechar_conexoes()
+
+# Painel de reposição lido direto do catálogo (o que o monitor evita a cada atualização)
+SQL_REPOSICAO_VARRENDO = '''
+    SELECT id, nome, quantidade, COALESCE(ponto_reposicao, ?) AS ponto FROM produtos
+    WHERE quantidade <= COALESCE(ponto_reposicao, ?) * ?
+    ORDER BY quantidade - ponto, id
+    LIMIT ?
+'''
+
+# Benchmark: custo do monitor de reposição em cada venda e leitura do painel pelo monitor x
+# consulta varrendo o catálogo
+def benchmark_reposicao(args):
+    with tempfile.TemporaryDirectory(dir=args.pasta) as pasta:
+        caminho = os.path.join(pasta, 'mercadinho.db')
+        popular_banco(caminho, args.produtos)
+        banco.configurar_banco(caminho)
+        banco.criar_tabela()
+        conn = banco.conectar_db()
+        conn.execute('UPDATE produtos SET quantidade = 10 + abs(random()) % 40, ponto_reposicao = abs(random()) % 20')
+        contexto = {'sorteio': random.Random(1), 'produtos': args.produtos}
+
+        def vender():
+            latencias = []
+            for _ in range(args.vendas):
+                inicio = time.perf_counter()
+                operacao_simular_venda(contexto)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            return latencias
+
+        latencias_sem = vender()
+
+        inicio = time.perf_counter()
+        monitor = reposicao.MonitorReposicao(caminho)
+        monitor.carregar()
+        carga = (time.perf_counter() - inicio) * 1000
+        latencias_com = vender()
+
+        inicio = time.perf_counter()
+        for _ in range(args.leituras):
+            monitor.situacao(args.limite)
+        painel_monitor = (time.perf_counter() - inicio) * 1000 / args.leituras
+
+        parametros = (reposicao.PONTO_PADRAO, reposicao.PONTO_PADRAO, reposicao.FATOR_ATENCAO, args.limite)
+        inicio = time.perf_counter()
+        for _ in range(args.leituras):
+            conn.execute(SQL_REPOSICAO_VARRENDO, parametros).fetchall()
+        painel_varrendo = (time.perf_counter() - inicio) * 1000 / args.leituras
+
+        print(f"{args.produtos} produtos, {len(monitor.vigiados)} vigiados; carga do monitor {carga:.1f} ms")
+        for nome, latencias in (('venda sem monitor', latencias_sem), ('venda com monitor', latencias_com)):
+            medidas = resumir_latencias(latencias)
+            print(f"{nome:22s} p50 {medidas['p50_ms']:.3f} ms  p99 {medidas['p99_ms']:.3f} ms")
+        print(f"{'painel pelo monitor':22s} {painel_monitor:9.3f} ms por leitura")
+        print(f"{'painel varrendo':22s} {painel_varrendo:9.3f} ms por leitura")
+        monitor.fechar()
+        banco.fechar_conexoes()
+
+# Arquivo padrão onde a suíte acumula os resultados (uma linha JSON por medição)
+RESULTADOS_SUITE = 'resultados_benchmark.jsonl'
+
+# Função para gerar um histórico grande de vendas: o índice é recriado depois da carga,
+# que é bem mais rápido do que inserir milhões de linhas com ele ativo
+def popular_historico_grande(caminho, total_produtos, total_historico, dias):
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    conn.execute('DROP INDEX IF EXISTS idx_historico_produto_data')
+    conn.close()
+    popular_vendas(caminho, total_produtos, total_historico, dias)
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    conn.execute('CREATE INDEX idx_historico_produto_data ON historico (produto_id, data_movimentacao)')
+    conn.execute('ANALYZE')
+    conn.close()
+
+# Operações da suíte, chamando as mesmas funções que a interface usa
+def operacao_adicionar_produto(contexto):
+    nome, preco, quantidade = banco.validar_produto(f"Novo {contexto['sorteio'].random()}", "9.90", "10")
+    banco.criar_produto(nome, preco, quantidade)
+
+def operacao_simular_venda(contexto):
+    banco.registrar_movimento(contexto['sorteio'].randint(1, contexto['produtos']), -1, banco.ACAO_VENDA)
+
+def operacao_atualizar_produto(contexto):
+    produto_id = contexto['sorteio'].randint(1, contexto['produtos'])
+    nome, preco, quantidade = banco.validar_produto(f"Produto {produto_id}", "5.50", str(10 ** 9))
+    banco.editar_produto(produto_id, nome, preco, quantidade)
+
+def operacao_carregar_produtos(contexto):
+    banco.carregar_produtos()
+
+def operacao_carregar_historico(contexto):
+    banco.carregar_historico(contexto['sorteio'].randint(1, contexto['produtos']))
+
+def operacao_pagina_historico(contexto):
+    historico.pagina_historico(contexto['sorteio'].randint(1, contexto['produtos']), None, None, 0, 50)
+
+def operacao_gerar_relatorio(contexto):
+    relatorio.gerar_relatorio(os.path.join(contexto['pasta'], 'relatorio.csv'), 'csv', grafico=None)
+
+# Nome -> (função, pesada); operações pesadas rodam "--repeticoes" vezes em vez de "--operacoes"
+OPERACOES_SUITE = {
+    'adicionar_produto': (operacao_adicionar_produto, False),
+    'simular_venda': (operacao_simular_venda, False),
+    'atualizar_produto': (operacao_atualizar_produto, False),
+    'carregar_historico': (operacao_carregar_historico, False),
+    'pagina_historico': (operacao_pagina_historico, False),
+    'carregar_produtos': (operacao_carregar_produtos, True),
+    'gerar_relatorio': (operacao_gerar_relatorio, True),
+}
+
+# Função para identificar a versão do código medida (commit do git, "-dirty" se alterado)
+def versao_codigo():
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=pasta, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecida'
+
+# Função para medir uma operação: latências (ms) sem tracemalloc e o pico de memória Python
+# de uma execução separada com tracemalloc (que deixaria as latências mais lentas)
+def medir_operacao(funcao, contexto, repeticoes):
+    funcao(contexto)
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(contexto)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    funcao(contexto)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return latencias, pico
+
+# Função para resumir as latências em vazão e percentis
+def resumir_latencias(latencias):
+    ordenadas = sorted(latencias)
+    if len(ordenadas) > 1:
+        percentis = statistics.quantiles(ordenadas, n=100, method='inclusive')
+        p50, p95, p99 = percentis[49], percentis[94], percentis[98]
+    else:
+        p50 = p95 = p99 = ordenadas[0]
+    return {
+        'operacoes_por_s': len(ordenadas) / (sum(ordenadas) / 1000),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+    }
+
+# Benchmark: suíte das operações do estoque em bancos sintéticos de vários tamanhos
+# Cada medição é acrescentada ao arquivo de resultados para comparar versões depois.
+def benchmark_suite(args):
+    versao = versao_codigo()
+    data = datetime.now().isoformat(timespec='seconds')
+    resultados = []
+
+    for tamanho in args.tamanhos:
+        with tempfile.TemporaryDirectory(dir=args.pasta) as pasta:
+            caminho = os.path.join(pasta, 'suite.db')
+            inicio = time.perf_counter()
+            popular_banco(caminho, tamanho)
+            popular_historico_grande(caminho, tamanho, args.historico, args.dias)
+            banco.configurar_banco(caminho)
+            print(f"{tamanho} produtos e {args.historico} movimentações gerados em {time.perf_counter() - inicio:.1f} s")
+
+            contexto = {'produtos': tamanho, 'sorteio': random.Random(42), 'pasta': pasta}
+            for nome in args.operacoes_suite:
+                funcao, pesada = OPERACOES_SUITE[nome]
+                latencias, pico = medir_operacao(funcao, contexto, args.repeticoes if pesada else args.operacoes)
+                medicao = {
+                    'versao': versao,
+                    'data': data,
+                    'produtos': tamanho,
+                    'historico': args.historico,
+                    'operacao': nome,
+                    'repeticoes': len(latencias),
+                    **resumir_latencias(latencias),
+                    'pico_memoria_kib': pico / 1024,
+                }
+                resultados.append(medicao)
+                print(f"  {nome:20s} {medicao['operacoes_por_s']:10.1f} op/s  p50 {medicao['p50_ms']:9.3f} ms  "
+                      f"p95 {medicao['p95_ms']:9.3f} ms  p99 {medicao['p99_ms']:9.3f} ms  pico {medicao['pico_memoria_kib']:10.1f} KiB")
+            banco.fechar_conexoes()
+
+    with open(args.resultados, 'a', encoding='utf-8') as arquivo:
+        for medicao in resultados:
+            arquivo.write(json.dumps(medicao, ensure_ascii=False) + '\n')
+    print(f"Versão {versao}: {len(resultados)} medições gravadas em {args.resultados}")
+
+# Benchmark: compara duas versões gravadas pela suíte (padrão: as duas últimas medidas)
+# Vazão menor ou p95 maior que o limiar (em %) aparecem como regressão.
+def benchmark_comparar(args):
+    medicoes = {}
+    versoes = []
+    with open(args.resultados, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            medicao = json.loads(linha)
+            if medicao['versao'] in versoes:
+                versoes.remove(medicao['versao'])
+            versoes.append(medicao['versao'])
+            medicoes[medicao['versao'], medicao['produtos'], medicao['operacao']] = medicao
+
+    base = args.base or (versoes[-2] if len(versoes) > 1 else None)
+    atual = args.atual or versoes[-1]
+    if base is None:
+        print(f"Só há medições da versão {atual} em {args.resultados}.")
+        return 1
+
+    print(f"Base {base} x atual {atual}")
+    regressoes = 0
+    for (versao, produtos, operacao), medicao in sorted(medicoes.items(), key=lambda item: (item[0][1], item[0][2])):
+        if versao != atual or (base, produtos, operacao) not in medicoes:
+            continue
+        anterior = medicoes[base, produtos, operacao]
+        vazao = (medicao['operacoes_por_s'] / anterior['operacoes_por_s'] - 1) * 100
+        p95 = (medicao['p95_ms'] / anterior['p95_ms'] - 1) * 100 if anterior['p95_ms'] else 0.0
+        regressao = vazao < -args.limiar or p95 > args.limiar
+        regressoes += regressao
+        print(f"{produtos:9d} {operacao:20s} vazão {vazao:+7.1f}%  p95 {p95:+7.1f}%  {'REGRESSÃO' if regressao else ''}")
+    return 1 if regressoes else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do controle de estoque")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    p_conexao = subparsers.add_parser('conexao', help="Conexão por chamada x conexão persistente")
+    p_conexao.add_argument('--operacoes', type=int, default=2000)
+    p_conexao.add_argument('--produtos', type=int, default=1000)
+    p_conexao.set_defaults(funcao=benchmark_conexao)
+
+    p_lote = subparsers.add_parser('lote', help="Lote de vendas em uma única transação")
+    p_lote.add_argument('--linhas', type=int, default=100000)
+    p_lote.add_argument('--produtos', type=int, default=1000)
+    p_lote.set_defaults(funcao=benchmark_lote)
+
+    p_historico = subparsers.add_parser('historico', help="Consulta do histórico antes e depois dos índices")
+    p_historico.add_argument('--linhas', type=int, default=10000000)
+    p_historico.add_argument('--produtos', type=int, default=10000)
+    p_historico.add_argument('--consultas', type=int, default=20)
+    p_historico.set_defaults(funcao=benchmark_historico)
+
+    p_busca = subparsers.add_parser('busca', help="Busca por nome e filtros no catálogo")
+    p_busca.add_argument('--produtos', type=int, default=1000000)
+    p_busca.add_argument('--repeticoes', type=int, default=20)
+    p_busca.set_defaults(funcao=benchmark_busca)
+
+    p_resumo = subparsers.add_parser('resumo', help="Relatório pelo histórico bruto x pelo resumo diário")
+    p_resumo.add_argument('--linhas', type=int, default=5000000)
+    p_resumo.add_argument('--produtos', type=int, default=100)
+    p_resumo.add_argument('--dias', type=int, default=3 * 365)
+    p_resumo.set_defaults(funcao=benchmark_resumo)
+
+    p_inicializacao = subparsers.add_parser('inicializacao', help="Inicialização a frio da linha de comando")
+    p_inicializacao.add_argument('--repeticoes', type=int, default=10)
+    p_inicializacao.set_defaults(funcao=benchmark_inicializacao)
+
+    p_formatos = subparsers.add_parser('formatos', help="Tempo e pico de memória do relatório por formato")
+    p_formatos.add_argument('--produtos', type=int, default=1000000)
+    p_formatos.add_argument('--formatos', nargs='+', choices=('xlsx', 'csv', 'parquet'), default=['xlsx', 'csv', 'parquet'])
+    p_formatos.set_defaults(funcao=benchmark_formatos)
+
+    p_graficos = subparsers.add_parser('graficos', help="Tempo dos gráficos agregados por tamanho de catálogo")
+    p_graficos.add_argument('--produtos', type=int, nargs='+', default=[10000, 100000, 1000000])
+    p_graficos.add_argument('--extensao', choices=('png', 'svg'), default='png')
+    p_graficos.set_defaults(funcao=benchmark_graficos)
+
+    p_terminais = subparsers.add_parser('terminais', help="Teste de carga com N terminais vendendo ao mesmo tempo")
+    p_terminais.add_argument('--terminais', type=int, default=8)
+    p_terminais.add_argument('--vendas', type=int, default=2000, help="Vendas por terminal")
+    p_terminais.add_argument('--produtos', type=int, default=1000)
+    p_terminais.add_argument('--modos', nargs='+', choices=('direto', 'servico'), default=['direto', 'servico'])
+    p_terminais.set_defaults(funcao=benchmark_terminais)
+
+    p_gravador = subparsers.add_parser('gravador', help="Movimentos/s: transação por movimento x gravação em grupo")
+    p_gravador.add_argument('--threads', type=int, default=8)
+    p_gravador.add_argument('--movimentos', type=int, default=2000, help="Movimentos por thread")
+    p_gravador.add_argument('--produtos', type=int, default=1000)
+    p_gravador.add_argument('--pasta', help="Pasta do banco de teste (use um disco real para medir o fsync)")
+    p_gravador.set_defaults(funcao=benchmark_gravador)
+
+    p_backup = subparsers.add_parser('backup', help="Vazão de vendas sem backup e com backup online rodando")
+    p_backup.add_argument('--produtos', type=int, default=10000)
+    p_backup.add_argument('--historico', type=int, default=2000000, help="Movimentações no histórico (tamanho do banco)")
+    p_backup.add_argument('--segundos', type=float, default=10.0, help="Duração de cada cenário")
+    p_backup.add_argument('--paginas', type=int, nargs='+', default=[-1, 1024, 128], help="Páginas por passo (-1 = passo único)")
+    p_backup.add_argument('--pausa', type=float, default=5, help="Pausa entre os passos, em milissegundos")
+    p_backup.add_argument('--pasta', help="Pasta do banco de teste (use um disco real)")
+    p_backup.set_defaults(funcao=benchmark_backup)
+
+    p_reposicao = subparsers.add_parser('reposicao', help="Monitor de reposição: custo por venda e leitura do painel")
+    p_reposicao.add_argument('--produtos', type=int, default=100000)
+    p_reposicao.add_argument('--vendas', type=int, default=2000)
+    p_reposicao.add_argument('--leituras', type=int, default=50, help="Leituras do painel medidas")
+    p_reposicao.add_argument('--limite', type=int, default=30, help="Produtos mostrados no painel")
+    p_reposicao.add_argument('--pasta', help="Pasta do banco de teste")
+    p_reposicao.set_defaults(funcao=benchmark_reposicao)
+
+    p_suite = subparsers.add_parser('suite', help="Suíte das operações do estoque com resultados gravados")
+    p_suite.add_argument('--tamanhos', type=int, nargs='+', default=[1000, 100000, 1000000], help="Produtos em cada banco")
+    p_suite.add_argument('--historico', type=int, default=10000000, help="Movimentações no histórico")
+    p_suite.add_argument('--dias', type=int, default=365, help="Dias cobertos pelo histórico")
+    p_suite.add_argument('--operacoes', type=int, default=1000, help="Repetições das operações leves")
+    p_suite.add_argument('--repeticoes', type=int, default=3, help="Repetições das operações pesadas")
+    p_suite.add_argument('--operacao', dest='operacoes_suite', nargs='+', choices=list(OPERACOES_SUITE), default=list(OPERACOES_SUITE))
+    p_suite.add_argument('--resultados', default=RESULTADOS_SUITE)
+    p_suite.add_argument('--pasta', help="Pasta dos bancos de teste")
+    p_suite.set_defaults(funcao=benchmark_suite)
+
+    p_comparar = subparsers.add_parser('comparar', help="Compara duas versões medidas pela suíte")
+    p_comparar.add_argument('--resultados', default=RESULTADOS_SUITE)
+    p_comparar.add_argument('--base', help="Versão de referência (padrão: a penúltima medida)")
+    p_comparar.add_argument('--atual', help="Versão comparada (padrão: a última medida)")
+    p_comparar.add_argument('--limiar', type=float, default=10.0, help="Variação em %% considerada regressão")
+    p_comparar.set_defaults(funcao=benchmark_comparar)
+
+    args = parser.parse_args()
+    return args.funcao(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import banco
+
+# Máximo de produtos devolvidos por uma busca
+LIMITE_RESULTADOS = 1000
+
+# Quantidade a partir da qual um produto é considerado com estoque baixo no filtro
+LIMITE_ESTOQUE_BAIXO = 5
+
+# Tamanho mínimo do termo para usar o índice trigram (trechos menores buscam por prefixo)
+TAMANHO_MINIMO_TRECHO = 3
+
+# Função para verificar se o banco tem o índice de texto da busca
+def tem_indice_texto(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'produtos_fts'").fetchone() is not None
+
+# Função para escapar os curingas de um termo usado em LIKE
+def escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# Função para buscar produtos por nome, faixa de preço e estoque baixo
+# Termos curtos buscam por prefixo no índice NOCASE de nome; termos a partir de três
+# letras buscam por trecho no índice FTS5 trigram. Retorna os ids em ordem crescente.
+def buscar_produtos(termo='', preco_min=None, preco_max=None, estoque_max=None, limite=LIMITE_RESULTADOS):
+    conn = banco.conectar_db()
+    termo = termo.strip()
+    condicoes = []
+    parametros = []
+    tabelas = 'produtos p'
+
+    if termo and len(termo) >= TAMANHO_MINIMO_TRECHO and tem_indice_texto(conn):
+        tabelas = 'produtos_fts f JOIN produtos p ON p.id = f.rowid'
+        condicoes.append('produtos_fts MATCH ?')
+        parametros.append('"' + termo.replace('"', '""') + '"')
+    elif termo and len(termo) >= TAMANHO_MINIMO_TRECHO:
+        condicoes.append("p.nome LIKE ? ESCAPE '\\'")
+        parametros.append('%' + escapar_like(termo) + '%')
+    elif termo:
+        condicoes.append("p.nome LIKE ? ESCAPE '\\'")
+        parametros.append(escapar_like(termo) + '%')
+
+    if preco_min is not None:
+        condicoes.append('p.preco >= ?')
+        parametros.append(preco_min)
+    if preco_max is not None:
+        condicoes.append('p.preco <= ?')
+        parametros.append(preco_max)
+    if estoque_max is not None:
+        condicoes.append('p.quantidade <= ?')
+        parametros.append(estoque_max)
+
+    onde = ' WHERE ' + ' AND '.join(condicoes) if condicoes else ''
+    cursor = conn.execute(f'SELECT p.id FROM {tabelas}{onde} LIMIT ?', parametros + [limite])
+    return sorted(linha[0] for linha in cursor)
+
+# Fonte de dados da ListaVirtual para o resultado de uma busca: os ids vêm da busca
+# e as linhas são lidas do cache de produtos em memória.
+class FonteBusca:
+    def __init__(self, ids, cache):
+        self.ids = ids
+        self.cache = cache
+
+    def total(self):
+        return len(self.ids)
+
+    def pagina(self, posicao, limite, apos_id=None):
+        linhas = (self.cache.produto(produto_id) for produto_id in self.ids[posicao:posicao + limite])
+        return [linha for linha in linhas if linha is not None]
+
+    def produto(self, produto_id):
+        return self.cache.produto(produto_id)
@@ -0,0 +1,161 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+import banco
+
+# Registro compacto de um produto em memória
+class Produto:
+    __slots__ = ('id', 'nome', 'preco', 'quantidade')
+
+    def __init__(self, produto_id, nome, preco, quantidade):
+        self.id = produto_id
+        self.nome = nome
+        self.preco = preco
+        self.quantidade = quantidade
+
+    # Mesmo formato das linhas de "SELECT id, nome, preco, quantidade FROM produtos"
+    def tupla(self):
+        return (self.id, self.nome, self.preco, self.quantidade)
+
+# Cache dos produtos indexado por id, carregado uma vez e mantido pelas próprias
+# funções de escrita do módulo banco (write-through via observar_produtos).
+# Alterações feitas por outro processo no mesmo arquivo são detectadas com
+# PRAGMA data_version numa conexão exclusiva do cache; só os produtos com movimentação
+# nova no histórico são relidos (banco.produtos_movimentados). Se o data_version mudou sem
+# movimentação nova (retenção, retratos, SQL feito à mão), o cache é recarregado inteiro;
+# um UPDATE feito à mão, sem histórico, junto com vendas só aparece na próxima recarga.
+class CacheProdutos:
+    def __init__(self, caminho=None):
+        self.caminho = caminho or banco.CAMINHO_DB
+        self.produtos = {}
+        self.ids = []
+        self.versao = None
+        self.ultimo_historico = 0
+        # "trava" protege só a memória (leituras da lista na tela); "trava_conexao" protege a
+        # conexão do cache, então recarga e conferência não seguram a tela. Ordem: conexão,
+        # depois memória (nunca o contrário).
+        self.trava = threading.RLock()
+        self.trava_conexao = threading.RLock()
+        self.conn = banco.abrir_conexao(self.caminho)
+        banco.observar_produtos(self.aplicar_alteracoes)
+
+    def fechar(self):
+        banco.remover_observador(self.aplicar_alteracoes)
+        self.conn.close()
+
+    def versao_banco(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    # Carrega (ou recarrega) todos os produtos do banco
+    # Uma escrita local aplicada durante a leitura se perde na troca, mas tem histórico e
+    # volta no próximo validar().
+    def carregar(self):
+        with self.trava_conexao:
+            versao = self.versao_banco()
+            self.conn.execute('BEGIN')
+            try:
+                ultimo_historico = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM historico').fetchone()[0]
+                cursor = self.conn.execute('SELECT id, nome, preco, quantidade FROM produtos ORDER BY id')
+                produtos = {linha[0]: Produto(*linha) for linha in cursor}
+            finally:
+                self.conn.execute('COMMIT')
+            with self.trava:
+                self.produtos, self.ids = produtos, list(produtos)
+                self.versao, self.ultimo_historico = versao, ultimo_historico
+
+    # Lê do banco as linhas dos produtos informados (chame com a trava_conexao)
+    def ler_linhas(self, produto_ids):
+        linhas = []
+        for inicio in range(0, len(produto_ids), banco.TAMANHO_BLOCO_IN):
+            bloco = produto_ids[inicio:inicio + banco.TAMANHO_BLOCO_IN]
+            marcadores = ', '.join('?' * len(bloco))
+            linhas += self.conn.execute(f'SELECT id, nome, preco, quantidade FROM produtos WHERE id IN ({marcadores})', bloco)
+        return linhas
+
+    # Confere se outro processo alterou o banco e relê só os produtos com movimentação nova
+    # Retorna True se algum produto mudou (ou se houve recarga completa).
+    def validar(self):
+        with self.trava_conexao:
+            versao = self.versao_banco()
+            if versao == self.versao:
+                return False
+            self.conn.execute('BEGIN')
+            try:
+                maior, produto_ids = banco.produtos_movimentados(self.conn, self.ultimo_historico)
+                linhas = self.ler_linhas(produto_ids) if produto_ids else None
+            finally:
+                self.conn.execute('COMMIT')
+            if linhas is None:
+                self.carregar()
+                return True
+
+            mudou = False
+            with self.trava:
+                self.versao, self.ultimo_historico = versao, maior
+                for linha in linhas:
+                    if self.produto(linha[0]) != linha:
+                        self.inserir(Produto(*linha))
+                        mudou = True
+                for produto_id in set(produto_ids) - {linha[0] for linha in linhas}:
+                    if produto_id in self.produtos:
+                        self.remover(produto_id)
+                        mudou = True
+            return mudou
+
+    # Observador do módulo banco: aplica as alterações confirmadas por este processo
+    # Produtos novos no cache são lidos depois de soltar a trava, para manter a ordem das travas.
+    def aplicar_alteracoes(self, caminho, alteracoes):
+        if caminho != self.caminho:
+            return
+        novos = []
+        with self.trava:
+            for produto_id, campos in alteracoes.items():
+                if campos is None:
+                    self.remover(produto_id)
+                    continue
+
+                produto = self.produtos.get(produto_id)
+                if produto is None:
+                    novos.append(produto_id)
+                    continue
+                # Campos que a lista não mostra (ex.: ponto_reposicao) ficam fora do cache
+                for campo, valor in campos.items():
+                    if campo in Produto.__slots__:
+                        setattr(produto, campo, valor)
+        if novos:
+            with self.trava_conexao:
+                linhas = self.ler_linhas(novos)
+                with self.trava:
+                    for linha in linhas:
+                        self.inserir(Produto(*linha))
+
+    def inserir(self, produto):
+        if produto.id not in self.produtos:
+            insort(self.ids, produto.id)
+        self.produtos[produto.id] = produto
+
+    def remover(self, produto_id):
+        if self.produtos.pop(produto_id, None) is None:
+            return
+        indice = bisect_left(self.ids, produto_id)
+        del self.ids[indice]
+
+    # Leituras servidas da memória
+
+    def total(self):
+        return len(self.ids)
+
+    def produto(self, produto_id):
+        produto = self.produtos.get(produto_id)
+        return produto.tupla() if produto is not None else None
+
+    def pagina(self, posicao, limite, apos_id=None):
+        with self.trava:
+            if apos_id is not None:
+                posicao = bisect_right(self.ids, apos_id)
+            return [self.produtos[produto_id].tupla() for produto_id in self.ids[posicao:posicao + limite]]
+
+    # Todos os produtos em ordem de id, como carregar_produtos()
+    def listar(self):
+        with self.trava:
+            return [self.produtos[produto_id].tupla() for produto_id in self.ids]
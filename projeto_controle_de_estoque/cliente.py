@@ -0,0 +1,254 @@
+# Cliente do serviço de estoque (servico.py) para a interface e a linha de comando.
+# O protocolo é uma linha JSON por mensagem sobre TCP: o pedido traz "id", "op" e "args"
+# e a resposta traz o mesmo "id" com "resultado" ou com o erro ("erro", "dados"). Os erros
+# do módulo banco são recriados do lado do cliente, então quem chama trata as mesmas
+# exceções do modo local. Só a biblioteca padrão é importada aqui.
+
+import json
+import os
+import socket
+import threading
+
+import banco
+
+# Endereço padrão do serviço (só aceita conexões locais)
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8765
+
+# Endereço do serviço usado pelos clientes; None = acessar o banco direto (modo local)
+ENDERECO_SERVICO = os.environ.get('ESTOQUE_SERVICO') or None
+
+# Erros que atravessam o protocolo: nome -> como recriar a partir de "dados"
+ERROS_PROTOCOLO = {
+    'ProdutoNaoEncontrado': lambda dados: banco.ProdutoNaoEncontrado(*dados),
+    'EstoqueInsuficiente': lambda dados: banco.EstoqueInsuficiente(*dados),
+    'CamposVazios': lambda dados: banco.CamposVazios(),
+    'ValueError': lambda dados: ValueError(*dados),
+}
+
+# Erro devolvido pelo serviço que não corresponde a nenhum erro conhecido
+class ErroServico(Exception):
+    pass
+
+# Função para trocar o endereço do serviço ("host:porta" ou só "porta")
+def configurar_servico(endereco):
+    global ENDERECO_SERVICO
+    ENDERECO_SERVICO = endereco
+
+# Função para separar "host:porta" em (host, porta)
+def interpretar_endereco(endereco):
+    host, _, porta = str(endereco).rpartition(':')
+    return host or HOST_PADRAO, int(porta)
+
+# Função para converter um erro em (nome, dados) para a resposta do serviço
+def codificar_erro(erro):
+    if isinstance(erro, banco.ProdutoNaoEncontrado):
+        return 'ProdutoNaoEncontrado', [erro.produto_id]
+    if isinstance(erro, banco.EstoqueInsuficiente):
+        return 'EstoqueInsuficiente', [erro.produto_id, erro.disponivel, erro.solicitado]
+    if isinstance(erro, banco.CamposVazios):
+        return 'CamposVazios', []
+    if isinstance(erro, ValueError):
+        return 'ValueError', [str(erro)]
+    return type(erro).__name__, [str(erro)]
+
+# Função para recriar no cliente o erro recebido do serviço
+def decodificar_erro(nome, dados):
+    recriar = ERROS_PROTOCOLO.get(nome)
+    if recriar is None:
+        return ErroServico(f"{nome}: {dados[0] if dados else ''}")
+    return recriar(dados)
+
+# Função para conectar ao serviço configurado; None quando a aplicação roda em modo local
+def conectar_servico():
+    if not ENDERECO_SERVICO:
+        return None
+    return ClienteEstoque(ENDERECO_SERVICO)
+
+# Conexão com o serviço de estoque. Os métodos têm os nomes e argumentos das funções
+# locais (banco, busca, historico, relatorio) e a leitura de produtos segue a interface
+# do CacheProdutos, então o cliente serve de fonte para a ListaVirtual.
+# Cada thread usa a própria conexão TCP, então um relatório demorado numa thread de
+# trabalho não segura a rolagem da lista na thread do Tk.
+class ClienteEstoque:
+    def __init__(self, endereco=None):
+        self.endereco = interpretar_endereco(endereco or ENDERECO_SERVICO or PORTA_PADRAO)
+        self.local = threading.local()
+        self.trava = threading.Lock()
+        self.conexoes = []
+        self.versao = None
+
+    def conexao(self):
+        arquivo = getattr(self.local, 'arquivo', None)
+        if arquivo is None:
+            conexao = socket.create_connection(self.endereco)
+            conexao.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            arquivo = self.local.arquivo = conexao.makefile('rwb')
+            self.local.socket = conexao
+            self.local.numero = 0
+            with self.trava:
+                self.conexoes.append((conexao, arquivo))
+        return arquivo
+
+    def descartar_conexao(self):
+        conexao = getattr(self.local, 'socket', None)
+        if conexao is not None:
+            conexao.close()
+        self.local.socket = self.local.arquivo = None
+
+    def fechar(self):
+        with self.trava:
+            conexoes, self.conexoes = self.conexoes, []
+        for conexao, arquivo in conexoes:
+            try:
+                arquivo.close()
+            except OSError:
+                pass
+            conexao.close()
+
+    # Envia um pedido e espera a resposta
+    # Só o envio é repetido numa conexão nova: depois que o pedido saiu, repetir poderia
+    # aplicar a mesma escrita duas vezes, então a falha segue para quem chamou.
+    def chamar(self, operacao, *args):
+        for tentativa in range(2):
+            arquivo = self.conexao()
+            self.local.numero += 1
+            try:
+                arquivo.write(json.dumps({'id': self.local.numero, 'op': operacao, 'args': args}).encode() + b'\n')
+                arquivo.flush()
+                break
+            except OSError:
+                self.descartar_conexao()
+                if tentativa:
+                    raise
+
+        try:
+            linha = arquivo.readline()
+        except OSError:
+            self.descartar_conexao()
+            raise
+        if not linha:
+            self.descartar_conexao()
+            raise ConnectionError("O serviço de estoque fechou a conexão.")
+
+        resposta = json.loads(linha)
+        if 'erro' in resposta:
+            raise decodificar_erro(resposta['erro'], resposta.get('dados', []))
+        return resposta['resultado']
+
+    # Leituras de produtos (servidas do cache do serviço)
+
+    def carregar(self):
+        self.versao = self.chamar('alteracoes', None)[0]
+
+    def total(self):
+        return self.chamar('total')
+
+    def produto(self, produto_id):
+        linha = self.chamar('produto', produto_id)
+        return tuple(linha) if linha is not None else None
+
+    def pagina(self, posicao, limite, apos_id=None):
+        return [tuple(linha) for linha in self.chamar('pagina', posicao, limite, apos_id)]
+
+    # Confere se houve escrita no serviço desde a última conferência; retorna True se houve
+    def validar(self):
+        versao, _ = self.chamar('alteracoes', self.versao)
+        mudou = versao != self.versao
+        self.versao = versao
+        return mudou
+
+    # Escritas (passam pela fila única de escrita do serviço)
+
+    def criar_produto(self, nome, preco, quantidade):
+        return self.chamar('criar_produto', nome, preco, quantidade)
+
+    def editar_produto(self, produto_id, nome, preco, quantidade):
+        return self.chamar('editar_produto', produto_id, nome, preco, quantidade)
+
+    def excluir_produto(self, produto_id):
+        return self.chamar('excluir_produto', produto_id)
+
+    def registrar_movimento(self, produto_id, delta, acao):
+        return self.chamar('registrar_movimento', produto_id, delta, acao)
+
+    def registrar_vendas_em_lote(self, linhas, acao=banco.ACAO_VENDA_LOTE):
+        aplicadas, rejeitadas = self.chamar('registrar_vendas_em_lote', list(linhas), acao)
+        return aplicadas, [banco.LinhaRejeitada(*linha) for linha in rejeitadas]
+
+    def definir_ponto_reposicao(self, produto_id, ponto):
+        return self.chamar('definir_ponto_reposicao', produto_id, ponto)
+
+    # Painel de reposição, mantido em memória pelo serviço (mesmo formato de MonitorReposicao.situacao)
+    def situacao(self, limite=20):
+        abaixo, urgentes, alertas = self.chamar('reposicao', limite)
+        return abaixo, [tuple(linha) for linha in urgentes], [tuple(alerta) for alerta in alertas]
+
+    # Consultas feitas pelo serviço no banco
+
+    def buscar_produtos(self, termo='', preco_min=None, preco_max=None, estoque_max=None, limite=None):
+        return self.chamar('buscar_produtos', termo, preco_min, preco_max, estoque_max, limite)
+
+    def contar_historico(self, produto_id, inicio=None, fim=None):
+        return self.chamar('contar_historico', produto_id, inicio, fim)
+
+    def pagina_historico(self, produto_id, inicio, fim, posicao, limite, apos=None):
+        return [tuple(linha) for linha in self.chamar('pagina_historico', produto_id, inicio, fim, posicao, limite, apos)]
+
+    # Arquivos são gravados pelo serviço, na mesma máquina: os caminhos vão absolutos
+    def exportar_historico(self, caminho, produto_id, inicio=None, fim=None):
+        return self.chamar('exportar_historico', os.path.abspath(caminho), produto_id, inicio, fim)
+
+    # O serviço não informa progresso; o cancelamento é conferido quando a resposta chega
+    def gerar_relatorio(self, caminho_saida=None, formato='xlsx', caminho_png=None, periodo='mes', inicio=None, fim=None,
+                        grafico='top', limite_grafico=None, produto_id=None, tarefa=None):
+        caminho_saida = os.path.abspath(caminho_saida) if caminho_saida else None
+        caminho_png = os.path.abspath(caminho_png) if caminho_png else None
+        caminhos, png = self.chamar('gerar_relatorio', caminho_saida, formato, caminho_png, periodo, inicio, fim, grafico, limite_grafico, produto_id)
+        if tarefa is not None:
+            tarefa.verificar_cancelamento()
+        return caminhos, png
+
+    def exportar_sugestao(self, caminho, dias=None, cobertura=None):
+        import reposicao
+        return self.chamar('exportar_sugestao', os.path.abspath(caminho), dias or reposicao.DIAS_VELOCIDADE,
+                           cobertura or reposicao.DIAS_COBERTURA)
+
+# Operações do modo local, com os mesmos nomes do ClienteEstoque: a interface chama
+# "loja.criar_produto(...)" sem saber se fala com o banco ou com o serviço.
+class OperacoesLocais:
+    criar_produto = staticmethod(banco.criar_produto)
+    editar_produto = staticmethod(banco.editar_produto)
+    excluir_produto = staticmethod(banco.excluir_produto)
+    registrar_vendas_em_lote = staticmethod(banco.registrar_vendas_em_lote)
+    definir_ponto_reposicao = staticmethod(banco.definir_ponto_reposicao)
+
+    # Vendas e entradas no modo de gravação configurado (gravador.py); no modo 'atraso'
+    # devolve um Future em vez da nova quantidade (veja gravador.quantidade)
+    def registrar_movimento(self, produto_id, delta, acao):
+        import gravador
+        return gravador.registrar_movimento(produto_id, delta, acao)
+
+    def buscar_produtos(self, *args, **kwargs):
+        import busca
+        return busca.buscar_produtos(*args, **kwargs)
+
+    def contar_historico(self, *args):
+        import historico
+        return historico.contar_historico(*args)
+
+    def pagina_historico(self, *args):
+        import historico
+        return historico.pagina_historico(*args)
+
+    def exportar_historico(self, *args):
+        import historico
+        return historico.exportar_historico(*args)
+
+    def gerar_relatorio(self, *args, **kwargs):
+        import relatorio
+        return relatorio.gerar_relatorio(*args, **kwargs)
+
+    def exportar_sugestao(self, caminho, dias=None, cobertura=None):
+        import reposicao
+        return reposicao.exportar_sugestao(caminho, dias or reposicao.DIAS_VELOCIDADE, cobertura or reposicao.DIAS_COBERTURA)
@@ -0,0 +1,455 @@
+# Linha de comando do controle de estoque, para uso sem interface gráfica (ex.: cron).
+# Só sqlite3 e a biblioteca padrão são carregados na inicialização; tkinter, matplotlib,
+# openpyxl e pyarrow são importados dentro do comando que precisa deles.
+#
+#   python estoque.py relatorio --periodo mes --formato parquet --saida fechamento.parquet
+#   python estoque.py relatorio --grafico estoque --produto 42 --png estoque_42.svg
+#   python estoque.py importar catalogo.csv
+#   python estoque.py exportar catalogo.jsonl
+#   python estoque.py vender 42 3
+#   python estoque.py historico 42 historico_42.csv --inicio 2024-01-01 --fim 2024-07-01
+#   python estoque.py vender --arquivo cupons.csv
+#   python estoque.py gui
+#   python estoque.py servir --endereco 127.0.0.1:8765
+#   python estoque.py --servico 127.0.0.1:8765 vender 42 3     (terminal cliente do serviço)
+#   python estoque.py --instrumentar --trace sessao.jsonl --perfil sessao.prof gui
+#   python estoque.py filiais --criar centro                   (cria filiais/centro.db)
+#   python estoque.py --filial centro vender 42 3
+#   python estoque.py filiais --buscar arroz                   (busca em todas as filiais)
+#   python estoque.py consolidado --formato parquet            (relatório de todas as filiais)
+#   python estoque.py snapshot                                 (retrato do estoque, pelo cron)
+#   python estoque.py estoque-em 2024-03-31 --saida estoque_marco.csv
+#   python estoque.py verificar --saida divergencias.csv
+#   python estoque.py compactar --dias 365 --compressao zstd    (retenção do histórico)
+#   python estoque.py arquivo 42 historico_42_2022.csv --inicio 2022-01-01 --fim 2023-01-01
+#   python estoque.py ponto-reposicao 42 20                    (sem o ponto volta ao padrão)
+#   python estoque.py sugestao-compra --saida compras.csv --dias 28 --cobertura 14
+#   python estoque.py backup                                   (cópia com as vendas rodando, pelo cron)
+#   python estoque.py verificar-backup                         (sha256 e integrity_check das cópias)
+#   python estoque.py restaurar backups/mercadinho_20240331_230000_000000.db
+#
+# Com --servico (ou a variável ESTOQUE_SERVICO) os comandos vender, historico, relatorio,
+# ponto-reposicao, sugestao-compra e gui falam com o serviço de estoque em vez de abrir o
+# banco; importar e exportar sempre usam o arquivo do banco direto.
+# --instrumentar mede consultas, redesenhos e etapas do relatório (painel "Estatísticas" da
+# interface); --trace, --perfil e --memoria também gravam os eventos, um cProfile ou o
+# resumo do tracemalloc da sessão (e ligam a instrumentação).
+
+import argparse
+import csv
+import os
+import sys
+
+import banco
+import cliente
+import instrumentacao
+
+# Função para converter uma data AAAA-MM-DD (hora local) em epoch
+def data_para_epoch(texto):
+    try:
+        return banco.interpretar_data(texto)
+    except ValueError as erro:
+        raise argparse.ArgumentTypeError(str(erro)) from None
+
+# Função para converter uma data AAAA-MM-DD no último segundo desse dia (hora local)
+def fim_do_dia_para_epoch(texto):
+    try:
+        return banco.interpretar_data(texto, dias=1) - 1
+    except ValueError as erro:
+        raise argparse.ArgumentTypeError(str(erro)) from None
+
+# Função para converter um campo do CSV de vendas: inteiro, ou o próprio texto se não for
+def campo_inteiro(texto):
+    texto = texto.strip()
+    return int(texto) if texto.isascii() and texto.isdigit() else texto
+
+# Gerador das linhas (número da linha no arquivo, produto_id, quantidade) de um CSV de vendas
+# A primeira linha é o cabeçalho se o produto_id dela não for um número. Campos que não são
+# inteiros seguem como texto (None se faltarem) e o lote os rejeita com o motivo.
+def ler_vendas(caminho):
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        leitor = csv.reader(arquivo)
+        primeira = True
+        for linha in leitor:
+            if not any(campo.strip() for campo in linha):
+                continue
+            produto_id = campo_inteiro(linha[0])
+            if primeira and not isinstance(produto_id, int):
+                primeira = False
+                continue
+            primeira = False
+            quantidade = campo_inteiro(linha[1]) if len(linha) > 1 else None
+            yield leitor.line_num, produto_id, quantidade
+
+# Operações do banco local ou do serviço, conforme --servico
+def abrir_loja():
+    return cliente.conectar_servico() or cliente.OperacoesLocais()
+
+def comando_relatorio(args):
+    caminhos, caminho_png = abrir_loja().gerar_relatorio(
+        args.saida, args.formato, args.png, args.periodo, args.inicio, args.fim,
+        grafico=None if args.sem_grafico else args.grafico, limite_grafico=args.top, produto_id=args.produto,
+    )
+    if caminho_png:
+        caminhos.append(caminho_png)
+    print(f"Relatório gerado: {', '.join(caminhos)}")
+
+def comando_importar(args):
+    import importacao
+
+    resumo = importacao.importar_produtos(args.arquivo, args.formato, args.bloco)
+    print(f"{resumo['importados']} produtos importados, {resumo['rejeitados']} rejeitados")
+    for erro in resumo['erros']:
+        print(erro)
+
+def comando_exportar(args):
+    import importacao
+
+    total = importacao.exportar_produtos(args.arquivo, args.formato)
+    print(f"{total} produtos exportados para {args.arquivo}")
+
+def comando_vender(args):
+    if args.arquivo:
+        vendas = list(ler_vendas(args.arquivo))
+        aplicadas, rejeitadas = abrir_loja().registrar_vendas_em_lote([(produto_id, quantidade) for _, produto_id, quantidade in vendas])
+        print(f"{aplicadas} vendas aplicadas, {len(rejeitadas)} rejeitadas")
+        for linha in rejeitadas:
+            print(f"Linha {vendas[linha.posicao][0]}: produto {linha.produto_id}, quantidade {linha.quantidade}: {linha.motivo}")
+        return 1 if rejeitadas else 0
+
+    if args.produto_id is None or args.quantidade is None or args.quantidade <= 0:
+        print("Informe PRODUTO_ID e QUANTIDADE (maior que zero) ou --arquivo.", file=sys.stderr)
+        return 2
+    try:
+        nova_quantidade = abrir_loja().registrar_movimento(args.produto_id, -args.quantidade, banco.ACAO_VENDA)
+        # No modo local com gravação 'atraso' vem um Future: espera o lote para mostrar o saldo
+        if 'gravador' in sys.modules:
+            nova_quantidade = sys.modules['gravador'].quantidade(nova_quantidade)
+    except (banco.ProdutoNaoEncontrado, banco.EstoqueInsuficiente) as erro:
+        print(erro, file=sys.stderr)
+        return 1
+    print(f"Venda registrada. Estoque atual: {nova_quantidade}")
+    return 0
+
+def comando_historico(args):
+    total = abrir_loja().exportar_historico(args.arquivo, args.produto_id, args.inicio, args.fim)
+    print(f"{total} movimentações exportadas para {args.arquivo}")
+
+def comando_ponto_reposicao(args):
+    try:
+        abrir_loja().definir_ponto_reposicao(args.produto_id, args.ponto)
+    except (banco.ProdutoNaoEncontrado, ValueError) as erro:
+        print(erro, file=sys.stderr)
+        return 1
+    print(f"Ponto de reposição do produto {args.produto_id}: {args.ponto if args.ponto is not None else 'padrão'}")
+    return 0
+
+def comando_sugestao_compra(args):
+    total = abrir_loja().exportar_sugestao(args.saida, args.dias, args.cobertura)
+    print(f"Sugestão de compra de {total} produtos gravada em {args.saida}")
+
+def comando_filiais(args):
+    import filiais
+
+    if args.criar:
+        print(f"Filial {args.criar} pronta em {filiais.criar_filial(args.criar)}")
+        return 0
+    if args.buscar is not None:
+        for codigo, produto_id, nome, preco, quantidade in filiais.buscar_em_filiais(args.buscar):
+            print(f"{codigo}\t{produto_id}\t{nome}\tR$ {preco:.2f}\t{quantidade}")
+        return 0
+
+    for codigo, (produtos, unidades, valor) in filiais.em_paralelo(filiais.totais_filial).items():
+        print(f"{codigo}: {produtos} produtos, {unidades} unidades, R$ {valor:.2f} em estoque")
+    return 0
+
+def comando_consolidado(args):
+    import filiais
+
+    caminhos = filiais.gerar_consolidado(args.saida, args.formato, args.inicio, args.fim, args.processos)
+    print(f"Relatório consolidado gerado: {', '.join(caminhos)}")
+
+def comando_snapshot(args):
+    import auditoria
+
+    snapshot_id = auditoria.tirar_snapshot()
+    print(f"Retrato {snapshot_id} gravado" if snapshot_id else "Nada mudou desde o último retrato")
+
+# Função para gravar linhas CSV em um arquivo ou na saída padrão
+def escrever_csv(caminho, cabecalho, linhas):
+    arquivo = open(caminho, 'w', newline='', encoding='utf-8') if caminho else sys.stdout
+    try:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(cabecalho)
+        escritor.writerows(linhas)
+    finally:
+        if caminho:
+            arquivo.close()
+
+def comando_estoque_em(args):
+    import auditoria
+    import retencao
+
+    try:
+        estoque = auditoria.estoque_em(args.data, args.produto)
+    except retencao.ArquivoAusente as erro:
+        print(erro, file=sys.stderr)
+        return 2
+    escrever_csv(args.saida, ('produto_id', 'quantidade'), sorted(estoque.items()))
+    if args.saida:
+        print(f"Estoque de {len(estoque)} produtos em {banco.formatar_data(args.data)} gravado em {args.saida}")
+
+def comando_verificar(args):
+    import auditoria
+
+    divergencias = auditoria.verificar_estoque(args.desde_snapshot)
+    if args.saida or divergencias:
+        escrever_csv(args.saida, auditoria.Divergencia._fields, divergencias)
+    print(f"{len(divergencias)} divergências encontradas", file=sys.stderr)
+    return 1 if divergencias else 0
+
+def comando_compactar(args):
+    import retencao
+
+    if args.vacuum_completo:
+        print("Convertendo o banco para auto_vacuum incremental (VACUUM completo)...", flush=True)
+        retencao.converter_auto_vacuum()
+    try:
+        resultado = retencao.compactar(args.dias, args.compressao, args.lote)
+    except (ValueError, retencao.ArquivoAusente) as erro:
+        print(erro, file=sys.stderr)
+        return 2
+    print(f"{resultado['arquivadas']} movimentações arquivadas em {retencao.diretorio_arquivo()}, "
+          f"{resultado['orfaos']} produtos excluídos sem registro encerrados, "
+          f"{resultado['retratos_descartados']} retratos antigos descartados")
+    if resultado['paginas_liberadas'] is None:
+        print("O banco não usa auto_vacuum incremental; rode uma vez com --vacuum-completo para liberar o espaço.")
+    else:
+        print(f"{resultado['paginas_liberadas']} páginas liberadas")
+
+def comando_arquivo(args):
+    import retencao
+
+    try:
+        total = retencao.exportar_arquivo(args.arquivo, args.produto_id, args.inicio, args.fim)
+    except retencao.ArquivoAusente as erro:
+        print(erro, file=sys.stderr)
+        return 2
+    print(f"{total} movimentações arquivadas exportadas para {args.arquivo}")
+
+def comando_backup(args):
+    import backup
+
+    entrada = backup.fazer_backup(args.destino, args.paginas, args.pausa / 1000, args.forcar, args.manter)
+    if entrada is None:
+        print("Banco sem alterações desde a última cópia; nada a fazer.")
+        return
+    print(f"Cópia gravada em {os.path.join(args.destino or backup.DIRETORIO_BACKUPS, entrada['arquivo'])} "
+          f"({entrada['bytes'] / 2 ** 20:.1f} MiB em {entrada['segundos']:.2f} s, {entrada['reinicios']} recomeços)")
+    if entrada['passo_unico']:
+        print(f"Aviso: a cópia recomeçou mais de {backup.REINICIOS_MAXIMOS} vezes e o resto foi copiado num passo só "
+              "(o banco está em modo WAL?)")
+
+def comando_verificar_backup(args):
+    import backup
+
+    caminhos = args.arquivos or [caminho for caminho, _ in backup.listar_backups(args.destino)]
+    com_problemas = 0
+    for caminho in caminhos:
+        problemas = backup.verificar_backup(caminho)
+        print(f"{caminho}: {'ok' if not problemas else '; '.join(problemas)}")
+        com_problemas += bool(problemas)
+    return 1 if com_problemas else 0
+
+def comando_restaurar(args):
+    import backup
+
+    try:
+        guardada = backup.restaurar_backup(args.arquivo, not args.sem_copia, args.destino)
+    except ValueError as erro:
+        print(erro, file=sys.stderr)
+        return 2
+    if guardada is not None:
+        print(f"Banco anterior guardado em {guardada['arquivo']}")
+    print(f"{args.arquivo} restaurado em {banco.caminho_atual()}")
+
+def comando_servir(args):
+    import asyncio
+    import servico
+
+    host, porta = cliente.interpretar_endereco(args.endereco)
+
+    def avisar(endereco):
+        print(f"Serviço de estoque em {endereco[0]}:{endereco[1]} (banco {banco.CAMINHO_DB})", flush=True)
+
+    asyncio.run(servico.servir(host, porta, args.lote, ao_iniciar=avisar))
+
+def comando_gui(args):
+    # O script da interface monta a janela e entra no mainloop ao ser importado
+    import script  # noqa: F401
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='estoque', description="Controle de estoque do mercadinho")
+    parser.add_argument('--banco', default=banco.CAMINHO_DB, help="Arquivo do banco de dados")
+    parser.add_argument('--servico', default=cliente.ENDERECO_SERVICO, help="Endereço host:porta do serviço de estoque (modo cliente)")
+    parser.add_argument('--filial', help="Usa o banco da filial (filiais/FILIAL.db) em vez de --banco")
+    parser.add_argument('--gravacao', choices=('direto', 'commit', 'atraso'),
+                        help="Gravação das vendas locais: uma transação por venda (direto) ou em grupo (gravador.py)")
+    parser.add_argument('--instrumentar', action='store_true', help="Mede consultas, redesenhos e etapas do relatório")
+    parser.add_argument('--trace', help="Grava cada evento medido neste arquivo JSONL")
+    parser.add_argument('--perfil', help="Grava um cProfile da sessão neste arquivo (.prof)")
+    parser.add_argument('--memoria', action='store_true', help="Liga o tracemalloc e mostra o resumo ao sair")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_relatorio = subparsers.add_parser('relatorio', help="Gera o relatório (xlsx, csv ou parquet) e o gráfico")
+    p_relatorio.add_argument('--formato', choices=('xlsx', 'csv', 'parquet'), default='xlsx')
+    p_relatorio.add_argument('--saida', help="Arquivo do relatório (padrão: relatorio_estoque.<formato>)")
+    p_relatorio.add_argument('--png', default="relatorio_estoque.png", help="Arquivo do gráfico (.png ou .svg)")
+    p_relatorio.add_argument('--grafico', choices=('top', 'faixas', 'estoque'), default='top',
+                             help="Mais vendidos, produtos por faixa de preço ou nível de estoque no tempo")
+    p_relatorio.add_argument('--top', type=int, default=50, help="Barras no gráfico dos mais vendidos")
+    p_relatorio.add_argument('--produto', type=int, help="Produto do gráfico de estoque (padrão: catálogo inteiro)")
+    p_relatorio.add_argument('--sem-grafico', action='store_true', help="Não gera o gráfico")
+    p_relatorio.add_argument('--periodo', choices=('dia', 'semana', 'mes', 'ano'), default='mes')
+    p_relatorio.add_argument('--inicio', type=data_para_epoch, help="Primeiro dia (AAAA-MM-DD)")
+    p_relatorio.add_argument('--fim', type=data_para_epoch, help="Dia seguinte ao último (AAAA-MM-DD)")
+    p_relatorio.set_defaults(funcao=comando_relatorio)
+
+    p_importar = subparsers.add_parser('importar', help="Importa um catálogo CSV ou JSONL")
+    p_importar.add_argument('arquivo')
+    p_importar.add_argument('--formato', choices=('csv', 'jsonl'))
+    p_importar.add_argument('--bloco', type=int, default=5000, help="Linhas por transação")
+    p_importar.set_defaults(funcao=comando_importar)
+
+    p_exportar = subparsers.add_parser('exportar', help="Exporta o catálogo para CSV ou JSONL")
+    p_exportar.add_argument('arquivo')
+    p_exportar.add_argument('--formato', choices=('csv', 'jsonl'))
+    p_exportar.set_defaults(funcao=comando_exportar)
+
+    p_vender = subparsers.add_parser('vender', help="Registra uma venda ou um lote de vendas")
+    p_vender.add_argument('produto_id', type=int, nargs='?')
+    p_vender.add_argument('quantidade', type=int, nargs='?')
+    p_vender.add_argument('--arquivo', help="CSV com linhas produto_id,quantidade")
+    p_vender.set_defaults(funcao=comando_vender)
+
+    p_historico = subparsers.add_parser('historico', help="Exporta o histórico de um produto para CSV")
+    p_historico.add_argument('produto_id', type=int)
+    p_historico.add_argument('arquivo')
+    p_historico.add_argument('--inicio', type=data_para_epoch, help="Primeiro dia (AAAA-MM-DD)")
+    p_historico.add_argument('--fim', type=data_para_epoch, help="Dia seguinte ao último (AAAA-MM-DD)")
+    p_historico.set_defaults(funcao=comando_historico)
+
+    p_ponto = subparsers.add_parser('ponto-reposicao', help="Define o ponto de reposição de um produto")
+    p_ponto.add_argument('produto_id', type=int)
+    p_ponto.add_argument('ponto', type=int, nargs='?', help="Quantidade que dispara o alerta (omita para usar o padrão)")
+    p_ponto.set_defaults(funcao=comando_ponto_reposicao)
+
+    p_sugestao = subparsers.add_parser('sugestao-compra', help="Exporta a sugestão de compra pela velocidade de venda")
+    p_sugestao.add_argument('--saida', default='sugestao_compra.csv')
+    p_sugestao.add_argument('--dias', type=int, default=28, help="Dias de vendas usados na velocidade")
+    p_sugestao.add_argument('--cobertura', type=int, default=14, help="Dias de estoque que a compra deve cobrir")
+    p_sugestao.set_defaults(funcao=comando_sugestao_compra)
+
+    p_filiais = subparsers.add_parser('filiais', help="Lista as filiais com seus totais, cria ou busca em todas")
+    p_filiais.add_argument('--criar', metavar='FILIAL', help="Cria o banco de uma filial nova")
+    p_filiais.add_argument('--buscar', metavar='TERMO', help="Busca produtos em todas as filiais")
+    p_filiais.set_defaults(funcao=comando_filiais)
+
+    p_consolidado = subparsers.add_parser('consolidado', help="Relatório de todas as filiais (um processo por filial)")
+    p_consolidado.add_argument('--formato', choices=('xlsx', 'csv', 'parquet'), default='csv')
+    p_consolidado.add_argument('--saida', help="Arquivo do relatório (padrão: relatorio_consolidado.<formato>)")
+    p_consolidado.add_argument('--inicio', type=data_para_epoch, help="Primeiro dia (AAAA-MM-DD)")
+    p_consolidado.add_argument('--fim', type=data_para_epoch, help="Dia seguinte ao último (AAAA-MM-DD)")
+    p_consolidado.add_argument('--processos', type=int, help="Processos em paralelo (padrão: um por núcleo)")
+    p_consolidado.set_defaults(funcao=comando_consolidado)
+
+    p_snapshot = subparsers.add_parser('snapshot', help="Grava um retrato do estoque atual (para consultas por data)")
+    p_snapshot.set_defaults(funcao=comando_snapshot)
+
+    p_estoque_em = subparsers.add_parser('estoque-em', help="Estoque de cada produto no fechamento de uma data")
+    p_estoque_em.add_argument('data', type=fim_do_dia_para_epoch, help="Dia (AAAA-MM-DD)")
+    p_estoque_em.add_argument('--produto', type=int, help="Só este produto")
+    p_estoque_em.add_argument('--saida', help="Arquivo CSV (padrão: saída padrão)")
+    p_estoque_em.set_defaults(funcao=comando_estoque_em)
+
+    p_verificar = subparsers.add_parser('verificar', help="Confere o estoque de cada produto contra o histórico")
+    p_verificar.add_argument('--desde-snapshot', action='store_true', help="Só as movimentações depois do último retrato")
+    p_verificar.add_argument('--saida', help="Arquivo CSV com as divergências (padrão: saída padrão)")
+    p_verificar.set_defaults(funcao=comando_verificar)
+
+    p_compactar = subparsers.add_parser('compactar', help="Arquiva o histórico antigo e libera espaço no banco")
+    p_compactar.add_argument('--dias', type=int, default=365, help="Dias de histórico mantidos no banco")
+    p_compactar.add_argument('--compressao', choices=('gzip', 'zstd'), default='gzip', help="zstd precisa do pacote zstandard")
+    p_compactar.add_argument('--lote', type=int, default=5000, help="Movimentações arquivadas por transação")
+    p_compactar.add_argument('--vacuum-completo', action='store_true',
+                             help="Converte um banco antigo para auto_vacuum incremental (bloqueia as escritas enquanto roda)")
+    p_compactar.set_defaults(funcao=comando_compactar)
+
+    p_arquivo = subparsers.add_parser('arquivo', help="Exporta para CSV movimentações já arquivadas de um produto")
+    p_arquivo.add_argument('produto_id', type=int)
+    p_arquivo.add_argument('arquivo')
+    p_arquivo.add_argument('--inicio', type=data_para_epoch, help="Primeiro dia (AAAA-MM-DD)")
+    p_arquivo.add_argument('--fim', type=data_para_epoch, help="Dia seguinte ao último (AAAA-MM-DD)")
+    p_arquivo.set_defaults(funcao=comando_arquivo)
+
+    p_backup = subparsers.add_parser('backup', help="Copia o banco sem parar as vendas (pula se nada mudou)")
+    p_backup.add_argument('--destino', help="Pasta das cópias (padrão: backups)")
+    p_backup.add_argument('--paginas', type=int, default=1024, help="Páginas copiadas por passo (-1 = tudo de uma vez)")
+    p_backup.add_argument('--pausa', type=float, default=5, help="Pausa entre os passos, em milissegundos")
+    p_backup.add_argument('--manter', type=int, default=14, help="Cópias mantidas deste banco (0 = todas)")
+    p_backup.add_argument('--forcar', action='store_true', help="Copia mesmo sem alterações desde a última cópia")
+    p_backup.set_defaults(funcao=comando_backup)
+
+    p_verificar_backup = subparsers.add_parser('verificar-backup', help="Confere sha256 e integridade das cópias")
+    p_verificar_backup.add_argument('arquivos', nargs='*', help="Cópias a conferir (padrão: todas do manifesto)")
+    p_verificar_backup.add_argument('--destino', help="Pasta das cópias (padrão: backups)")
+    p_verificar_backup.set_defaults(funcao=comando_verificar_backup)
+
+    p_restaurar = subparsers.add_parser('restaurar', help="Restaura uma cópia sobre o banco (pare o serviço antes)")
+    p_restaurar.add_argument('arquivo')
+    p_restaurar.add_argument('--destino', help="Pasta onde o banco atual é guardado antes (padrão: backups)")
+    p_restaurar.add_argument('--sem-copia', action='store_true', help="Não guarda uma cópia do banco atual antes")
+    p_restaurar.set_defaults(funcao=comando_restaurar)
+
+    p_servir = subparsers.add_parser('servir', help="Roda o serviço de estoque para vários terminais")
+    p_servir.add_argument('--endereco', default=f"{cliente.HOST_PADRAO}:{cliente.PORTA_PADRAO}")
+    p_servir.add_argument('--lote', type=int, default=256, help="Pedidos de escrita por transação")
+    p_servir.set_defaults(funcao=comando_servir)
+
+    p_gui = subparsers.add_parser('gui', help="Abre a interface gráfica")
+    p_gui.set_defaults(funcao=comando_gui)
+
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    banco.configurar_banco(args.banco)
+    if args.filial:
+        import filiais
+        if args.filial not in filiais.listar_filiais():
+            print(f"Filial {args.filial} não existe (crie com: estoque.py filiais --criar {args.filial})", file=sys.stderr)
+            return 2
+        banco.configurar_banco(filiais.caminho_filial(args.filial))
+    if args.instrumentar or args.trace or args.perfil or args.memoria:
+        instrumentacao.ativar(args.trace, args.perfil, args.memoria)
+    if args.servico and args.funcao in (comando_importar, comando_exportar, comando_servir, comando_filiais, comando_consolidado,
+                                        comando_snapshot, comando_estoque_em, comando_verificar, comando_compactar, comando_arquivo,
+                                        comando_backup, comando_verificar_backup, comando_restaurar):
+        args.servico = None
+    cliente.configurar_servico(args.servico)
+    if not args.servico:
+        banco.criar_tabela()
+    if args.gravacao:
+        import gravador
+        gravador.configurar_gravacao(args.gravacao)
+    try:
+        return args.funcao(args) or 0
+    finally:
+        # Vendas ainda na fila do gravador são gravadas antes de fechar as conexões
+        if 'gravador' in sys.modules:
+            sys.modules['gravador'].encerrar_gravacao()
+        banco.fechar_conexoes()
+        instrumentacao.encerrar()
+
+if __name__ == '__main__':
+    sys.exit(main())
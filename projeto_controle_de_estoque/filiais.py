@@ -0,0 +1,201 @@
+# Várias lojas (filiais), cada uma com o próprio arquivo SQLite em DIRETORIO_FILIAIS: o
+# estoque de cada local fica no produtos.quantidade do seu arquivo, e as escritas de uma
+# filial não disputam o bloqueio de escrita das outras (abrir uma filial nova não deixa as
+# demais mais lentas). Os produtos são identificados entre filiais pelo nome.
+#
+# As consultas que cruzam filiais rodam em paralelo, uma thread por filial com
+# banco.usar_banco (o sqlite3 solta o GIL enquanto a consulta roda), e os resultados são
+# juntados aqui. O relatório consolidado (noturno) calcula cada filial num processo
+# separado, usando todos os núcleos, e grava com os mesmos gravadores do relatorio.py.
+
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import banco
+import busca
+import resumo
+
+# Pasta com um arquivo .db por filial
+DIRETORIO_FILIAIS = 'filiais'
+EXTENSAO = '.db'
+
+# Threads para as consultas que cruzam filiais
+THREADS_CONSULTA = 8
+
+# Ids lidos por consulta ao montar as linhas de uma busca
+LOTE_IDS = 500
+
+CAMINHO_CONSOLIDADO = 'relatorio_consolidado'
+
+# Códigos de filial aceitos (viram nome de arquivo)
+PADRAO_CODIGO = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Estoque e vendas de uma filial agrupados pelo nome do produto
+SQL_VENDAS_FILIAL = '''
+    SELECT p.nome,
+           SUM(p.quantidade),
+           SUM(COALESCE(v.vendidas, 0)),
+           SUM(COALESCE(v.receita, 0))
+    FROM produtos p
+    LEFT JOIN (
+        SELECT produto_id, SUM(unidades_vendidas) AS vendidas, SUM(receita) AS receita
+        FROM resumo_diario
+        WHERE dia >= ? AND dia < ?
+        GROUP BY produto_id
+    ) v ON v.produto_id = p.id
+    GROUP BY p.nome
+'''
+
+# Tabelas do consolidado, lidas do banco em memória montado com o resultado das filiais
+SQL_CONSOLIDADO_PRODUTOS = '''
+    SELECT produto AS "Produto",
+           COUNT(*) AS "Filiais",
+           SUM(quantidade) AS "Quantidade Atual",
+           SUM(vendidas) AS "Quantidade Vendida",
+           SUM(receita) AS "Receita",
+           CASE WHEN 2 * SUM(quantidade) + SUM(vendidas) > 0
+                THEN 2.0 * SUM(vendidas) / (2 * SUM(quantidade) + SUM(vendidas))
+                ELSE 0 END AS "Giro"
+    FROM vendas_filial
+    GROUP BY produto
+    ORDER BY produto
+'''
+
+SQL_CONSOLIDADO_FILIAIS = '''
+    SELECT filial AS "Filial",
+           COUNT(*) AS "Produtos",
+           SUM(quantidade) AS "Quantidade Atual",
+           SUM(vendidas) AS "Quantidade Vendida",
+           SUM(receita) AS "Receita"
+    FROM vendas_filial
+    GROUP BY filial
+    ORDER BY filial
+'''
+
+_executor = None
+_trava_executor = threading.Lock()
+
+# Função para trocar a pasta das filiais
+def configurar_filiais(diretorio):
+    global DIRETORIO_FILIAIS
+    DIRETORIO_FILIAIS = diretorio
+
+# Função para obter o arquivo do banco de uma filial
+def caminho_filial(codigo):
+    if not PADRAO_CODIGO.match(codigo):
+        raise ValueError(f"Código de filial inválido: {codigo} (use letras, números, - e _)")
+    return os.path.join(DIRETORIO_FILIAIS, codigo + EXTENSAO)
+
+# Função para listar os códigos das filiais existentes
+def listar_filiais():
+    if not os.path.isdir(DIRETORIO_FILIAIS):
+        return []
+    return sorted(nome[:-len(EXTENSAO)] for nome in os.listdir(DIRETORIO_FILIAIS) if nome.endswith(EXTENSAO))
+
+# Função para criar (ou migrar) o banco de uma filial
+def criar_filial(codigo):
+    caminho = caminho_filial(codigo)
+    os.makedirs(DIRETORIO_FILIAIS, exist_ok=True)
+    with banco.usar_banco(caminho):
+        banco.criar_tabela()
+    return caminho
+
+# Função para rodar uma função do módulo banco (ou que use conectar_db) numa filial
+def na_filial(codigo, funcao, *args):
+    with banco.usar_banco(caminho_filial(codigo)):
+        return funcao(*args)
+
+def executor_consultas():
+    global _executor
+    with _trava_executor:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THREADS_CONSULTA, thread_name_prefix='estoque-filial')
+        return _executor
+
+# Função para rodar a mesma consulta em várias filiais ao mesmo tempo
+# Retorna {codigo: resultado} na ordem das filiais; um erro em qualquer filial é repassado.
+def em_paralelo(funcao, *args, filiais=None):
+    filiais = listar_filiais() if filiais is None else list(filiais)
+    futuros = [executor_consultas().submit(na_filial, codigo, funcao, *args) for codigo in filiais]
+    return {codigo: futuro.result() for codigo, futuro in zip(filiais, futuros)}
+
+# Totais de uma filial: (produtos, unidades em estoque, valor do estoque)
+def totais_filial():
+    return tuple(banco.conectar_db().execute(
+        'SELECT COUNT(*), COALESCE(SUM(quantidade), 0), COALESCE(SUM(quantidade * preco), 0) FROM produtos'
+    ).fetchone())
+
+# Estoque de uma filial por nome de produto: {nome: quantidade}
+def estoque_por_nome():
+    return dict(banco.conectar_db().execute('SELECT nome, SUM(quantidade) FROM produtos GROUP BY nome'))
+
+# Função para juntar o estoque de todas as filiais por produto
+# Retorna [(nome, quantidade total, {filial: quantidade})] em ordem de nome.
+def estoque_consolidado(filiais=None):
+    por_produto = {}
+    for codigo, estoque in em_paralelo(estoque_por_nome, filiais=filiais).items():
+        for nome, quantidade in estoque.items():
+            por_produto.setdefault(nome, {})[codigo] = quantidade
+    return [(nome, sum(locais.values()), locais) for nome, locais in sorted(por_produto.items())]
+
+# Busca numa filial devolvendo as linhas (id, nome, preco, quantidade)
+def buscar_linhas(termo='', preco_min=None, preco_max=None, estoque_max=None, limite=busca.LIMITE_RESULTADOS):
+    ids = busca.buscar_produtos(termo, preco_min, preco_max, estoque_max, limite)
+    conn = banco.conectar_db()
+    linhas = []
+    for inicio in range(0, len(ids), LOTE_IDS):
+        lote = ids[inicio:inicio + LOTE_IDS]
+        marcadores = ', '.join('?' * len(lote))
+        linhas += conn.execute(f'SELECT id, nome, preco, quantidade FROM produtos WHERE id IN ({marcadores}) ORDER BY id', lote)
+    return linhas
+
+# Função para buscar produtos em todas as filiais; retorna [(filial, id, nome, preco, quantidade)]
+def buscar_em_filiais(termo='', preco_min=None, preco_max=None, estoque_max=None, limite=busca.LIMITE_RESULTADOS, filiais=None):
+    resultados = em_paralelo(buscar_linhas, termo, preco_min, preco_max, estoque_max, limite, filiais=filiais)
+    return [(codigo, *linha) for codigo, linhas in resultados.items() for linha in linhas]
+
+# Roda num processo do consolidado: atualiza o resumo diário da filial e devolve as
+# linhas (nome, quantidade, vendidas, receita) agrupadas por produto
+# Bancos de filial de versões antigas (ex.: um mercadinho.db copiado para filiais/) são
+# migrados antes, como em criar_filial, para ter as tabelas do resumo.
+def calcular_filial(caminho, inicio, fim):
+    banco.configurar_banco(caminho)
+    try:
+        banco.criar_tabela()
+        resumo.atualizar_resumo()
+        conn = banco.conectar_db()
+        return conn.execute(SQL_VENDAS_FILIAL, resumo.intervalo_dias(conn, inicio, fim)).fetchall()
+    finally:
+        banco.fechar_conexoes()
+
+# Função para gerar o relatório consolidado de todas as filiais
+# Cada filial é calculada num processo ("processos", padrão: um por núcleo); os resultados
+# vão para um banco em memória e as tabelas "Produtos" (somadas por nome) e "Filiais" são
+# gravadas no "formato" pedido (relatorio.FORMATOS). Retorna a lista de arquivos gravados.
+def gerar_consolidado(caminho_saida=None, formato='csv', inicio=None, fim=None, processos=None, filiais=None):
+    import relatorio
+
+    if formato not in relatorio.FORMATOS:
+        raise ValueError(f"Formato de relatório desconhecido: {formato}")
+    caminho_saida = caminho_saida or CAMINHO_CONSOLIDADO + relatorio.FORMATOS[formato]
+    filiais = listar_filiais() if filiais is None else list(filiais)
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE vendas_filial (filial TEXT, produto TEXT, quantidade INTEGER, vendidas INTEGER, receita REAL)')
+    with ProcessPoolExecutor(max_workers=processos or os.cpu_count()) as processos_filiais:
+        futuros = {processos_filiais.submit(calcular_filial, caminho_filial(codigo), inicio, fim): codigo for codigo in filiais}
+        for futuro in as_completed(futuros):
+            codigo = futuros[futuro]
+            conn.executemany('INSERT INTO vendas_filial VALUES (?, ?, ?, ?, ?)', ((codigo, *linha) for linha in futuro.result()))
+
+    tabelas = [
+        ("Produtos", "", SQL_CONSOLIDADO_PRODUTOS, ()),
+        ("Filiais", "_filiais", SQL_CONSOLIDADO_FILIAIS, ()),
+    ]
+    try:
+        return relatorio.GRAVADORES[formato](conn, tabelas, caminho_saida)
+    finally:
+        conn.close()
@@ -0,0 +1,162 @@
+# Gráficos do relatório. Os dados são agregados no SQLite antes de desenhar, então cada
+# gráfico tem um número limitado de elementos (barras, faixas ou uma única linha) e o
+# tempo de desenho não cresce com o catálogo. O desenho é feito numa Figure sem tela
+# (backend Agg); o formato (PNG ou SVG) vem da extensão do arquivo.
+
+from datetime import date
+
+import resumo
+
+# Modos de gráfico disponíveis no relatório
+MODOS = ('top', 'faixas', 'estoque')
+
+# Máximo de barras no gráfico dos mais vendidos
+LIMITE_BARRAS = 50
+
+# Quantidade de faixas de preço no histograma
+FAIXAS_PRECO = 20
+
+# Tamanho máximo do nome do produto nos rótulos
+TAMANHO_ROTULO = 30
+
+# Produtos mais vendidos no intervalo de dias
+SQL_MAIS_VENDIDOS = '''
+    SELECT p.nome, SUM(r.unidades_vendidas) AS vendidas
+    FROM resumo_diario r
+    JOIN produtos p ON p.id = r.produto_id
+    WHERE r.dia >= ? AND r.dia < ?
+    GROUP BY r.produto_id
+    HAVING vendidas > 0
+    ORDER BY vendidas DESC, r.produto_id
+    LIMIT ?
+'''
+
+# Produtos e unidades em estoque por faixa de preço (a última faixa inclui o preço máximo)
+SQL_FAIXAS_PRECO = '''
+    SELECT MIN(CAST((preco - ?) / ? AS INTEGER), ? - 1) AS faixa, COUNT(*), SUM(quantidade)
+    FROM produtos
+    GROUP BY faixa
+    ORDER BY faixa
+'''
+
+# Variação total do estoque por dia local a partir de um dia, só dos produtos que ainda
+# existem, pelo resumo diário: o fechamento de cada produto menos o fechamento anterior dele
+# (o do dia anterior no intervalo pelo LAG ou, no 1º dia, o último antes do intervalo, lido
+# pela chave primária (produto_id, dia); 0 se o produto não existia)
+SQL_VARIACAO_POR_DIA = '''
+    SELECT dia, SUM(variacao) FROM (
+        SELECT r.dia, r.estoque_fechamento - COALESCE(
+            LAG(r.estoque_fechamento) OVER (PARTITION BY r.produto_id ORDER BY r.dia),
+            (SELECT a.estoque_fechamento FROM resumo_diario a
+             WHERE a.produto_id = r.produto_id AND a.dia < ?1 ORDER BY a.dia DESC LIMIT 1),
+            0) AS variacao
+        FROM resumo_diario r
+        JOIN produtos p ON p.id = r.produto_id
+        WHERE r.dia >= ?1
+    )
+    GROUP BY dia
+    ORDER BY dia DESC
+'''
+
+# Função para encurtar nomes longos nos rótulos do gráfico
+def rotulo(nome):
+    nome = nome or "(sem nome)"
+    return nome if len(nome) <= TAMANHO_ROTULO else nome[:TAMANHO_ROTULO - 1] + "…"
+
+# Função para ler os "limite" produtos mais vendidos: lista de (nome, unidades vendidas)
+def mais_vendidos(conn, inicio=None, fim=None, limite=LIMITE_BARRAS):
+    return conn.execute(SQL_MAIS_VENDIDOS, resumo.intervalo_dias(conn, inicio, fim) + (limite,)).fetchall()
+
+# Função para contar produtos e unidades por faixa de preço
+# Retorna lista de (preço inicial, preço final, produtos, unidades em estoque).
+def faixas_preco(conn, faixas=FAIXAS_PRECO):
+    menor, maior = conn.execute('SELECT MIN(preco), MAX(preco) FROM produtos').fetchone()
+    if menor is None:
+        return []
+    largura = (maior - menor) / faixas or 1
+    cursor = conn.execute(SQL_FAIXAS_PRECO, (menor, largura, faixas))
+    return [(menor + faixa * largura, menor + (faixa + 1) * largura, produtos, unidades) for faixa, produtos, unidades in cursor]
+
+# Função para calcular o estoque total do catálogo no fim de cada dia com movimentação
+# Parte do estoque atual e volta no tempo desfazendo a variação de cada dia do resumo
+# diário (que também cobre o histórico já arquivado); atualize o resumo antes.
+# Retorna lista de (dia, unidades em estoque) em ordem de dia.
+def estoque_catalogo_por_dia(conn, inicio=None, fim=None):
+    nivel = conn.execute('SELECT COALESCE(SUM(quantidade), 0) FROM produtos').fetchone()[0]
+    dia_inicio, dia_fim = resumo.intervalo_dias(conn, inicio, fim)
+    serie = []
+    for dia, variacao in conn.execute(SQL_VARIACAO_POR_DIA, (dia_inicio,)):
+        if dia < dia_fim:
+            serie.append((dia, nivel))
+        nivel -= variacao
+    serie.reverse()
+    return serie
+
+# Função para criar uma figura sem tela com um único eixo
+def nova_figura(titulo):
+    from matplotlib.figure import Figure
+
+    figura = Figure(figsize=(8, 5))
+    eixo = figura.subplots()
+    eixo.set_title(titulo)
+    return figura, eixo
+
+# Função para gravar a figura no arquivo (PNG ou SVG, pela extensão)
+def salvar_figura(figura, caminho):
+    figura.tight_layout()
+    figura.savefig(caminho)
+
+# Gráfico de barras horizontais dos produtos mais vendidos
+def grafico_mais_vendidos(conn, caminho, inicio=None, fim=None, limite=LIMITE_BARRAS):
+    linhas = mais_vendidos(conn, inicio, fim, limite)
+    figura, eixo = nova_figura(f"Top {limite} produtos mais vendidos")
+    posicoes = range(len(linhas))
+    eixo.barh(posicoes, [vendidas for _, vendidas in linhas])
+    eixo.set_yticks(posicoes, [rotulo(nome) for nome, _ in linhas], fontsize='small')
+    eixo.invert_yaxis()
+    eixo.set_xlabel("Quantidade vendida")
+    salvar_figura(figura, caminho)
+
+# Histograma de produtos por faixa de preço
+def grafico_faixas_preco(conn, caminho, faixas=FAIXAS_PRECO):
+    linhas = faixas_preco(conn, faixas)
+    figura, eixo = nova_figura("Produtos por faixa de preço")
+    eixo.bar(
+        [inicio for inicio, _, _, _ in linhas],
+        [produtos for _, _, produtos, _ in linhas],
+        width=[fim - inicio for inicio, fim, _, _ in linhas],
+        align='edge',
+    )
+    eixo.set_xlabel("Preço")
+    eixo.set_ylabel("Produtos")
+    salvar_figura(figura, caminho)
+
+# Série do nível de estoque: de um produto (pelo resumo diário) ou do catálogo inteiro
+def grafico_estoque(conn, caminho, inicio=None, fim=None, produto_id=None):
+    if produto_id is None:
+        serie = estoque_catalogo_por_dia(conn, inicio, fim)
+        titulo = "Estoque total do catálogo"
+    else:
+        serie = resumo.estoque_por_dia(conn, produto_id, inicio, fim)
+        titulo = f"Estoque do produto {produto_id}"
+
+    figura, eixo = nova_figura(titulo)
+    eixo.plot([date.fromisoformat(dia) for dia, _ in serie], [nivel for _, nivel in serie], drawstyle='steps-post')
+    eixo.set_ylabel("Quantidade")
+    figura.autofmt_xdate()
+    salvar_figura(figura, caminho)
+
+# Função para desenhar o gráfico do relatório no modo escolhido
+# "limite" é o número de barras do modo top e "produto_id" escolhe o produto do modo estoque.
+def gerar_grafico(conn, modo, caminho, inicio=None, fim=None, limite=LIMITE_BARRAS, produto_id=None):
+    import matplotlib
+    matplotlib.use("Agg")
+
+    if modo == 'top':
+        grafico_mais_vendidos(conn, caminho, inicio, fim, limite)
+    elif modo == 'faixas':
+        grafico_faixas_preco(conn, caminho)
+    elif modo == 'estoque':
+        grafico_estoque(conn, caminho, inicio, fim, produto_id)
+    else:
+        raise ValueError(f"Modo de gráfico desconhecido: {modo}")
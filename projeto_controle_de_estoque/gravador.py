@@ -0,0 +1,201 @@
+# Gravação em grupo dos movimentos de estoque: os movimentos entram numa fila em memória
+# e uma thread gravadora aplica vários de uma vez numa única transação (uma atualização
+# de estoque e um INSERT no histórico por movimento, via banco.aplicar_movimentos), então
+# o custo do COMMIT e do fsync é dividido pelo lote inteiro.
+#
+# Modos de durabilidade:
+# - 'commit': registrar_movimento só retorna depois do COMMIT do lote, gravado com
+#   synchronous = FULL (sobrevive a queda de energia). O lote é formado pelos movimentos
+#   que chegaram enquanto o anterior era gravado, sem espera extra.
+# - 'atraso': registrar_movimento retorna na hora um Future; o movimento é gravado em no
+#   máximo "atraso_maximo" segundos (ou antes, se o lote encher). Uma queda do processo
+#   nesse intervalo perde os movimentos ainda na fila. Cancelar o Future antes da gravação
+#   tira o movimento do lote.
+# Na saída do programa (atexit) a fila é sempre gravada antes de encerrar; quem fecha as
+# conexões com banco.fechar_conexoes() deve chamar fechar() antes.
+#
+# As vendas do modo local (interface e linha de comando, via cliente.OperacoesLocais)
+# passam por registrar_movimento() deste módulo: no modo 'direto' (padrão) cada movimento
+# é uma transação, como em banco.registrar_movimento; com 'commit' ou 'atraso'
+# (estoque.py --gravacao ou a variável ESTOQUE_GRAVACAO) vão para um GravadorMovimentos
+# compartilhado e, no 'atraso', quem chama recebe o Future sem esperar o lote. O serviço de
+# estoque (servico.py) já grava em grupo pela própria fila.
+
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import banco
+
+MODOS = ('commit', 'atraso')
+
+# Modo das vendas locais: 'direto' (sem gravador) ou um dos MODOS
+MODO_GRAVACAO = os.environ.get('ESTOQUE_GRAVACAO') or 'direto'
+
+# Movimentos gravados por transação, no máximo
+TAMANHO_LOTE = 1000
+
+# Espera máxima, no modo 'atraso', entre o registro de um movimento e a sua gravação
+ATRASO_MAXIMO = 0.05
+
+# Nível de synchronous da conexão da thread gravadora em cada modo
+SYNCHRONOUS = {
+    'commit': 'FULL',
+    'atraso': 'NORMAL',
+}
+
+# Erro para movimentos registrados depois que o gravador foi fechado
+class GravadorEncerrado(RuntimeError):
+    def __init__(self):
+        super().__init__("O gravador de movimentos já foi encerrado.")
+
+class GravadorMovimentos:
+    def __init__(self, modo='commit', tamanho_lote=TAMANHO_LOTE, atraso_maximo=ATRASO_MAXIMO):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de gravação desconhecido: {modo}")
+        self.modo = modo
+        self.tamanho_lote = tamanho_lote
+        self.atraso_maximo = atraso_maximo if modo == 'atraso' else 0
+        self.fila = queue.SimpleQueue()
+        self.trava = threading.Lock()
+        self.fechado = False
+        self.thread = threading.Thread(target=self.gravar, name='estoque-gravador', daemon=True)
+        self.thread.start()
+        atexit.register(self.fechar)
+
+    # Registra um movimento (delta negativo é saída), com os mesmos argumentos de
+    # banco.registrar_movimento. No modo 'commit' devolve a nova quantidade ou lança o erro
+    # (ProdutoNaoEncontrado, EstoqueInsuficiente); no modo 'atraso' devolve um Future.
+    def registrar_movimento(self, produto_id, delta, acao):
+        futuro = Future()
+        self.enfileirar((produto_id, delta, acao, futuro))
+        if self.modo == 'commit':
+            return futuro.result()
+        return futuro
+
+    def enfileirar(self, item):
+        with self.trava:
+            if self.fechado:
+                raise GravadorEncerrado()
+            self.fila.put(item)
+
+    # Espera até que todos os movimentos registrados antes desta chamada estejam gravados
+    def descarregar(self):
+        marcador = Future()
+        self.enfileirar(marcador)
+        marcador.result()
+
+    # Grava o que estiver na fila e encerra a thread gravadora
+    def fechar(self):
+        with self.trava:
+            if self.fechado:
+                return
+            self.fechado = True
+            self.fila.put(None)
+        self.thread.join()
+        atexit.unregister(self.fechar)
+
+    # Thread gravadora: junta os movimentos da fila em lotes e grava cada lote numa transação
+    # Uma falha inesperada num lote vai para os Futures dele; a thread segue atendendo a fila.
+    def gravar(self):
+        banco.conectar_db().execute(f'PRAGMA synchronous = {SYNCHRONOUS[self.modo]}')
+        encerrar = False
+        while not encerrar:
+            lote, marcadores, encerrar = self.montar_lote(self.fila.get())
+            try:
+                if lote:
+                    self.gravar_lote(lote)
+            except Exception as erro:
+                for *_, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(erro)
+            for marcador in marcadores:
+                marcador.set_result(None)
+
+    # Junta ao primeiro item o que chegar até o lote encher ou o prazo do modo acabar
+    # Um pedido de descarregar (marcador) ou de encerrar grava o lote na hora.
+    def montar_lote(self, item):
+        lote = []
+        marcadores = []
+        prazo = time.monotonic() + self.atraso_maximo
+        while True:
+            if item is None:
+                return lote, marcadores, True
+            if isinstance(item, Future):
+                marcadores.append(item)
+            else:
+                lote.append(item)
+            if marcadores or len(lote) >= self.tamanho_lote:
+                return lote, marcadores, False
+
+            espera = prazo - time.monotonic()
+            try:
+                item = self.fila.get(timeout=espera) if espera > 0 else self.fila.get_nowait()
+            except queue.Empty:
+                return lote, marcadores, False
+
+    def gravar_lote(self, lote):
+        # Movimentos com o Future cancelado por quem registrou não são gravados
+        lote = [item for item in lote if item[3].set_running_or_notify_cancel()]
+        if not lote:
+            return
+        try:
+            resultados = banco.aplicar_movimentos((produto_id, delta, acao) for produto_id, delta, acao, _ in lote)
+        except Exception as erro:
+            for *_, futuro in lote:
+                futuro.set_exception(erro)
+            return
+
+        for (*_, futuro), resultado in zip(lote, resultados):
+            if isinstance(resultado, Exception):
+                futuro.set_exception(resultado)
+            else:
+                futuro.set_result(resultado)
+
+_gravador = None
+_trava_gravador = threading.Lock()
+
+# Função para escolher o modo de gravação das vendas locais ('direto', 'commit' ou 'atraso')
+# Um gravador já aberto em outro modo grava a fila e é fechado.
+def configurar_gravacao(modo):
+    global MODO_GRAVACAO
+    if modo != 'direto' and modo not in MODOS:
+        raise ValueError(f"Modo de gravação desconhecido: {modo}")
+    if modo != MODO_GRAVACAO:
+        encerrar_gravacao()
+    MODO_GRAVACAO = modo
+
+# Função para obter o gravador compartilhado (criado no primeiro uso); None no modo 'direto'
+def obter_gravador():
+    global _gravador
+    if MODO_GRAVACAO == 'direto':
+        return None
+    with _trava_gravador:
+        if _gravador is None:
+            _gravador = GravadorMovimentos(MODO_GRAVACAO)
+        return _gravador
+
+# Função para registrar um movimento no modo configurado
+# Devolve a nova quantidade ('direto' e 'commit') ou, no modo 'atraso', um Future com ela,
+# sem esperar o lote; use quantidade() para obter o valor de qualquer um dos dois.
+def registrar_movimento(produto_id, delta, acao):
+    grav = obter_gravador()
+    if grav is None:
+        return banco.registrar_movimento(produto_id, delta, acao)
+    return grav.registrar_movimento(produto_id, delta, acao)
+
+# Função para obter a nova quantidade devolvida por registrar_movimento
+# Com um Future (modo 'atraso') espera o lote ser gravado e lança o erro do movimento, se houver.
+def quantidade(resultado):
+    return resultado.result() if isinstance(resultado, Future) else resultado
+
+# Função para gravar a fila pendente e fechar o gravador compartilhado (ao encerrar o programa)
+def encerrar_gravacao():
+    global _gravador
+    with _trava_gravador:
+        grav, _gravador = _gravador, None
+    if grav is not None:
+        grav.fechar()
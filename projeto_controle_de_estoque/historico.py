@@ -0,0 +1,90 @@
+# Histórico de um produto paginado: as páginas seguem a ordem (data_movimentacao, id) do
+# índice idx_historico_produto_data e avançam por keyset, então abrir ou rolar o histórico
+# de um produto com centenas de milhares de movimentações só lê as linhas da tela.
+
+import csv
+
+import banco
+
+CAMPOS_EXPORTACAO = ('id', 'data', 'acao', 'quantidade_anterior', 'quantidade_atual', 'preco_anterior', 'preco_atual')
+
+COLUNAS = 'id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao'
+
+# Função para montar o filtro das movimentações de um produto no intervalo [inicio, fim)
+def filtro_historico(produto_id, inicio=None, fim=None):
+    condicoes = 'produto_id = ?'
+    parametros = [produto_id]
+    if inicio is not None:
+        condicoes += ' AND data_movimentacao >= ?'
+        parametros.append(inicio)
+    if fim is not None:
+        condicoes += ' AND data_movimentacao < ?'
+        parametros.append(fim)
+    return condicoes, parametros
+
+# Função para contar as movimentações de um produto no intervalo
+def contar_historico(produto_id, inicio=None, fim=None):
+    condicoes, parametros = filtro_historico(produto_id, inicio, fim)
+    return banco.conectar_db().execute(f'SELECT COUNT(*) FROM historico WHERE {condicoes}', parametros).fetchone()[0]
+
+# Função para ler uma página de movimentações a partir de "posicao"
+# Com "apos" = (data_movimentacao, id) continua depois dessa movimentação em vez de usar OFFSET.
+def pagina_historico(produto_id, inicio, fim, posicao, limite, apos=None):
+    condicoes, parametros = filtro_historico(produto_id, inicio, fim)
+    if apos is not None:
+        condicoes += ' AND (data_movimentacao, id) > (?, ?)'
+        parametros += list(apos)
+        posicao = 0
+
+    cursor = banco.conectar_db().execute(
+        f'SELECT {COLUNAS} FROM historico WHERE {condicoes} ORDER BY data_movimentacao, id LIMIT ? OFFSET ?',
+        parametros + [limite, posicao],
+    )
+    return cursor.fetchall()
+
+# Fonte de dados da ListaVirtual com as movimentações de um produto no intervalo [inicio, fim)
+# As linhas são (id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual,
+# data_movimentacao); "inicio" e "fim" são instantes em epoch (None = sem limite).
+# "origem" fornece contar_historico e pagina_historico (padrão: este módulo, direto no banco;
+# o cliente do serviço de estoque tem os mesmos métodos).
+class FonteHistorico:
+    def __init__(self, produto_id, inicio=None, fim=None, origem=None):
+        self.produto_id = produto_id
+        self.inicio = inicio
+        self.fim = fim
+        self.contar = origem.contar_historico if origem is not None else contar_historico
+        self.ler_pagina = origem.pagina_historico if origem is not None else pagina_historico
+        # Linhas da última página por id, para continuar o keyset a partir de uma delas
+        self.linhas = {}
+
+    def total(self):
+        return self.contar(self.produto_id, self.inicio, self.fim)
+
+    def pagina(self, posicao, limite, apos_id=None):
+        anterior = self.linhas.get(apos_id)
+        apos = (anterior[6], anterior[0]) if anterior is not None else None
+        linhas = self.ler_pagina(self.produto_id, self.inicio, self.fim, posicao, limite, apos)
+        self.linhas = {linha[0]: linha for linha in linhas}
+        return linhas
+
+    # Movimentações não mudam depois de gravadas: a linha vem da página já lida
+    def produto(self, movimentacao_id):
+        return self.linhas.get(movimentacao_id)
+
+# Função para exportar as movimentações de um produto no intervalo para CSV
+# As linhas são lidas do cursor e gravadas uma a uma. Retorna quantas foram exportadas.
+def exportar_historico(caminho, produto_id, inicio=None, fim=None):
+    condicoes, parametros = filtro_historico(produto_id, inicio, fim)
+    cursor = banco.conectar_db().execute(
+        f'SELECT {COLUNAS} FROM historico WHERE {condicoes} ORDER BY data_movimentacao, id', parametros,
+    )
+    total = 0
+
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(CAMPOS_EXPORTACAO)
+        for movimentacao_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data in cursor:
+            escritor.writerow((movimentacao_id, banco.formatar_data(data), acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual))
+            total += 1
+
+    return total
@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+from itertools import islice
+
+import banco
+
+# Linhas gravadas por transação durante a importação
+TAMANHO_BLOCO = 5000
+
+# Quantidade máxima de mensagens de erro guardadas no resumo da importação
+LIMITE_ERROS = 100
+
+FORMATOS = ('csv', 'jsonl')
+
+CAMPOS_EXPORTACAO = ('id', 'nome', 'preco', 'quantidade')
+
+SQL_UPSERT_PRODUTO = '''
+    INSERT INTO produtos (id, nome, preco, quantidade) VALUES (?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET nome = excluded.nome, preco = excluded.preco, quantidade = excluded.quantidade
+'''
+
+# Função para descobrir o formato pelo nome do arquivo
+def detectar_formato(caminho):
+    extensao = os.path.splitext(caminho)[1].lower().lstrip('.')
+    if extensao == 'json':
+        extensao = 'jsonl'
+    if extensao not in FORMATOS:
+        raise ValueError(f"Formato não reconhecido para {caminho}; use --formato {' ou '.join(FORMATOS)}")
+    return extensao
+
+# Gerador que lê um CSV com cabeçalho (nome, preco, quantidade e opcionalmente id)
+# utf-8-sig descarta o BOM das planilhas salvas em UTF-8, que grudaria no nome da 1ª coluna.
+def ler_csv(caminho):
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        for numero, registro in enumerate(csv.DictReader(arquivo), start=2):
+            yield numero, registro
+
+# Gerador que lê um JSONL com um objeto de produto por linha
+# Linhas que não são JSON válido saem como None, para serem rejeitadas na validação.
+def ler_jsonl(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                registro = None
+            yield numero, registro
+
+# Função para ler os registros de um catálogo sem carregá-lo inteiro na memória
+def ler_registros(caminho, formato=None):
+    formato = formato or detectar_formato(caminho)
+    if formato == 'csv':
+        return ler_csv(caminho)
+    return ler_jsonl(caminho)
+
+# Função para validar o id de um registro: inteiro positivo, ou texto só com dígitos (CSV)
+def validar_id(produto_id):
+    if isinstance(produto_id, str):
+        produto_id = produto_id.strip()
+        if produto_id.isascii() and produto_id.isdigit():
+            produto_id = int(produto_id)
+    if isinstance(produto_id, bool) or not isinstance(produto_id, int) or produto_id <= 0:
+        raise ValueError("ID deve ser um inteiro positivo!")
+    return produto_id
+
+# Função para validar um registro do catálogo da mesma forma que a tela de cadastro
+def validar_registro(registro):
+    if registro is None:
+        raise ValueError("JSON inválido")
+    if not isinstance(registro, dict):
+        raise ValueError("Cada linha deve ser um objeto JSON com os campos do produto")
+    nome, preco, quantidade = banco.validar_produto(registro.get('nome'), registro.get('preco'), registro.get('quantidade'))
+
+    produto_id = registro.get('id')
+    if produto_id is None or produto_id == '':
+        return None, nome, preco, quantidade
+    return validar_id(produto_id), nome, preco, quantidade
+
+# Função para gravar um bloco de registros válidos numa única transação
+# Registros com id existente são atualizados, os demais são inseridos; todos ganham histórico.
+def gravar_bloco(produtos):
+    data_movimentacao = banco.agora()
+    historico = []
+
+    with banco.transacao() as conn:
+        estoque = banco.carregar_estoque(conn, {produto[0] for produto in produtos if produto[0] is not None})
+
+        for produto_id, nome, preco, quantidade in produtos:
+            if produto_id is None:
+                produto_id = conn.execute('INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)', (nome, preco, quantidade)).lastrowid
+                quantidade_anterior, preco_anterior = 0, preco
+            else:
+                conn.execute(SQL_UPSERT_PRODUTO, (produto_id, nome, preco, quantidade))
+                quantidade_anterior, preco_anterior = estoque.get(produto_id, (0, preco))
+                estoque[produto_id] = (quantidade, preco)
+
+            historico.append((produto_id, banco.ACAO_IMPORTACAO, quantidade_anterior, quantidade, preco_anterior, preco, data_movimentacao))
+            banco.registrar_alteracao(produto_id, {'nome': nome, 'preco': preco, 'quantidade': quantidade})
+
+        conn.executemany(banco.SQL_INSERIR_HISTORICO, historico)
+
+# Função para importar um catálogo CSV/JSONL em blocos de tamanho fixo
+# Retorna um resumo com o total importado, o total rejeitado e as primeiras mensagens de erro.
+def importar_produtos(caminho, formato=None, tamanho_bloco=TAMANHO_BLOCO):
+    registros = ler_registros(caminho, formato)
+    resumo = {'importados': 0, 'rejeitados': 0, 'erros': []}
+
+    while True:
+        bloco = list(islice(registros, tamanho_bloco))
+        if not bloco:
+            break
+
+        produtos = []
+        for numero, registro in bloco:
+            try:
+                produtos.append(validar_registro(registro))
+            except ValueError as erro:
+                resumo['rejeitados'] += 1
+                if len(resumo['erros']) < LIMITE_ERROS:
+                    resumo['erros'].append(f"Linha {numero}: {erro}")
+
+        if produtos:
+            gravar_bloco(produtos)
+            resumo['importados'] += len(produtos)
+
+    return resumo
+
+# Função para exportar os produtos percorrendo o cursor, sem fetchall
+def exportar_produtos(caminho, formato=None):
+    formato = formato or detectar_formato(caminho)
+    cursor = banco.conectar_db().execute('SELECT id, nome, preco, quantidade FROM produtos ORDER BY id')
+    total = 0
+
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        if formato == 'csv':
+            escritor = csv.writer(arquivo)
+            escritor.writerow(CAMPOS_EXPORTACAO)
+            for produto in cursor:
+                escritor.writerow(produto)
+                total += 1
+        else:
+            for produto in cursor:
+                arquivo.write(json.dumps(dict(zip(CAMPOS_EXPORTACAO, produto)), ensure_ascii=False))
+                arquivo.write('\n')
+                total += 1
+
+    return total
@@ -0,0 +1,254 @@
+# Instrumentação opcional para descobrir onde o tempo vai numa loja: tempo e linhas de cada
+# consulta SQL, conexões abertas, redesenhos da lista e etapas do relatório. Desligada, o
+# banco usa a sqlite3.Connection normal e medir()/registrar() não fazem nada.
+#
+# Ligada (estoque.py --instrumentar), as métricas ficam numa janela móvel em memória (painel
+# de estatísticas da interface) e, com --trace, cada evento vira uma linha JSON no arquivo.
+# --perfil grava um cProfile da thread principal e --memoria liga o tracemalloc na sessão.
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Instrumentação ligada nesta sessão
+ATIVA = False
+
+# Eventos mantidos na janela móvel do painel
+EVENTOS_RECENTES = 500
+
+# Eventos gravados no trace entre um flush e outro
+EVENTOS_POR_FLUSH = 100
+
+# Quadros guardados pelo tracemalloc por alocação
+QUADROS_MEMORIA = 10
+
+# Tamanho máximo do texto de uma consulta nas métricas
+TAMANHO_CONSULTA = 120
+
+# Métricas da sessão: totais por (tipo, nome) e os eventos mais recentes
+class Metricas:
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.recentes = deque(maxlen=EVENTOS_RECENTES)
+        self.totais = {}
+        self.conexoes_abertas = 0
+        self.conexoes_criadas = 0
+        self.arquivo = None
+        self.pendentes = 0
+
+    # Registra um evento: "ms" de duração e, se houver, "linhas" lidas ou alteradas
+    def registrar(self, tipo, nome, ms, linhas=None):
+        evento = {'t': time.time(), 'tipo': tipo, 'nome': nome, 'ms': round(ms, 3), 'thread': threading.current_thread().name}
+        if linhas is not None:
+            evento['linhas'] = linhas
+        with self.trava:
+            self.recentes.append(evento)
+            total = self.totais.setdefault((tipo, nome), [0, 0.0, 0.0, 0])
+            total[0] += 1
+            total[1] += ms
+            total[2] = max(total[2], ms)
+            total[3] += linhas or 0
+            if self.arquivo is not None:
+                self.arquivo.write(json.dumps(evento, ensure_ascii=False) + '\n')
+                self.pendentes += 1
+                if self.pendentes >= EVENTOS_POR_FLUSH:
+                    self.arquivo.flush()
+                    self.pendentes = 0
+
+    # Soma tempo e linhas lidas depois do execute (fetch) à consulta, sem contar nova execução
+    def somar(self, tipo, nome, ms, linhas):
+        with self.trava:
+            total = self.totais.setdefault((tipo, nome), [0, 0.0, 0.0, 0])
+            total[1] += ms
+            total[3] += linhas
+
+    def conexao_aberta(self):
+        with self.trava:
+            self.conexoes_abertas += 1
+            self.conexoes_criadas += 1
+
+    def conexao_fechada(self):
+        with self.trava:
+            self.conexoes_abertas -= 1
+
+    # Totais ordenados pelo tempo somado: lista de (tipo, nome, quantidade, total_ms, max_ms, linhas)
+    def maiores(self, tipo=None, limite=15):
+        with self.trava:
+            linhas = [(t, nome, *valores) for (t, nome), valores in self.totais.items() if tipo is None or t == tipo]
+        linhas.sort(key=lambda linha: linha[3], reverse=True)
+        return linhas[:limite]
+
+    def ultimos(self, tipo, limite=10):
+        with self.trava:
+            return [evento for evento in reversed(self.recentes) if evento['tipo'] == tipo][:limite]
+
+metricas = Metricas()
+_perfil = None
+
+# Função para encurtar o texto de uma consulta para usar como nome da métrica
+def nome_consulta(sql):
+    return ' '.join(sql.split())[:TAMANHO_CONSULTA]
+
+# Cursor que mede cada execute e conta as linhas lidas nos fetch
+class CursorInstrumentado(sqlite3.Cursor):
+    consulta = None
+
+    def execute(self, sql, parametros=()):
+        self.consulta = nome_consulta(sql)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            metricas.registrar('sql', self.consulta, (time.perf_counter() - inicio) * 1000, max(self.rowcount, 0))
+
+    def executemany(self, sql, sequencia):
+        self.consulta = nome_consulta(sql)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            metricas.registrar('sql', self.consulta, (time.perf_counter() - inicio) * 1000, max(self.rowcount, 0))
+
+    def medir_leitura(self, leitura, *args):
+        inicio = time.perf_counter()
+        resultado = leitura(*args)
+        quantidade = len(resultado) if isinstance(resultado, list) else int(resultado is not None)
+        if self.consulta is not None:
+            metricas.somar('sql', self.consulta, (time.perf_counter() - inicio) * 1000, quantidade)
+        return resultado
+
+    def fetchone(self):
+        return self.medir_leitura(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self.medir_leitura(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self.medir_leitura(super().fetchall)
+
+    def __next__(self):
+        linha = self.fetchone()
+        if linha is None:
+            raise StopIteration
+        return linha
+
+# Conexão que usa o cursor instrumentado e conta aberturas
+# conn.execute do sqlite3 cria o cursor sem passar por cursor(), por isso é refeito aqui.
+class ConexaoInstrumentada(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fechada = False
+        metricas.conexao_aberta()
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+    def close(self):
+        if not self.fechada:
+            self.fechada = True
+            metricas.conexao_fechada()
+        super().close()
+
+# Função para escolher a classe das conexões novas (banco.abrir_conexao)
+def classe_conexao():
+    return ConexaoInstrumentada if ATIVA else sqlite3.Connection
+
+# Função para registrar um evento já medido (no-op com a instrumentação desligada)
+def registrar(tipo, nome, ms, linhas=None):
+    if ATIVA:
+        metricas.registrar(tipo, nome, ms, linhas)
+
+# Gerenciador de contexto para medir um trecho (ex.: redesenho da lista)
+@contextmanager
+def medir(tipo, nome):
+    if not ATIVA:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        metricas.registrar(tipo, nome, (time.perf_counter() - inicio) * 1000)
+
+# Função para ligar a instrumentação no início da sessão, antes de abrir conexões
+# "caminho_trace" recebe os eventos em JSONL; "caminho_perfil" o cProfile da thread principal;
+# "memoria" liga o tracemalloc.
+def ativar(caminho_trace=None, caminho_perfil=None, memoria=False):
+    global ATIVA, _perfil
+    ATIVA = True
+    if caminho_trace:
+        metricas.arquivo = open(caminho_trace, 'a', encoding='utf-8')
+    if caminho_perfil:
+        import cProfile
+        _perfil = (cProfile.Profile(), caminho_perfil)
+        _perfil[0].enable()
+    if memoria:
+        import tracemalloc
+        tracemalloc.start(QUADROS_MEMORIA)
+
+# Função para encerrar a sessão instrumentada: grava o perfil, o resumo de memória e o trace
+def encerrar():
+    global ATIVA, _perfil
+    if not ATIVA:
+        return
+    ATIVA = False
+
+    if _perfil is not None:
+        perfil, caminho = _perfil
+        perfil.disable()
+        perfil.dump_stats(caminho)
+        print(f"Perfil gravado em {caminho}", file=sys.stderr)
+        _perfil = None
+
+    if 'tracemalloc' in sys.modules and sys.modules['tracemalloc'].is_tracing():
+        import tracemalloc
+        atual, pico = tracemalloc.get_traced_memory()
+        print(f"Memória Python: atual {atual / 2 ** 20:.1f} MiB, pico {pico / 2 ** 20:.1f} MiB", file=sys.stderr)
+        retrato = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '*/cProfile.py'),
+        ))
+        for estatistica in retrato.statistics('lineno')[:10]:
+            print(f"  {estatistica}", file=sys.stderr)
+        tracemalloc.stop()
+
+    with metricas.trava:
+        if metricas.arquivo is not None:
+            metricas.arquivo.close()
+            metricas.arquivo = None
+
+# Função para montar o texto do painel de estatísticas
+def resumo_texto():
+    if not ATIVA:
+        return "Instrumentação desligada. Inicie com: python estoque.py --instrumentar gui"
+
+    linhas = [f"Conexões abertas: {metricas.conexoes_abertas} (criadas na sessão: {metricas.conexoes_criadas})"]
+    if 'tracemalloc' in sys.modules and sys.modules['tracemalloc'].is_tracing():
+        atual, pico = sys.modules['tracemalloc'].get_traced_memory()
+        linhas.append(f"Memória Python: atual {atual / 2 ** 20:.1f} MiB, pico {pico / 2 ** 20:.1f} MiB")
+
+    linhas += ["", "Consultas (por tempo total):", f"{'vezes':>7} {'total ms':>10} {'máx ms':>9} {'linhas':>9}  consulta"]
+    for _, nome, quantidade, total, maximo, lidas in metricas.maiores('sql'):
+        linhas.append(f"{quantidade:7d} {total:10.1f} {maximo:9.2f} {lidas:9d}  {nome}")
+
+    linhas += ["", "Interface (últimos redesenhos):"]
+    for evento in metricas.ultimos('interface'):
+        linhas.append(f"{evento['ms']:9.2f} ms  {evento['nome']}")
+
+    linhas += ["", "Relatório (última execução por etapa):"]
+    vistas = set()
+    for evento in metricas.ultimos('relatorio', EVENTOS_RECENTES):
+        if evento['nome'] not in vistas:
+            vistas.add(evento['nome'])
+            linhas.append(f"{evento['ms']:9.1f} ms  {evento['nome']}")
+    return '\n'.join(linhas)
@@ -0,0 +1,158 @@
+import tkinter as tk
+
+import banco
+import instrumentacao
+
+# Fonte de dados paginada lendo os produtos direto do SQLite em ordem de id
+class FonteProdutos:
+    def total(self):
+        return banco.conectar_db().execute('SELECT COUNT(*) FROM produtos').fetchone()[0]
+
+    # Página de produtos a partir de "posicao"; com "apos_id" usa keyset (id > ?) em vez de OFFSET
+    def pagina(self, posicao, limite, apos_id=None):
+        conn = banco.conectar_db()
+        if apos_id is not None:
+            cursor = conn.execute('SELECT id, nome, preco, quantidade FROM produtos WHERE id > ? ORDER BY id LIMIT ?', (apos_id, limite))
+        else:
+            cursor = conn.execute('SELECT id, nome, preco, quantidade FROM produtos ORDER BY id LIMIT ? OFFSET ?', (limite, posicao))
+        return cursor.fetchall()
+
+    def produto(self, produto_id):
+        return banco.conectar_db().execute('SELECT id, nome, preco, quantidade FROM produtos WHERE id = ?', (produto_id,)).fetchone()
+
+# Lista de produtos virtualizada: a Listbox só guarda as linhas visíveis e a barra de
+# rolagem é controlada à mão a partir do total de linhas da fonte, então o custo de
+# desenhar e de atualizar não depende do tamanho do catálogo.
+class ListaVirtual(tk.Frame):
+    def __init__(self, master, fonte, formatar, altura=15, largura=70):
+        super().__init__(master)
+        self.fonte = fonte
+        self.formatar = formatar
+        self.altura = altura
+        self.posicao = 0
+        self.total = 0
+        self.linhas = []
+
+        self.listbox = tk.Listbox(self, width=largura, height=altura, exportselection=False)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.barra = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.rolar)
+        self.barra.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind('<MouseWheel>', self.ao_rolar_mouse)
+        self.listbox.bind('<Button-4>', lambda evento: self.rolar('scroll', -1, 'units'))
+        self.listbox.bind('<Button-5>', lambda evento: self.rolar('scroll', 1, 'units'))
+        self.listbox.bind('<Up>', lambda evento: self.mover_selecao(-1))
+        self.listbox.bind('<Down>', lambda evento: self.mover_selecao(1))
+
+    # Recarrega o total e a janela visível (após mudanças que afetam a ordem ou a contagem)
+    def recarregar(self):
+        self.total = self.fonte.total()
+        self.carregar_janela()
+
+    # Troca a origem das linhas (ex.: resultado de uma busca) e volta ao topo
+    def trocar_fonte(self, fonte):
+        self.fonte = fonte
+        self.posicao = 0
+        self.recarregar()
+
+    # Busca somente as linhas da janela visível e redesenha a Listbox
+    def carregar_janela(self, apos_id=None):
+        with instrumentacao.medir('interface', f"{type(self.fonte).__name__}.carregar_janela"):
+            self.posicao = max(0, min(self.posicao, self.total - self.altura))
+            self.linhas = self.fonte.pagina(self.posicao, self.altura, apos_id)
+
+            self.listbox.delete(0, tk.END)
+            for produto in self.linhas:
+                self.listbox.insert(tk.END, self.formatar(produto))
+            self.atualizar_barra()
+
+    def atualizar_barra(self):
+        if self.total <= 0:
+            self.barra.set(0, 1)
+            return
+        self.barra.set(self.posicao / self.total, min(1, (self.posicao + len(self.linhas)) / self.total))
+
+    # Comando da barra de rolagem: ('moveto', fração) ou ('scroll', n, 'units'|'pages')
+    def rolar(self, acao, valor, unidade=None):
+        if acao == 'moveto':
+            nova_posicao = int(float(valor) * self.total)
+        else:
+            passo = self.altura if unidade == 'pages' else 1
+            nova_posicao = self.posicao + int(valor) * passo
+
+        nova_posicao = max(0, min(nova_posicao, self.total - self.altura))
+        deslocamento = nova_posicao - self.posicao
+        if deslocamento == 0:
+            return
+
+        # Avanços curtos continuam a partir do último id já visto (keyset), sem OFFSET
+        apos_id = None
+        if 0 < deslocamento <= len(self.linhas):
+            apos_id = self.linhas[deslocamento - 1][0]
+        self.posicao = nova_posicao
+        self.carregar_janela(apos_id)
+
+    def ao_rolar_mouse(self, evento):
+        self.rolar('scroll', -1 if evento.delta > 0 else 1, 'units')
+        return 'break'
+
+    # Setas do teclado rolam a janela quando a seleção chega na borda
+    def mover_selecao(self, passo):
+        selecao = self.listbox.curselection()
+        if not selecao:
+            return None
+        indice = selecao[0] + passo
+        if 0 <= indice < len(self.linhas):
+            return None
+
+        posicao_anterior = self.posicao
+        self.rolar('scroll', passo, 'units')
+        if self.posicao != posicao_anterior:
+            self.selecionar(selecao[0])
+        return 'break'
+
+    def selecionar(self, indice):
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(indice)
+        self.listbox.activate(indice)
+
+    # Id do produto na linha selecionada, lido das linhas exibidas (O(1), sem consultar o banco)
+    # Como vem da mesma linha que está na tela, a ação sempre atinge o produto que o usuário vê.
+    # Lança IndexError se não houver seleção.
+    def produto_selecionado(self):
+        return self.linhas[self.listbox.curselection()[0]][0]
+
+    # Atualização incremental de um produto alterado: só redesenha a linha, se estiver visível
+    def produto_alterado(self, produto_id):
+        for indice, produto in enumerate(self.linhas):
+            if produto[0] != produto_id:
+                continue
+            produto = self.fonte.produto(produto_id)
+            if produto is None:
+                self.produto_removido(produto_id)
+                return
+            selecionado = indice in self.listbox.curselection()
+            self.linhas[indice] = produto
+            self.listbox.delete(indice)
+            self.listbox.insert(indice, self.formatar(produto))
+            if selecionado:
+                self.selecionar(indice)
+            return
+
+    # Produtos novos entram no fim da ordem por id: só a janela do fim precisa ser relida,
+    # e ela acompanha o fim para o produto novo aparecer
+    def produto_inserido(self, produto_id):
+        self.total = self.fonte.total()
+        if self.posicao + len(self.linhas) >= self.total - 1:
+            self.posicao = self.total - self.altura
+            self.carregar_janela()
+        else:
+            self.atualizar_barra()
+
+    # Remoção desloca as linhas seguintes: relê apenas a janela visível
+    def produto_removido(self, produto_id):
+        self.total = self.fonte.total()
+        if not self.linhas or produto_id <= self.linhas[-1][0]:
+            self.carregar_janela()
+        else:
+            self.atualizar_barra()
@@ -0,0 +1,209 @@
+# Geração do relatório de estoque (planilha/CSV/Parquet + gráfico) sem depender da interface.
+# As vendas vêm do resumo diário materializado (resumo.py), atualizado a partir do
+# histórico antes de cada relatório, e são agregadas no próprio SQLite (GROUP BY);
+# o Python só recebe uma linha por produto (ou por produto e período).
+# As tabelas são gravadas direto do cursor, em lotes, com memória constante; openpyxl e
+# pyarrow só são importados quando o formato pede. O gráfico (graficos.py) é desenhado
+# numa Figure com o backend Agg, que pode rodar fora da thread do Tk.
+
+import csv
+import os
+import time
+
+import banco
+import graficos
+import instrumentacao
+import resumo
+
+CAMINHO_BASE = "relatorio_estoque"
+CAMINHO_PNG = "relatorio_estoque.png"
+
+# Formatos de saída e a extensão de cada um
+FORMATOS = {
+    'xlsx': '.xlsx',
+    'csv': '.csv',
+    'parquet': '.parquet',
+}
+
+# Linhas lidas do cursor por vez ao gravar as tabelas
+LOTE_LEITURA = 10000
+
+# Tipos das colunas no Parquet
+TIPOS_PARQUET = {
+    "ID": 'int64',
+    "Produto": 'string',
+    "Filial": 'string',
+    "Filiais": 'int64',
+    "Produtos": 'int64',
+    "Período": 'string',
+    "Quantidade Atual": 'int64',
+    "Quantidade Vendida": 'int64',
+    "Receita": 'float64',
+    "Giro": 'float64',
+}
+
+# Agrupamento das vendas por período (formatos do strftime do SQLite sobre o dia local)
+PERIODOS = {
+    'dia': '%Y-%m-%d',
+    'semana': '%Y-S%W',
+    'mes': '%Y-%m',
+    'ano': '%Y',
+}
+
+# Totais por produto. O giro divide as unidades vendidas pelo estoque médio do
+# período, aproximado pela média entre o estoque atual e o estoque antes das vendas.
+SQL_VENDAS_POR_PRODUTO = '''
+    SELECT p.id AS "ID",
+           p.nome AS "Produto",
+           p.quantidade AS "Quantidade Atual",
+           COALESCE(v.vendidas, 0) AS "Quantidade Vendida",
+           COALESCE(v.receita, 0) AS "Receita",
+           CASE WHEN 2 * p.quantidade + COALESCE(v.vendidas, 0) > 0
+                THEN 2.0 * COALESCE(v.vendidas, 0) / (2 * p.quantidade + COALESCE(v.vendidas, 0))
+                ELSE 0 END AS "Giro"
+    FROM produtos p
+    LEFT JOIN (
+        SELECT produto_id, SUM(unidades_vendidas) AS vendidas, SUM(receita) AS receita
+        FROM resumo_diario
+        WHERE dia >= ? AND dia < ?
+        GROUP BY produto_id
+    ) v ON v.produto_id = p.id
+    ORDER BY p.id
+'''
+
+# Totais por produto e período
+SQL_VENDAS_POR_PERIODO = '''
+    SELECT strftime(?, r.dia) AS "Período",
+           r.produto_id AS "ID",
+           p.nome AS "Produto",
+           SUM(r.unidades_vendidas) AS "Quantidade Vendida",
+           SUM(r.receita) AS "Receita"
+    FROM resumo_diario r
+    LEFT JOIN produtos p ON p.id = r.produto_id
+    WHERE r.dia >= ? AND r.dia < ? AND r.unidades_vendidas > 0
+    GROUP BY 1, r.produto_id
+    ORDER BY 1, r.produto_id
+'''
+
+# Função para listar as tabelas do relatório: (nome da aba, sufixo do arquivo, SQL, parâmetros)
+def tabelas_relatorio(conn, periodo='mes', inicio=None, fim=None):
+    dias = resumo.intervalo_dias(conn, inicio, fim)
+    return [
+        ("Produtos", "", SQL_VENDAS_POR_PRODUTO, dias),
+        ("Vendas por Período", "_periodo", SQL_VENDAS_POR_PERIODO, (PERIODOS[periodo],) + dias),
+    ]
+
+# Gerador que percorre um cursor em lotes de linhas
+def lotes_cursor(cursor, lote=LOTE_LEITURA):
+    while True:
+        linhas = cursor.fetchmany(lote)
+        if not linhas:
+            return
+        yield linhas
+
+# Função para montar o caminho de cada tabela nos formatos de um arquivo por tabela
+def caminho_tabela(caminho_saida, sufixo):
+    base, extensao = os.path.splitext(caminho_saida)
+    return base + sufixo + extensao
+
+# Grava todas as tabelas como abas de uma planilha em modo somente escrita (streaming)
+def gravar_xlsx(conn, tabelas, caminho_saida):
+    from openpyxl import Workbook
+
+    planilha = Workbook(write_only=True)
+    for nome, _, sql, parametros in tabelas:
+        aba = planilha.create_sheet(nome)
+        cursor = conn.execute(sql, parametros)
+        aba.append([coluna[0] for coluna in cursor.description])
+        for linhas in lotes_cursor(cursor):
+            for linha in linhas:
+                aba.append(linha)
+    planilha.save(caminho_saida)
+    return [caminho_saida]
+
+# Grava cada tabela num CSV
+def gravar_csv(conn, tabelas, caminho_saida):
+    caminhos = []
+    for _, sufixo, sql, parametros in tabelas:
+        caminho = caminho_tabela(caminho_saida, sufixo)
+        cursor = conn.execute(sql, parametros)
+        with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow([coluna[0] for coluna in cursor.description])
+            for linhas in lotes_cursor(cursor):
+                escritor.writerows(linhas)
+        caminhos.append(caminho)
+    return caminhos
+
+# Grava cada tabela num Parquet, um grupo de linhas por lote lido do cursor
+def gravar_parquet(conn, tabelas, caminho_saida):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    caminhos = []
+    for _, sufixo, sql, parametros in tabelas:
+        caminho = caminho_tabela(caminho_saida, sufixo)
+        cursor = conn.execute(sql, parametros)
+        colunas = [coluna[0] for coluna in cursor.description]
+        esquema = pa.schema([(coluna, getattr(pa, TIPOS_PARQUET[coluna])()) for coluna in colunas])
+
+        with pq.ParquetWriter(caminho, esquema) as escritor:
+            for linhas in lotes_cursor(cursor):
+                valores = zip(*linhas)
+                arrays = [pa.array(coluna, type=campo.type) for coluna, campo in zip(valores, esquema)]
+                escritor.write_batch(pa.RecordBatch.from_arrays(arrays, schema=esquema))
+        caminhos.append(caminho)
+    return caminhos
+
+GRAVADORES = {
+    'xlsx': gravar_xlsx,
+    'csv': gravar_csv,
+    'parquet': gravar_parquet,
+}
+
+# Função para gerar o relatório com gráfico
+# "formato" escolhe entre xlsx (uma aba por tabela), csv e parquet (um arquivo por tabela,
+# com sufixo "_periodo" para a tabela por período); "caminho_saida" tem como padrão
+# relatorio_estoque com a extensão do formato. "periodo" define o agrupamento da tabela
+# por período; "inicio" e "fim" (epoch) limitam as movimentações consideradas.
+# "grafico" é o modo do gráfico (graficos.MODOS) ou None para não desenhar; o gráfico vai
+# para "caminho_png" (PNG ou SVG, pela extensão), com "limite_grafico" barras no modo top
+# e o produto "produto_id" no modo estoque (sem ele, o estoque total do catálogo).
+# "tarefa" (opcional) recebe o progresso e permite cancelar entre as etapas.
+# Retorna a lista de arquivos gravados e o caminho do gráfico (None sem gráfico).
+def gerar_relatorio(caminho_saida=None, formato='xlsx', caminho_png=CAMINHO_PNG, periodo='mes', inicio=None, fim=None,
+                    grafico='top', limite_grafico=graficos.LIMITE_BARRAS, produto_id=None, tarefa=None):
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de relatório desconhecido: {formato}")
+    if grafico and grafico not in graficos.MODOS:
+        raise ValueError(f"Modo de gráfico desconhecido: {grafico}")
+    caminho_saida = caminho_saida or CAMINHO_BASE + FORMATOS[formato]
+
+    # Cada etapa também fecha a medição da anterior (instrumentacao, tipo 'relatorio')
+    anterior = {'mensagem': None, 'inicio': time.perf_counter()}
+
+    def etapa(fracao, mensagem):
+        agora = time.perf_counter()
+        if anterior['mensagem'] is not None:
+            instrumentacao.registrar('relatorio', anterior['mensagem'], (agora - anterior['inicio']) * 1000)
+        anterior.update(mensagem=mensagem, inicio=agora)
+        if tarefa is not None:
+            tarefa.verificar_cancelamento()
+            tarefa.informar_progresso(fracao, mensagem)
+
+    conn = banco.conectar_db()
+
+    etapa(0.05, "Atualizando resumo diário")
+    resumo.atualizar_resumo()
+
+    etapa(0.2, "Gravando tabelas")
+    caminhos = GRAVADORES[formato](conn, tabelas_relatorio(conn, periodo, inicio, fim), caminho_saida)
+
+    if grafico:
+        etapa(0.7, "Desenhando gráfico")
+        graficos.gerar_grafico(conn, grafico, caminho_png, inicio, fim, limite_grafico, produto_id)
+    else:
+        caminho_png = None
+
+    etapa(1.0, "Concluído")
+    return caminhos, caminho_png
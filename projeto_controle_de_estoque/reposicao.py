@@ -0,0 +1,241 @@
+# Pontos de reposição e alertas de estoque baixo, avaliados de forma incremental.
+#
+# Cada produto tem um ponto de reposição (produtos.ponto_reposicao; NULL usa PONTO_PADRAO).
+# O MonitorReposicao só guarda os produtos "vigiados" (quantidade até FATOR_ATENCAO vezes o
+# ponto) numa fila de prioridade (heapq) ordenada pela folga (quantidade - ponto), então o
+# painel lê os mais urgentes sem varrer o catálogo:
+# - as escritas deste processo chegam pelo observador do banco (observar_produtos) e só os
+#   produtos tocados no COMMIT são reavaliados;
+# - escritas de outros processos são percebidas com PRAGMA data_version e relidas só para
+#   os produtos com movimentação nova no histórico (toda escrita em produtos, inclusive a
+#   troca do ponto, grava uma linha no histórico).
+# Produtos que descem até o ponto entram nos alertas recentes.
+#
+# sugerir_compras() calcula a sugestão de compra pela velocidade de venda real (resumo
+# diário do histórico): repor até o ponto mais o consumo previsto para "cobertura" dias.
+
+import csv
+import heapq
+import math
+import threading
+from collections import deque
+
+import banco
+import busca
+import resumo
+
+# Ponto de reposição dos produtos sem ponto próprio
+PONTO_PADRAO = busca.LIMITE_ESTOQUE_BAIXO
+
+# Produtos com quantidade até ponto * FATOR_ATENCAO ficam vigiados (os "quase no ponto")
+FATOR_ATENCAO = 1.5
+
+# Alertas recentes guardados para o painel
+ALERTAS_GUARDADOS = 100
+
+# Dias de vendas usados na velocidade e dias de estoque que a compra deve cobrir
+DIAS_VELOCIDADE = 28
+DIAS_COBERTURA = 14
+
+COLUNAS_SUGESTAO = ('produto_id', 'nome', 'quantidade', 'ponto_reposicao', 'vendas_por_dia', 'dias_de_estoque', 'sugerido')
+
+# Carga inicial: só os produtos com ponto próprio ou já perto do ponto padrão
+SQL_CARREGAR = '''
+    SELECT id, nome, quantidade, ponto_reposicao FROM produtos
+    WHERE ponto_reposicao IS NOT NULL OR quantidade <= ?
+'''
+
+# Produtos abaixo do estoque alvo: o ponto mais o consumo previsto para a cobertura
+# (o último parâmetro é cobertura / dias, em ponto flutuante)
+SQL_SUGESTAO = '''
+    SELECT p.id, p.nome, p.quantidade, COALESCE(p.ponto_reposicao, ?) AS ponto, COALESCE(v.vendidas, 0)
+    FROM produtos p
+    LEFT JOIN (
+        SELECT produto_id, SUM(unidades_vendidas) AS vendidas
+        FROM resumo_diario
+        WHERE dia >= ?
+        GROUP BY produto_id
+    ) v ON v.produto_id = p.id
+    WHERE p.quantidade < COALESCE(p.ponto_reposicao, ?) + COALESCE(v.vendidas, 0) * ?
+'''
+
+# Função para obter o ponto efetivo de um produto (o próprio ou o padrão)
+def ponto_efetivo(ponto):
+    return PONTO_PADRAO if ponto is None else ponto
+
+# Situação de estoque baixo mantida em memória, atualizada só para os produtos alterados
+class MonitorReposicao:
+    def __init__(self, caminho=None):
+        self.caminho = caminho or banco.CAMINHO_DB
+        self.trava = threading.RLock()
+        self.pontos = {}
+        self.vigiados = {}
+        self.fila = []
+        self.abaixo = set()
+        self.alertas = deque(maxlen=ALERTAS_GUARDADOS)
+        self.sequencia = 0
+        self.ultimo_historico = 0
+        self.versao = None
+        self.conn = banco.abrir_conexao(self.caminho)
+        banco.observar_produtos(self.aplicar_alteracoes)
+
+    def fechar(self):
+        banco.remover_observador(self.aplicar_alteracoes)
+        self.conn.close()
+
+    def versao_banco(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    # Carrega (ou recarrega) os pontos próprios e os produtos vigiados
+    def carregar(self):
+        with self.trava:
+            self.pontos, self.vigiados, self.fila, self.abaixo = {}, {}, [], set()
+            self.versao = self.versao_banco()
+            self.conn.execute('BEGIN')
+            try:
+                self.ultimo_historico = self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM historico').fetchone()[0]
+                for produto_id, nome, quantidade, ponto in self.conn.execute(SQL_CARREGAR, (PONTO_PADRAO * FATOR_ATENCAO,)):
+                    self.colocar(produto_id, nome, quantidade, ponto, alertar=False)
+            finally:
+                self.conn.execute('COMMIT')
+
+    # Reavalia um produto: guarda o ponto próprio e o põe (ou tira) da fila de vigiados
+    def colocar(self, produto_id, nome, quantidade, ponto, alertar=True):
+        if ponto is None:
+            self.pontos.pop(produto_id, None)
+        else:
+            self.pontos[produto_id] = ponto
+        estava_abaixo = produto_id in self.abaixo
+        self.retirar(produto_id)
+
+        ponto = ponto_efetivo(ponto)
+        if quantidade > ponto * FATOR_ATENCAO:
+            return
+        self.sequencia += 1
+        self.vigiados[produto_id] = (self.sequencia, nome, quantidade, ponto)
+        heapq.heappush(self.fila, (quantidade - ponto, produto_id, self.sequencia))
+        if quantidade <= ponto:
+            self.abaixo.add(produto_id)
+            if alertar and not estava_abaixo:
+                self.alertas.append((banco.agora(), produto_id, nome, quantidade, ponto))
+
+        # Entradas antigas ficam na fila até serem descartadas; refaz quando sobram muitas
+        if len(self.fila) > 2 * len(self.vigiados) + 64:
+            self.fila = [(q - p, pid, seq) for pid, (seq, _, q, p) in self.vigiados.items()]
+            heapq.heapify(self.fila)
+
+    def retirar(self, produto_id):
+        self.vigiados.pop(produto_id, None)
+        self.abaixo.discard(produto_id)
+
+    # Relê do banco os produtos informados (os que não existem mais saem do monitor)
+    def reler(self, produto_ids):
+        produto_ids = list(produto_ids)
+        encontrados = set()
+        for inicio in range(0, len(produto_ids), banco.TAMANHO_BLOCO_IN):
+            bloco = produto_ids[inicio:inicio + banco.TAMANHO_BLOCO_IN]
+            marcadores = ', '.join('?' * len(bloco))
+            cursor = self.conn.execute(f'SELECT id, nome, quantidade, ponto_reposicao FROM produtos WHERE id IN ({marcadores})', bloco)
+            for produto_id, nome, quantidade, ponto in cursor:
+                encontrados.add(produto_id)
+                self.colocar(produto_id, nome, quantidade, ponto)
+        for produto_id in set(produto_ids) - encontrados:
+            self.pontos.pop(produto_id, None)
+            self.retirar(produto_id)
+
+    # Observador do módulo banco: reavalia só os produtos alterados no COMMIT
+    def aplicar_alteracoes(self, caminho, alteracoes):
+        if caminho != self.caminho:
+            return
+        with self.trava:
+            para_reler = []
+            for produto_id, campos in alteracoes.items():
+                if campos is None:
+                    self.pontos.pop(produto_id, None)
+                    self.retirar(produto_id)
+                    continue
+
+                vigiado = self.vigiados.get(produto_id)
+                nome = campos.get('nome', vigiado[1] if vigiado else None)
+                quantidade = campos.get('quantidade', vigiado[2] if vigiado else None)
+                ponto = campos['ponto_reposicao'] if 'ponto_reposicao' in campos else self.pontos.get(produto_id)
+                if quantidade is None:
+                    para_reler.append(produto_id)
+                elif nome is None and quantidade <= ponto_efetivo(ponto) * FATOR_ATENCAO:
+                    # Entrou agora na vigilância sem o nome nas alterações
+                    para_reler.append(produto_id)
+                else:
+                    self.colocar(produto_id, nome, quantidade, ponto)
+            if para_reler:
+                self.reler(para_reler)
+
+    # Confere se outro processo alterou o banco e relê só os produtos com movimentação nova
+    # (banco.produtos_movimentados). Retorna True se houve alteração.
+    def validar(self):
+        with self.trava:
+            versao = self.versao_banco()
+            if versao == self.versao:
+                return False
+            self.versao = versao
+            self.conn.execute('BEGIN')
+            try:
+                maior, produto_ids = banco.produtos_movimentados(self.conn, self.ultimo_historico)
+                if produto_ids is not None:
+                    self.reler(produto_ids)
+                    self.ultimo_historico = maior
+                    return True
+            finally:
+                self.conn.execute('COMMIT')
+            # Histórico voltou atrás (ex.: backup restaurado): recomeça do zero
+            self.carregar()
+            return True
+
+    # Produtos mais perto (ou mais abaixo) do ponto: [(produto_id, nome, quantidade, ponto)]
+    # Tira da fila só o necessário e devolve o que ainda vale.
+    def mais_urgentes(self, limite=20):
+        with self.trava:
+            linhas = []
+            retirados = []
+            while self.fila and len(linhas) < limite:
+                folga, produto_id, sequencia = heapq.heappop(self.fila)
+                vigiado = self.vigiados.get(produto_id)
+                if vigiado is None or vigiado[0] != sequencia:
+                    continue
+                retirados.append((folga, produto_id, sequencia))
+                linhas.append((produto_id, vigiado[1], vigiado[2], vigiado[3]))
+            for item in retirados:
+                heapq.heappush(self.fila, item)
+            return linhas
+
+    # Situação para o painel: (produtos no ponto ou abaixo, mais urgentes, alertas recentes)
+    # Os alertas são (instante, produto_id, nome, quantidade, ponto), do mais novo ao mais antigo.
+    def situacao(self, limite=20):
+        with self.trava:
+            return len(self.abaixo), self.mais_urgentes(limite), list(reversed(self.alertas))
+
+# Função para calcular a sugestão de compra pela velocidade de venda dos últimos "dias"
+# Repõe até o ponto mais o consumo de "cobertura" dias; produtos sem nada a comprar ficam
+# de fora. Retorna linhas com COLUNAS_SUGESTAO, das que acabam primeiro.
+def sugerir_compras(dias=DIAS_VELOCIDADE, cobertura=DIAS_COBERTURA):
+    resumo.atualizar_resumo()
+    conn = banco.conectar_db()
+    dia_inicio = resumo.dia_local(conn, banco.agora() - dias * 86400)
+
+    sugestoes = []
+    for produto_id, nome, quantidade, ponto, vendidas in conn.execute(SQL_SUGESTAO, (PONTO_PADRAO, dia_inicio, PONTO_PADRAO, cobertura / dias)):
+        por_dia = vendidas / dias
+        sugerido = max(math.ceil(ponto + por_dia * cobertura) - quantidade, 0)
+        if sugerido:
+            dias_de_estoque = round(quantidade / por_dia, 1) if por_dia else None
+            sugestoes.append((produto_id, nome, quantidade, ponto, round(por_dia, 2), dias_de_estoque, sugerido))
+    sugestoes.sort(key=lambda linha: (linha[5] if linha[5] is not None else math.inf, linha[0]))
+    return sugestoes
+
+# Função para exportar a sugestão de compra em CSV; retorna quantos produtos entraram
+def exportar_sugestao(caminho, dias=DIAS_VELOCIDADE, cobertura=DIAS_COBERTURA):
+    sugestoes = sugerir_compras(dias, cobertura)
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(COLUNAS_SUGESTAO)
+        escritor.writerows(sugestoes)
+    return len(sugestoes)
@@ -0,0 +1,71 @@
+# Resumo diário materializado do histórico: uma linha por produto e dia com as
+# unidades vendidas, a receita e o estoque de fechamento. O resumo é atualizado de
+# forma incremental a partir do último id de histórico já processado, então
+# relatórios e gráficos de vários anos não precisam varrer o histórico inteiro.
+
+import banco
+
+# Movimentações do histórico processadas por transação na atualização do resumo
+LOTE_ATUALIZACAO = 100000
+
+VENDA = f"acao IN ({', '.join('?' * len(banco.ACOES_VENDA))})"
+
+# Agrega um intervalo de ids do histórico e soma ao resumo. O estoque de fechamento é a
+# quantidade_atual da movimentação de maior id do dia (coluna "solta" junto de MAX(id)).
+SQL_ACUMULAR_RESUMO = f'''
+    INSERT INTO resumo_diario (produto_id, dia, unidades_vendidas, receita, estoque_fechamento, ultimo_historico_id)
+    SELECT produto_id,
+           date(data_movimentacao, 'unixepoch', 'localtime') AS dia,
+           SUM(CASE WHEN {VENDA} THEN quantidade_anterior - quantidade_atual ELSE 0 END),
+           SUM(CASE WHEN {VENDA} THEN (quantidade_anterior - quantidade_atual) * preco_atual ELSE 0 END),
+           quantidade_atual,
+           MAX(id)
+    FROM historico
+    WHERE id > ? AND id <= ?
+    GROUP BY produto_id, dia
+    ON CONFLICT (produto_id, dia) DO UPDATE SET
+        unidades_vendidas = unidades_vendidas + excluded.unidades_vendidas,
+        receita = receita + excluded.receita,
+        estoque_fechamento = CASE WHEN excluded.ultimo_historico_id > ultimo_historico_id
+                                  THEN excluded.estoque_fechamento ELSE estoque_fechamento END,
+        ultimo_historico_id = MAX(ultimo_historico_id, excluded.ultimo_historico_id)
+'''
+
+# Função para trazer o resumo diário em dia com o histórico
+# Processa no máximo "lote" movimentações por transação para não segurar a escrita por
+# muito tempo. Retorna quantas movimentações foram incorporadas.
+def atualizar_resumo(lote=LOTE_ATUALIZACAO):
+    processadas = 0
+    while True:
+        with banco.transacao() as conn:
+            marca = conn.execute('SELECT ultimo_historico_id FROM resumo_controle WHERE id = 1').fetchone()[0]
+            limite, quantidade = conn.execute(
+                'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM historico WHERE id > ? ORDER BY id LIMIT ?)',
+                (marca, lote),
+            ).fetchone()
+            if limite is None:
+                return processadas
+
+            conn.execute(SQL_ACUMULAR_RESUMO, list(banco.ACOES_VENDA) * 2 + [marca, limite])
+            conn.execute('UPDATE resumo_controle SET ultimo_historico_id = ? WHERE id = 1', (limite,))
+        processadas += quantidade
+
+# Função para converter um instante (epoch) no dia local usado pelo resumo
+def dia_local(conn, instante):
+    return conn.execute("SELECT date(?, 'unixepoch', 'localtime')", (instante,)).fetchone()[0]
+
+# Função para montar o filtro de dias [inicio, fim) a partir de instantes em epoch
+def intervalo_dias(conn, inicio=None, fim=None):
+    dia_inicio = dia_local(conn, inicio) if inicio is not None else '0000-00-00'
+    dia_fim = dia_local(conn, fim) if fim is not None else '9999-99-99'
+    return dia_inicio, dia_fim
+
+# Função para ler o estoque de fechamento de um produto dia a dia (tendência)
+def estoque_por_dia(conn, produto_id, inicio=None, fim=None):
+    dia_inicio, dia_fim = intervalo_dias(conn, inicio, fim)
+    cursor = conn.execute('''
+        SELECT dia, estoque_fechamento FROM resumo_diario
+        WHERE produto_id = ? AND dia >= ? AND dia < ?
+        ORDER BY dia
+    ''', (produto_id, dia_inicio, dia_fim))
+    return cursor.fetchall()
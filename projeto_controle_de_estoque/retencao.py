@@ -0,0 +1,350 @@
+# Retenção do histórico: as movimentações mais antigas que "dias" saem do banco para
+# arquivos mensais comprimidos (uma linha JSON por movimentação, gzip ou zstd com o pacote
+# zstandard) e continuam consultáveis por ler_arquivo()/exportar_arquivo().
+#
+# Antes de arquivar, o resumo diário (resumo.py) é atualizado, então vendas, receita e
+# estoque de fechamento por dia continuam no banco, e um retrato do estoque é gravado no
+# limite do trecho arquivado, para as consultas por data (auditoria.py) não precisarem
+# reler os arquivos. A compactação anda em lotes: cada lote é gravado no arquivo (com
+# fsync) e só depois apagado do banco numa transação curta, e a marca em retencao_controle
+# permite retomar de onde parou. No fim, o espaço livre é devolvido com incremental_vacuum
+# em passos curtos e as estatísticas do planejador são refeitas (ANALYZE).
+#
+# Cada banco tem a sua pasta de arquivos, gravada em retencao_controle no primeiro lote:
+# por padrão "<nome do banco>_arquivo", ao lado do arquivo do banco (e não na pasta de
+# onde o programa foi aberto), para dois bancos nunca misturarem os ids nos mesmos meses.
+
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+
+import auditoria
+import banco
+import historico
+import resumo
+
+# Dias de histórico mantidos no banco
+DIAS_RETENCAO = 365
+
+# Pasta dos arquivos mensais para os bancos que ainda não arquivaram nada
+# (None = "<nome do banco>_arquivo" ao lado do arquivo do banco)
+DIRETORIO_ARQUIVO = None
+
+# Compressões aceitas e a extensão dos arquivos de cada uma
+COMPRESSOES = {
+    'gzip': '.jsonl.gz',
+    'zstd': '.jsonl.zst',
+}
+
+# Movimentações arquivadas e apagadas por transação
+LOTE_ARQUIVAMENTO = 5000
+
+# Páginas devolvidas ao sistema por passo do incremental_vacuum
+PAGINAS_VACUUM = 2000
+
+# Linhas amostradas por índice no ANALYZE (0 = tabela inteira)
+LIMITE_ANALISE = 1000
+
+# Modo incremental de PRAGMA auto_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+COLUNAS_ARQUIVO = 'id, produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao'
+
+# Retratos antigos ficam só um por mês (o último de cada mês)
+SQL_RETRATOS_DESCARTAVEIS = '''
+    SELECT id FROM snapshots
+    WHERE ultimo_historico_id < ?
+      AND id NOT IN (SELECT MAX(id) FROM snapshots GROUP BY strftime('%Y-%m', data, 'unixepoch', 'localtime'))
+'''
+
+# Produtos excluídos antes de a exclusão entrar no histórico: a última movimentação não é
+# uma exclusão e o produto não existe mais
+SQL_ORFAOS = '''
+    SELECT h.produto_id, h.quantidade_atual, h.preco_atual
+    FROM historico h
+    WHERE h.id IN (SELECT MAX(id) FROM historico GROUP BY produto_id)
+      AND h.acao != ?
+      AND NOT EXISTS (SELECT 1 FROM produtos p WHERE p.id = h.produto_id)
+'''
+
+class ArquivoAusente(FileNotFoundError):
+    def __init__(self, diretorio, ultimo_id):
+        super().__init__(
+            f"O banco já arquivou o histórico até a movimentação {ultimo_id}, mas não há arquivos em {diretorio} "
+            f"(mova para lá os arquivos historico_AAAA-MM deste banco)"
+        )
+        self.diretorio = diretorio
+        self.ultimo_id = ultimo_id
+
+# Função para trocar a pasta dos arquivos (vale só para bancos que ainda não arquivaram;
+# os outros continuam na pasta gravada em retencao_controle)
+def configurar_arquivo(diretorio):
+    global DIRETORIO_ARQUIVO
+    DIRETORIO_ARQUIVO = os.path.abspath(diretorio)
+
+# Função para obter a pasta dos arquivos do banco atual
+# Caminhos relativos em retencao_controle são relativos à pasta do banco, então o banco e
+# a pasta de arquivos podem ser movidos juntos.
+def diretorio_arquivo():
+    caminho = os.path.abspath(banco.caminho_atual())
+    gravado = banco.conectar_db().execute('SELECT diretorio_arquivo FROM retencao_controle WHERE id = 1').fetchone()[0]
+    if gravado is None:
+        gravado = DIRETORIO_ARQUIVO or os.path.splitext(os.path.basename(caminho))[0] + '_arquivo'
+    return os.path.join(os.path.dirname(caminho), gravado)
+
+# Função para gravar a pasta dos arquivos do banco atual no primeiro lote arquivado
+def fixar_diretorio(conn):
+    diretorio = diretorio_arquivo()
+    base = os.path.dirname(os.path.abspath(banco.caminho_atual()))
+    if os.path.dirname(diretorio) == base:
+        diretorio = os.path.basename(diretorio)
+    conn.execute(
+        'UPDATE retencao_controle SET diretorio_arquivo = ? WHERE id = 1 AND diretorio_arquivo IS NULL', (diretorio,),
+    )
+
+# Função para obter o mês (AAAA-MM, hora local) de uma data_movimentacao
+def mes_arquivo(data_movimentacao):
+    return datetime.fromtimestamp(data_movimentacao).strftime('%Y-%m')
+
+def caminho_arquivo(diretorio, mes, compressao):
+    return os.path.join(diretorio, f"historico_{mes}{COMPRESSOES[compressao]}")
+
+# Função para listar os arquivos mensais [(mes, caminho)] do banco atual em ordem de mês
+# Se o banco já arquivou alguma movimentação e a pasta não tem arquivos, levanta
+# ArquivoAusente em vez de responder como se o trecho arquivado estivesse vazio.
+def listar_arquivos():
+    diretorio = diretorio_arquivo()
+    arquivos = []
+    if os.path.isdir(diretorio):
+        for nome in os.listdir(diretorio):
+            for extensao in COMPRESSOES.values():
+                if nome.startswith('historico_') and nome.endswith(extensao):
+                    arquivos.append((nome[len('historico_'):-len(extensao)], os.path.join(diretorio, nome)))
+    if not arquivos:
+        ultimo_id = auditoria.ultimo_arquivado(banco.conectar_db())
+        if ultimo_id:
+            raise ArquivoAusente(diretorio, ultimo_id)
+    return sorted(arquivos)
+
+# Função para acrescentar movimentações a um arquivo mensal
+# Cada chamada grava um bloco comprimido novo no fim do arquivo (gzip e zstd leem blocos
+# concatenados como um só fluxo) e só retorna depois do fsync.
+def acrescentar_arquivo(caminho, compressao, linhas):
+    texto = ''.join(json.dumps(linha, ensure_ascii=False) + '\n' for linha in linhas).encode('utf-8')
+    if compressao == 'zstd':
+        import zstandard
+        dados = zstandard.ZstdCompressor().compress(texto)
+    else:
+        dados = gzip.compress(texto)
+
+    with open(caminho, 'ab') as arquivo:
+        arquivo.write(dados)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+
+def abrir_arquivo(caminho):
+    if caminho.endswith(COMPRESSOES['zstd']):
+        import zstandard
+        leitor = zstandard.ZstdDecompressor().stream_reader(open(caminho, 'rb'), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(leitor, encoding='utf-8')
+    return gzip.open(caminho, 'rt', encoding='utf-8')
+
+# Gerador das movimentações arquivadas, em ordem de id, como tuplas nas colunas de
+# COLUNAS_ARQUIVO. Filtra por produto, por intervalo [inicio, fim) de data_movimentacao e
+# por trecho (apos_id, ate_id] de id; só abre os arquivos dos meses do intervalo.
+# Um lote regravado depois de uma interrupção aparece duas vezes no arquivo e é ignorado
+# na segunda (ids que não avançam).
+def ler_arquivo(produto_id=None, inicio=None, fim=None, apos_id=0, ate_id=None):
+    mes_inicio = mes_arquivo(inicio) if inicio is not None else None
+    mes_fim = mes_arquivo(fim) if fim is not None else None
+    ultimo_id = apos_id
+
+    for mes, caminho in listar_arquivos():
+        if (mes_inicio and mes < mes_inicio) or (mes_fim and mes > mes_fim):
+            continue
+        with abrir_arquivo(caminho) as arquivo:
+            for texto in arquivo:
+                linha = json.loads(texto)
+                if linha[0] <= ultimo_id:
+                    continue
+                if ate_id is not None and linha[0] > ate_id:
+                    return
+                ultimo_id = linha[0]
+                if produto_id is not None and linha[1] != produto_id:
+                    continue
+                if (inicio is not None and linha[7] < inicio) or (fim is not None and linha[7] >= fim):
+                    continue
+                yield tuple(linha)
+
+# Função para achar o último id arquivado com data_movimentacao <= instante
+# Lê do mês do instante para trás e para no primeiro mês com alguma movimentação até ele.
+def ultimo_id_arquivado_ate(instante):
+    mes = mes_arquivo(instante)
+    for mes_arquivado, caminho in reversed(listar_arquivos()):
+        if mes_arquivado > mes:
+            continue
+        ultimo_id = 0
+        with abrir_arquivo(caminho) as arquivo:
+            for texto in arquivo:
+                linha = json.loads(texto)
+                if linha[7] <= instante:
+                    ultimo_id = max(ultimo_id, linha[0])
+        if ultimo_id:
+            return ultimo_id
+    return 0
+
+# Função para exportar movimentações arquivadas de um produto para CSV (mesmas colunas do
+# historico.exportar_historico). Retorna quantas foram exportadas.
+def exportar_arquivo(caminho, produto_id, inicio=None, fim=None):
+    listar_arquivos()  # pasta ausente: erro antes de criar o CSV
+    total = 0
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(historico.CAMPOS_EXPORTACAO)
+        for movimentacao_id, _, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data in ler_arquivo(produto_id, inicio, fim):
+            escritor.writerow((movimentacao_id, banco.formatar_data(data), acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual))
+            total += 1
+    return total
+
+# Função para registrar no histórico a exclusão dos produtos apagados sem ela
+# A exclusão entra com a data de hoje; sem ela, o estoque por data e a conferência
+# continuariam contando o produto. Retorna quantos produtos foram encerrados.
+def encerrar_orfaos():
+    with banco.transacao() as conn:
+        orfaos = conn.execute(SQL_ORFAOS, (banco.ACAO_EXCLUSAO,)).fetchall()
+        data_movimentacao = banco.agora()
+        conn.executemany(banco.SQL_INSERIR_HISTORICO, [
+            (produto_id, banco.ACAO_EXCLUSAO, quantidade, 0, preco, preco, data_movimentacao)
+            for produto_id, quantidade, preco in orfaos
+        ])
+    return len(orfaos)
+
+# Função para gravar o retrato do estoque no limite do trecho arquivado (id "ultimo_id")
+def gravar_retrato_limite(ultimo_id):
+    conn = banco.conectar_db()
+    existente = conn.execute('SELECT id FROM snapshots WHERE ultimo_historico_id = ?', (ultimo_id,)).fetchone()
+    if existente is not None:
+        return existente[0]
+
+    estoque = auditoria.estoque_ate_id(ultimo_id)
+    data = conn.execute('SELECT data_movimentacao FROM historico WHERE id <= ? ORDER BY id DESC LIMIT 1', (ultimo_id,)).fetchone()
+    with banco.transacao() as conn:
+        snapshot_id = conn.execute(
+            'INSERT INTO snapshots (data, ultimo_historico_id) VALUES (?, ?)', (data[0] if data else 0, ultimo_id),
+        ).lastrowid
+        conn.executemany(
+            'INSERT INTO snapshot_estoque (snapshot_id, produto_id, quantidade) VALUES (?, ?, ?)',
+            ((snapshot_id, produto_id, quantidade) for produto_id, quantidade in estoque.items()),
+        )
+    return snapshot_id
+
+# Função para apagar os retratos antigos que sobram (um por mês fica), um por transação
+def descartar_retratos(ultimo_id):
+    descartados = [linha[0] for linha in banco.conectar_db().execute(SQL_RETRATOS_DESCARTAVEIS, (ultimo_id,))]
+    for snapshot_id in descartados:
+        with banco.transacao() as conn:
+            conn.execute('DELETE FROM snapshot_estoque WHERE snapshot_id = ?', (snapshot_id,))
+            conn.execute('DELETE FROM snapshots WHERE id = ?', (snapshot_id,))
+    return len(descartados)
+
+# Função para mover um lote de movimentações (apos_id, ate_id] para os arquivos mensais
+# Retorna o último id movido (ou apos_id se não havia nada) e quantas foram movidas.
+def arquivar_lote(apos_id, ate_id, compressao, lote):
+    conn = banco.conectar_db()
+    linhas = conn.execute(
+        f'SELECT {COLUNAS_ARQUIVO} FROM historico WHERE id > ? AND id <= ? ORDER BY id LIMIT ?', (apos_id, ate_id, lote),
+    ).fetchall()
+    if not linhas:
+        return apos_id, 0
+
+    diretorio = diretorio_arquivo()
+    os.makedirs(diretorio, exist_ok=True)
+    por_mes = {}
+    for linha in linhas:
+        por_mes.setdefault(mes_arquivo(linha[7]), []).append(linha)
+    for mes, linhas_mes in por_mes.items():
+        acrescentar_arquivo(caminho_arquivo(diretorio, mes, compressao), compressao, linhas_mes)
+
+    ultimo_id = linhas[-1][0]
+    with banco.transacao() as conn:
+        fixar_diretorio(conn)
+        conn.execute('DELETE FROM historico WHERE id > ? AND id <= ?', (apos_id, ultimo_id))
+        conn.execute('UPDATE retencao_controle SET ultimo_arquivado_id = ? WHERE id = 1', (ultimo_id,))
+    return ultimo_id, len(linhas)
+
+# Função para devolver ao sistema as páginas livres do arquivo do banco, em passos curtos
+# Só funciona em bancos com auto_vacuum incremental (bancos novos; os antigos precisam de
+# um VACUUM completo uma vez, ver converter_auto_vacuum). Cada passo é uma escrita curta
+# própria; executescript roda o PRAGMA até o fim (execute liberaria só uma página).
+# Retorna as páginas liberadas, ou None se o banco não usa auto_vacuum incremental.
+def liberar_espaco(paginas=PAGINAS_VACUUM):
+    conn = banco.conectar_db()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return None
+    liberadas = 0
+    livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    while livres:
+        conn.executescript(f'PRAGMA incremental_vacuum({paginas})')
+        restantes = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if restantes >= livres:
+            break
+        liberadas += livres - restantes
+        livres = restantes
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return liberadas
+
+# Função para passar um banco antigo para auto_vacuum incremental
+# O VACUUM completo reescreve o arquivo inteiro e bloqueia as escritas enquanto roda: faça
+# uma vez, fora do horário da loja.
+def converter_auto_vacuum():
+    conn = banco.conectar_db()
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+
+# Função para refazer as estatísticas do planejador com amostragem limitada
+def analisar():
+    conn = banco.conectar_db()
+    conn.execute(f'PRAGMA analysis_limit = {LIMITE_ANALISE}')
+    conn.execute('ANALYZE')
+
+# Função para aplicar a retenção: arquiva e apaga as movimentações com mais de "dias" dias
+# "compressao" é 'gzip' ou 'zstd' (pacote zstandard). "ao_progresso" (opcional) recebe o
+# total de movimentações já arquivadas a cada lote.
+# Retorna um resumo com orfaos, arquivadas, retratos_descartados e paginas_liberadas.
+def compactar(dias=DIAS_RETENCAO, compressao='gzip', lote=LOTE_ARQUIVAMENTO, ao_progresso=None):
+    if compressao not in COMPRESSOES:
+        raise ValueError(f"Compressão desconhecida: {compressao}")
+    if compressao == 'zstd':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ValueError("A compressão zstd precisa do pacote zstandard (pip install zstandard).") from None
+
+    resultado = {'orfaos': encerrar_orfaos(), 'arquivadas': 0, 'retratos_descartados': 0, 'paginas_liberadas': None}
+    resumo.atualizar_resumo()
+
+    conn = banco.conectar_db()
+    arquivado = auditoria.ultimo_arquivado(conn)
+    if arquivado:
+        listar_arquivos()  # não continua arquivando numa pasta sem os meses anteriores
+    maior = conn.execute('SELECT COALESCE(MAX(id), 0) FROM historico').fetchone()[0]
+    marca_resumo = conn.execute('SELECT ultimo_historico_id FROM resumo_controle WHERE id = 1').fetchone()[0]
+    limite = min(auditoria.ultimo_id_ate(conn, banco.agora() - dias * 86400, arquivado, maior), marca_resumo)
+
+    if limite > arquivado:
+        gravar_retrato_limite(limite)
+        while arquivado < limite:
+            arquivado, movidas = arquivar_lote(arquivado, limite, compressao, lote)
+            if not movidas:
+                break
+            resultado['arquivadas'] += movidas
+            if ao_progresso is not None:
+                ao_progresso(resultado['arquivadas'])
+
+    resultado['retratos_descartados'] = descartar_retratos(arquivado)
+    resultado['paginas_liberadas'] = liberar_espaco()
+    analisar()
+    return resultado
@@ -1,60 +1,37 @@
+import sys
 import tkinter as tk
-from tkinter import messagebox
-import sqlite3
-import matplotlib.pyplot as plt
-import pandas as pd
-from datetime import datetime
-
-# Função para conectar ao banco de dados SQLite
-def conectar_db():
-    conn = sqlite3.connect('mercadinho.db')
-    return conn
-
-# Função para criar a tabela se não existir
-def criar_tabela():
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS produtos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            preco REAL NOT NULL,
-            quantidade INTEGER NOT NULL
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS historico (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            produto_id INTEGER,
-            acao TEXT,
-            quantidade_anterior INTEGER,
-            quantidade_atual INTEGER,
-            preco_anterior REAL,
-            preco_atual REAL,
-            data_movimentacao TEXT,
-            FOREIGN KEY (produto_id) REFERENCES produtos(id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Função para carregar os produtos da tabela
-def carregar_produtos():
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM produtos')
-    produtos = cursor.fetchall()
-    conn.close()
-    return produtos
-
-# Função para carregar o histórico do produto
-def carregar_historico(produto_id):
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM historico WHERE produto_id = ?', (produto_id,))
-    historico = cursor.fetchall()
-    conn.close()
-    return historico
+from concurrent.futures import Future
+from tkinter import filedialog, messagebox, ttk
+from banco import (
+    fechar_conexoes, criar_tabela, formatar_data, interpretar_data, validar_produto,
+    ACAO_VENDA, CamposVazios, ProdutoNaoEncontrado, EstoqueInsuficiente,
+)
+from lista_virtual import ListaVirtual
+from cache_produtos import CacheProdutos
+from tarefas import ExecutorTarefas
+from busca import FonteBusca, LIMITE_ESTOQUE_BAIXO
+from historico import FonteHistorico
+from reposicao import MonitorReposicao
+import cliente
+import instrumentacao
+
+# Intervalo para conferir se outro processo alterou o banco
+INTERVALO_VERIFICACAO_MS = 2000
+
+# Intervalo de atualização do painel de estatísticas
+INTERVALO_ESTATISTICAS_MS = 1000
+
+# Intervalo de atualização do painel de reposição e do contador no botão
+INTERVALO_REPOSICAO_MS = 1000
+
+# Produtos listados no painel de reposição
+LIMITE_PAINEL_REPOSICAO = 30
+
+# Espera depois da última tecla antes de executar a busca
+ATRASO_BUSCA_MS = 250
+
+busca_agendada = None
+numero_busca = 0
 
 # Função para formatar o texto com quebra de linha
 def formatar_texto(texto, largura_max):
@@ -72,532 +49,378 @@ def formatar_texto(texto, largura_max):
     linhas.append(linha_atual)
     return "\n".join(linhas)
 
-# Função para atualizar a Listbox com os produtos
-def atualizar_lista_produtos():
-    lista_produtos.delete(0, tk.END)
-    produtos = carregar_produtos()
-    largura_max = 50
-    for produto in produtos:
-        texto_produto = f"ID: {produto[0]} | Nome: {produto[1]} | Preço: R$ {produto[2]:.2f} | Quantidade: {produto[3]}"
-        texto_formatado = formatar_texto(texto_produto, largura_max)
-        lista_produtos.insert(tk.END, texto_formatado)
-
-# Função para adicionar um novo produto
-def adicionar_produto():
-    nome = entry_nome.get()
-    preco = entry_preco.get()
-    quantidade = entry_quantidade.get()
-
-    if not nome or not preco or not quantidade:
-        messagebox.showwarning("Aviso", "Todos os campos devem ser preenchidos!")
-        return
-
-    try:
-        preco = float(preco)
-        quantidade = int(quantidade)
-    except ValueError:
-        messagebox.showerror("Erro", "Preço deve ser um número e Quantidade deve ser um inteiro!")
-        return
-
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)', (nome, preco, quantidade))
-    produto_id = cursor.lastrowid
-    conn.commit()
+# Função para recarregar a lista quando o banco for alterado por fora do aplicativo
+# A conferência (que pode recarregar o catálogo inteiro) roda no executor; a lista é
+# redesenhada no ao_concluir e a próxima conferência só é agendada quando esta termina.
+def verificar_alteracoes_externas():
+    def conferir():
+        mudou = cache_produtos.validar()
+        if servico is None:
+            monitor_reposicao.validar()
+        return mudou
 
-    # Adiciona o histórico de criação
-    adicionar_historico(produto_id, "Produto criado", 0, quantidade, preco, preco)
+    def concluir(mudou):
+        if mudou:
+            atualizar_lista_produtos()
+        root.after(INTERVALO_VERIFICACAO_MS, verificar_alteracoes_externas)
 
-    conn.close()
+    def falhar(erro):
+        root.after(INTERVALO_VERIFICACAO_MS, verificar_alteracoes_externas)
 
-    atualizar_lista_produtos()
-    entry_nome.delete(0, tk.END)
-    entry_preco.delete(0, tk.END)
-    entry_quantidade.delete(0, tk.END)
-
-# Função para remover um produto selecionado
-def remover_produto():
-    try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
-    except IndexError:
-        messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
-        return
+    executor.executar(conferir, ao_concluir=concluir, ao_falhar=falhar)
 
-    if messagebox.askyesno("Confirmação", "Você tem certeza que deseja remover este produto?"):
-        conn = conectar_db()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM produtos WHERE id = ?', (produto_id,))
-        conn.commit()
-        conn.close()
-
-        atualizar_lista_produtos()
+# Função para formatar a linha de um produto na lista
+def formatar_produto(produto):
+    largura_max = 50
+    texto_produto = f"ID: {produto[0]} | Nome: {produto[1]} | Preço: R$ {produto[2]:.2f} | Quantidade: {produto[3]}"
+    return formatar_texto(texto_produto, largura_max)
 
-# Função para atualizar o produto selecionado
-def atualizar_produto():
-    try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
-    except IndexError:
-        messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
-        return
+# Função para atualizar a Listbox com os produtos (somente a janela visível é lida)
+def atualizar_lista_produtos():
+    lista_produtos.recarregar()
 
-    nome = entry_nome.get()
-    preco = entry_preco.get()
-    quantidade = entry_quantidade.get()
+# Função para agendar a busca depois que o usuário para de digitar
+def agendar_busca(evento=None):
+    global busca_agendada
+    if busca_agendada is not None:
+        root.after_cancel(busca_agendada)
+    busca_agendada = root.after(ATRASO_BUSCA_MS, executar_busca)
 
-    if not nome or not preco or not quantidade:
-        messagebox.showwarning("Aviso", "Todos os campos devem ser preenchidos!")
-        return
+# Função para filtrar a lista pelo nome, faixa de preço e estoque baixo
+def executar_busca():
+    global busca_agendada, numero_busca
+    busca_agendada = None
 
+    termo = entry_busca.get()
     try:
-        preco = float(preco)
-        quantidade = int(quantidade)
+        preco_min = float(entry_preco_min.get()) if entry_preco_min.get() else None
+        preco_max = float(entry_preco_max.get()) if entry_preco_max.get() else None
     except ValueError:
-        messagebox.showerror("Erro", "Preço deve ser um número e Quantidade deve ser um inteiro!")
         return
+    estoque_max = LIMITE_ESTOQUE_BAIXO if var_estoque_baixo.get() else None
 
-    # Recupera a quantidade e preço anterior
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT quantidade, preco FROM produtos WHERE id = ?', (produto_id,))
-    resultado = cursor.fetchone()
-    quantidade_anterior = resultado[0]
-    preco_anterior = resultado[1]
+    if not termo.strip() and preco_min is None and preco_max is None and estoque_max is None:
+        lista_produtos.trocar_fonte(cache_produtos)
+        return
 
-    # Atualiza o produto no banco de dados
-    cursor.execute('UPDATE produtos SET nome = ?, preco = ?, quantidade = ? WHERE id = ?', (nome, preco, quantidade, produto_id))
-    conn.commit()
+    # Só o resultado da busca mais recente é exibido
+    numero_busca += 1
+    numero = numero_busca
 
-    # Adiciona ao histórico
-    adicionar_historico(produto_id, "Produto atualizado", quantidade_anterior, quantidade, preco_anterior, preco)
+    def mostrar(ids):
+        if numero == numero_busca:
+            lista_produtos.trocar_fonte(FonteBusca(ids, cache_produtos))
 
-    conn.close()
+    executor.executar(loja.buscar_produtos, termo, preco_min, preco_max, estoque_max, ao_concluir=mostrar, ao_falhar=mostrar_falha)
 
-    atualizar_lista_produtos()
+# Função para limpar os campos de cadastro
+def limpar_campos():
     entry_nome.delete(0, tk.END)
     entry_preco.delete(0, tk.END)
     entry_quantidade.delete(0, tk.END)
 
-# Função para adicionar uma movimentação ao histórico
-def adicionar_historico(produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual):
-    data_movimentacao = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO historico (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao))
-    conn.commit()
-    conn.close()
-
-# Função para exibir o histórico de um produto
-def exibir_historico():
-    try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
-    except IndexError:
-        messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
-        return
-
-    historico = carregar_historico(produto_id)
-    texto_historico = f"Histórico do Produto ID {produto_id}:\n"
-    for entrada in historico:
-        texto_historico += (f"{entrada[3]} -> {entrada[4]} (Preço: R$ {entrada[5]:.2f} -> R$ {entrada[6]:.2f}) em {entrada[7]}\n")
-
-    messagebox.showinfo("Histórico", texto_historico)
-
-# Função para gerar o relatório em Excel com gráfico
-def gerar_relatorio():
-    produtos = carregar_produtos()
-    if not produtos:
-        messagebox.showwarning("Aviso", "Nenhum produto disponível para gerar relatório.")
-        return
-
-    dados = {
-        "Produto": [],
-        "Quantidade Atual": [],
-        "Quantidade Vendida": []
-    }
-
-    for produto in produtos:
-        produto_id = produto[0]
-        nome = produto[1]
-        quantidade_atual = produto[3]
-
-        # Simulação de quantidades vendidas para o relatório
-        quantidade_vendida = max(0, 15 - quantidade_atual)  # Exemplo de cálculo de vendas
-
-        dados["Produto"].append(nome)
-        dados["Quantidade Atual"].append(quantidade_atual)
-        dados["Quantidade Vendida"].append(quantidade_vendida)
-
-    df = pd.DataFrame(dados)
-    df.to_excel("relatorio_estoque.xlsx", index=False)
-
-    # Gerar gráfico
-    df.plot(x="Produto", y=["Quantidade Atual", "Quantidade Vendida"], kind="bar")
-    plt.title("Relatório de Estoque")
-    plt.ylabel("Quantidade")
-    plt.savefig("relatorio_estoque.png")
-    plt.show()
-
-    messagebox.showinfo("Sucesso", "Relatório gerado com sucesso!")
-
-# Função para abrir a janela de simulação de vendas
-def abrir_janela_simular_venda():
-    janela_venda = tk.Toplevel(root)
-    janela_venda.title("Simular Venda")
-
-    tk.Label(janela_venda, text="Número de vendas a simular:").pack(padx=10, pady=10)
-    entry_vendas = tk.Entry(janela_venda)
-    entry_vendas.pack(padx=10, pady=10)
-
-    def confirmar_simulacao():
-        try:
-            quantidade_venda = int(entry_vendas.get())
-            simular_venda(quantidade_venda)
-            janela_venda.destroy()
-        except ValueError:
-            messagebox.showerror("Erro", "Por favor, insira um número válido.")
-
-    tk.Button(janela_venda, text="Confirmar", command=confirmar_simulacao).pack(pady=10)
-
-# Função para simular uma venda
-def simular_venda(quantidade_venda):
-    try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
-    except IndexError:
-        messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
-        return
-
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT quantidade FROM produtos WHERE id = ?', (produto_id,))
-    quantidade_atual = cursor.fetchone()[0]
-
-    if quantidade_venda > quantidade_atual:
-        messagebox.showwarning("Aviso", "Quantidade vendida é maior que a disponível!")
-        return
-
-    nova_quantidade = quantidade_atual - quantidade_venda
-    cursor.execute('UPDATE produtos SET quantidade = ? WHERE id = ?', (nova_quantidade, produto_id))
-    conn.commit()
-
-    # Adiciona ao histórico
-    adicionar_historico(produto_id, "Venda simulada", quantidade_atual, nova_quantidade, cursor.execute('SELECT preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()[0], cursor.execute('SELECT preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()[0])
-
-    conn.close()
-
-    atualizar_lista_produtos()
-    messagebox.showinfo("Sucesso", "Venda simulada com sucesso!")
-
-# Inicialização do banco de dados e criação da tabela
-criar_tabela()
-
-# Configuração da interface gráfica
-root = tk.Tk()
-root.title("Controle de Estoque")
-
-# Frame para os controles
-frame_controles = tk.Frame(root)
-frame_controles.pack(pady=10)
-
-# Entrada de Nome
-tk.Label(frame_controles, text="Nome:").grid(row=0, column=0, padx=5, pady=5)
-entry_nome = tk.Entry(frame_controles)
-entry_nome.grid(row=0, column=1, padx=5, pady=5)
-
-# Entrada de Preço
-tk.Label(frame_controles, text="Preço:").grid(row=1, column=0, padx=5, pady=5)
-entry_preco = tk.Entry(frame_controles)
-entry_preco.grid(row=1, column=1, padx=5, pady=5)
-
-# Entrada de Quantidade
-tk.Label(frame_controles, text="Quantidade:").grid(row=2, column=0, padx=5, pady=5)
-entry_quantidade = tk.Entry(frame_controles)
-entry_quantidade.grid(row=2, column=1, padx=5, pady=5)
-
-# Botão Adicionar
-btn_adicionar = tk.Button(frame_controles, text="Adicionar", command=adicionar_produto)
-btn_adicionar.grid(row=3, column=0, padx=5, pady=5)
-
-# Botão Remover
-btn_remover = tk.Button(frame_controles, text="Remover", command=remover_produto)
-btn_remover.grid(row=3, column=1, padx=5, pady=5)
-
-# Botão Atualizar
-btn_atualizar = tk.Button(frame_controles, text="Atualizar", command=atualizar_produto)
-btn_atualizar.grid(row=3, column=2, padx=5, pady=5)
-
-# Botão Exibir Histórico
-btn_historico = tk.Button(frame_controles, text="Exibir Histórico", command=exibir_historico)
-btn_historico.grid(row=3, column=3, padx=5, pady=5)
-
-# Botão Gerar Relatório
-btn_relatorio = tk.Button(frame_controles, text="Gerar Relatório", command=gerar_relatorio)
-btn_relatorio.grid(row=3, column=4, padx=5, pady=5)
-
-# Botão Simular Venda
-btn_simular_venda = tk.Button(frame_controles, text="Simular Venda", command=abrir_janela_simular_venda)
-btn_simular_venda.grid(row=3, column=5, padx=5, pady=5)
-
-# Listbox para exibir produtos
-lista_produtos = tk.Listbox(root, width=70, height=15)  # Ajustado para maior largura
-lista_produtos.pack(pady=10)
-
-# Carregar produtos no início
-atualizar_lista_produtos()
-
-# Removido o preenchimento de itens iniciais
-
-root.mainloop()
-import tkinter as tk
-from tkinter import messagebox
-import sqlite3
-import matplotlib.pyplot as plt
-import pandas as pd
-from datetime import datetime
-
-# Função para conectar ao banco de dados SQLite
-def conectar_db():
-    conn = sqlite3.connect('mercadinho.db')
-    return conn
-
-# Função para criar a tabela se não existir
-def criar_tabela():
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS produtos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            preco REAL NOT NULL,
-            quantidade INTEGER NOT NULL
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS historico (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            produto_id INTEGER,
-            acao TEXT,
-            quantidade_anterior INTEGER,
-            quantidade_atual INTEGER,
-            preco_anterior REAL,
-            preco_atual REAL,
-            data_movimentacao TEXT,
-            FOREIGN KEY (produto_id) REFERENCES produtos(id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Função para carregar os produtos da tabela
-def carregar_produtos():
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM produtos')
-    produtos = cursor.fetchall()
-    conn.close()
-    return produtos
-
-# Função para carregar o histórico do produto
-def carregar_historico(produto_id):
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM historico WHERE produto_id = ?', (produto_id,))
-    historico = cursor.fetchall()
-    conn.close()
-    return historico
-
-# Função para formatar o texto com quebra de linha
-def formatar_texto(texto, largura_max):
-    palavras = texto.split()
-    linhas = []
-    linha_atual = ""
-    for palavra in palavras:
-        if len(linha_atual) + len(palavra) + 1 > largura_max:
-            linhas.append(linha_atual)
-            linha_atual = palavra
-        else:
-            if linha_atual:
-                linha_atual += " "
-            linha_atual += palavra
-    linhas.append(linha_atual)
-    return "\n".join(linhas)
-
-# Função para atualizar a Listbox com os produtos
-def atualizar_lista_produtos():
-    lista_produtos.delete(0, tk.END)
-    produtos = carregar_produtos()
-    largura_max = 50
-    for produto in produtos:
-        texto_produto = f"ID: {produto[0]} | Nome: {produto[1]} | Preço: R$ {produto[2]:.2f} | Quantidade: {produto[3]}"
-        texto_formatado = formatar_texto(texto_produto, largura_max)
-        lista_produtos.insert(tk.END, texto_formatado)
+# Função para mostrar o erro de uma operação feita em segundo plano
+def mostrar_falha(erro):
+    if isinstance(erro, (ProdutoNaoEncontrado, EstoqueInsuficiente)):
+        messagebox.showwarning("Aviso", str(erro))
+    else:
+        messagebox.showerror("Erro", str(erro))
+
+# Função para abrir uma janela com barra de progresso e botão de cancelar
+def abrir_janela_progresso(titulo, ao_cancelar):
+    janela = tk.Toplevel(root)
+    janela.title(titulo)
+    rotulo = tk.Label(janela, text="Iniciando...")
+    rotulo.pack(padx=10, pady=10)
+    barra = ttk.Progressbar(janela, length=300, maximum=1.0)
+    barra.pack(padx=10, pady=5)
+    tk.Button(janela, text="Cancelar", command=ao_cancelar).pack(pady=10)
+
+    def atualizar(fracao, mensagem):
+        barra['value'] = fracao
+        rotulo.config(text=mensagem)
+
+    return janela, atualizar
+
+# Função para exibir o gráfico do relatório numa janela (substitui o plt.show bloqueante)
+def exibir_grafico(caminho_png):
+    janela = tk.Toplevel(root)
+    janela.title("Relatório de Estoque")
+    janela.imagem = tk.PhotoImage(file=caminho_png)
+    tk.Label(janela, image=janela.imagem).pack()
 
 # Função para adicionar um novo produto
 def adicionar_produto():
-    nome = entry_nome.get()
-    preco = entry_preco.get()
-    quantidade = entry_quantidade.get()
-
-    if not nome or not preco or not quantidade:
-        messagebox.showwarning("Aviso", "Todos os campos devem ser preenchidos!")
-        return
-
     try:
-        preco = float(preco)
-        quantidade = int(quantidade)
-    except ValueError:
-        messagebox.showerror("Erro", "Preço deve ser um número e Quantidade deve ser um inteiro!")
+        nome, preco, quantidade = validar_produto(entry_nome.get(), entry_preco.get(), entry_quantidade.get())
+    except CamposVazios as erro:
+        messagebox.showwarning("Aviso", str(erro))
+        return
+    except ValueError as erro:
+        messagebox.showerror("Erro", str(erro))
         return
 
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO produtos (nome, preco, quantidade) VALUES (?, ?, ?)', (nome, preco, quantidade))
-    produto_id = cursor.lastrowid
-    conn.commit()
-
-    # Adiciona o histórico de criação
-    adicionar_historico(produto_id, "Produto criado", 0, quantidade, preco, preco)
+    def concluir(produto_id):
+        lista_produtos.produto_inserido(produto_id)
+        limpar_campos()
 
-    conn.close()
-
-    atualizar_lista_produtos()
-    entry_nome.delete(0, tk.END)
-    entry_preco.delete(0, tk.END)
-    entry_quantidade.delete(0, tk.END)
+    # Cadastra o produto e o histórico de criação numa única transação, fora da thread do Tk
+    executor.executar(loja.criar_produto, nome, preco, quantidade, ao_concluir=concluir, ao_falhar=mostrar_falha)
 
 # Função para remover um produto selecionado
 def remover_produto():
     try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
+        produto_id = lista_produtos.produto_selecionado()
     except IndexError:
         messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
         return
 
     if messagebox.askyesno("Confirmação", "Você tem certeza que deseja remover este produto?"):
-        conn = conectar_db()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM produtos WHERE id = ?', (produto_id,))
-        conn.commit()
-        conn.close()
-
-        atualizar_lista_produtos()
+        executor.executar(
+            loja.excluir_produto, produto_id,
+            ao_concluir=lambda resultado: lista_produtos.produto_removido(produto_id),
+            ao_falhar=mostrar_falha,
+        )
 
 # Função para atualizar o produto selecionado
 def atualizar_produto():
     try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
+        produto_id = lista_produtos.produto_selecionado()
     except IndexError:
         messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
         return
 
-    nome = entry_nome.get()
-    preco = entry_preco.get()
-    quantidade = entry_quantidade.get()
-
-    if not nome or not preco or not quantidade:
-        messagebox.showwarning("Aviso", "Todos os campos devem ser preenchidos!")
-        return
-
     try:
-        preco = float(preco)
-        quantidade = int(quantidade)
-    except ValueError:
-        messagebox.showerror("Erro", "Preço deve ser um número e Quantidade deve ser um inteiro!")
+        nome, preco, quantidade = validar_produto(entry_nome.get(), entry_preco.get(), entry_quantidade.get())
+    except CamposVazios as erro:
+        messagebox.showwarning("Aviso", str(erro))
+        return
+    except ValueError as erro:
+        messagebox.showerror("Erro", str(erro))
         return
 
-    # Recupera a quantidade e preço anterior
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT quantidade, preco FROM produtos WHERE id = ?', (produto_id,))
-    resultado = cursor.fetchone()
-    quantidade_anterior = resultado[0]
-    preco_anterior = resultado[1]
-
-    # Atualiza o produto no banco de dados
-    cursor.execute('UPDATE produtos SET nome = ?, preco = ?, quantidade = ? WHERE id = ?', (nome, preco, quantidade, produto_id))
-    conn.commit()
-
-    # Adiciona ao histórico
-    adicionar_historico(produto_id, "Produto atualizado", quantidade_anterior, quantidade, preco_anterior, preco)
+    def concluir(resultado):
+        lista_produtos.produto_alterado(produto_id)
+        limpar_campos()
 
-    conn.close()
+    def falhar(erro):
+        lista_produtos.produto_alterado(produto_id)
+        mostrar_falha(erro)
 
-    atualizar_lista_produtos()
-    entry_nome.delete(0, tk.END)
-    entry_preco.delete(0, tk.END)
-    entry_quantidade.delete(0, tk.END)
+    # Atualiza o produto e adiciona ao histórico numa única transação
+    executor.executar(loja.editar_produto, produto_id, nome, preco, quantidade, ao_concluir=concluir, ao_falhar=falhar)
 
-# Função para adicionar uma movimentação ao histórico
-def adicionar_historico(produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual):
-    data_movimentacao = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO historico (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (produto_id, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data_movimentacao))
-    conn.commit()
-    conn.close()
+# Função para formatar uma movimentação na lista do histórico
+def formatar_movimentacao(movimentacao):
+    _, acao, quantidade_anterior, quantidade_atual, preco_anterior, preco_atual, data = movimentacao
+    return f"{formatar_data(data)}  {acao}: {quantidade_anterior} -> {quantidade_atual} (Preço: R$ {preco_anterior:.2f} -> R$ {preco_atual:.2f})"
 
 # Função para exibir o histórico de um produto
+# A janela usa uma ListaVirtual sobre o histórico: as páginas são lidas do banco conforme
+# a rolagem, com filtro por intervalo de datas e exportação do intervalo para CSV.
 def exibir_historico():
     try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
+        produto_id = lista_produtos.produto_selecionado()
     except IndexError:
         messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
         return
 
-    historico = carregar_historico(produto_id)
-    texto_historico = f"Histórico do Produto ID {produto_id}:\n"
-    for entrada in historico:
-        texto_historico += (f"{entrada[3]} -> {entrada[4]} (Preço: R$ {entrada[5]:.2f} -> R$ {entrada[6]:.2f}) em {entrada[7]}\n")
+    janela = tk.Toplevel(root)
+    janela.title(f"Histórico do Produto ID {produto_id}")
 
-    messagebox.showinfo("Histórico", texto_historico)
+    frame_filtro = tk.Frame(janela)
+    frame_filtro.pack(padx=10, pady=5, fill=tk.X)
+    tk.Label(frame_filtro, text="De (AAAA-MM-DD):").pack(side=tk.LEFT)
+    entry_inicio = tk.Entry(frame_filtro, width=12)
+    entry_inicio.pack(side=tk.LEFT, padx=5)
+    tk.Label(frame_filtro, text="Até:").pack(side=tk.LEFT)
+    entry_fim = tk.Entry(frame_filtro, width=12)
+    entry_fim.pack(side=tk.LEFT, padx=5)
+
+    rotulo_total = tk.Label(janela, anchor='w')
+    lista_historico = ListaVirtual(janela, FonteHistorico(produto_id, origem=loja), formatar_movimentacao, altura=20, largura=90)
+
+    # Intervalo [inicio, fim) dos campos de data; "Até" inclui o dia inteiro
+    def ler_intervalo():
+        inicio = interpretar_data(entry_inicio.get()) if entry_inicio.get().strip() else None
+        fim = interpretar_data(entry_fim.get(), dias=1) if entry_fim.get().strip() else None
+        return inicio, fim
+
+    def filtrar():
+        try:
+            inicio, fim = ler_intervalo()
+        except ValueError as erro:
+            messagebox.showerror("Erro", str(erro), parent=janela)
+            return
+        lista_historico.trocar_fonte(FonteHistorico(produto_id, inicio, fim, origem=loja))
+        rotulo_total.config(text=f"{lista_historico.total} movimentações")
+
+    def exportar():
+        try:
+            inicio, fim = ler_intervalo()
+        except ValueError as erro:
+            messagebox.showerror("Erro", str(erro), parent=janela)
+            return
+        caminho = filedialog.asksaveasfilename(
+            parent=janela, defaultextension='.csv', initialfile=f"historico_{produto_id}.csv",
+            filetypes=[("CSV", "*.csv")],
+        )
+        if not caminho:
+            return
+
+        def concluir(total):
+            messagebox.showinfo("Sucesso", f"{total} movimentações exportadas para {caminho}", parent=janela)
+
+        executor.executar(loja.exportar_historico, caminho, produto_id, inicio, fim, ao_concluir=concluir, ao_falhar=mostrar_falha)
+
+    tk.Button(frame_filtro, text="Filtrar", command=filtrar).pack(side=tk.LEFT, padx=5)
+    tk.Button(frame_filtro, text="Exportar CSV", command=exportar).pack(side=tk.LEFT, padx=5)
+    entry_inicio.bind('<Return>', lambda evento: filtrar())
+    entry_fim.bind('<Return>', lambda evento: filtrar())
+
+    lista_historico.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+    rotulo_total.pack(padx=10, pady=5, fill=tk.X)
+    filtrar()
+
+# Função para exibir o painel de estatísticas da instrumentação (atualizado a cada segundo)
+def exibir_estatisticas():
+    janela = tk.Toplevel(root)
+    janela.title("Estatísticas")
+    texto = tk.Text(janela, width=130, height=35, font=('Courier', 9))
+    texto.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+    def atualizar():
+        if not janela.winfo_exists():
+            return
+        texto.config(state=tk.NORMAL)
+        texto.delete('1.0', tk.END)
+        texto.insert(tk.END, instrumentacao.resumo_texto())
+        texto.config(state=tk.DISABLED)
+        janela.after(INTERVALO_ESTATISTICAS_MS, atualizar)
+
+    atualizar()
+
+# Função para manter o contador de produtos no ponto de reposição no botão da janela principal
+# A leitura roda no executor (no modo serviço é uma chamada pela rede) e a próxima só é
+# agendada quando a anterior termina.
+def atualizar_indicador_reposicao():
+    def concluir(situacao):
+        abaixo = situacao[0]
+        btn_reposicao.config(text=f"Reposição ({abaixo})", fg='red' if abaixo else 'black')
+        root.after(INTERVALO_REPOSICAO_MS, atualizar_indicador_reposicao)
+
+    def falhar(erro):
+        root.after(INTERVALO_REPOSICAO_MS, atualizar_indicador_reposicao)
+
+    executor.executar(monitor_reposicao.situacao, 0, ao_concluir=concluir, ao_falhar=falhar)
+
+# Função para formatar a linha de um produto no painel de reposição
+def formatar_reposicao(produto_id, nome, quantidade, ponto):
+    marca = "!" if quantidade <= ponto else " "
+    return f"{marca} {produto_id:>7} {quantidade:>8} {ponto:>6}  {nome}"
+
+# Função para exibir o painel de reposição: produtos mais perto do ponto (atualizado a cada
+# segundo), alertas recentes, definição do ponto do produto selecionado e sugestão de compra
+def exibir_reposicao():
+    janela = tk.Toplevel(root)
+    janela.title("Reposição")
+    rotulo_resumo = tk.Label(janela, anchor='w')
+    rotulo_resumo.pack(padx=10, pady=5, fill=tk.X)
+    texto = tk.Text(janela, width=80, height=30, font=('Courier', 9))
+    texto.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+
+    frame_ponto = tk.Frame(janela)
+    frame_ponto.pack(padx=10, pady=5, fill=tk.X)
+    tk.Label(frame_ponto, text="Ponto de reposição:").pack(side=tk.LEFT)
+    entry_ponto = tk.Entry(frame_ponto, width=8)
+    entry_ponto.pack(side=tk.LEFT, padx=5)
+
+    # Campo vazio volta o produto selecionado ao ponto padrão
+    def definir_ponto():
+        try:
+            produto_id = lista_produtos.produto_selecionado()
+        except IndexError:
+            messagebox.showwarning("Aviso", "Nenhum produto selecionado!", parent=janela)
+            return
+        try:
+            ponto = int(entry_ponto.get()) if entry_ponto.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Erro", "Ponto de reposição deve ser um inteiro!", parent=janela)
+            return
+        executor.executar(loja.definir_ponto_reposicao, produto_id, ponto,
+                          ao_concluir=lambda resultado: entry_ponto.delete(0, tk.END), ao_falhar=mostrar_falha)
+
+    def exportar_sugestao():
+        caminho = filedialog.asksaveasfilename(
+            parent=janela, defaultextension='.csv', initialfile="sugestao_compra.csv", filetypes=[("CSV", "*.csv")],
+        )
+        if not caminho:
+            return
+
+        def concluir(total):
+            messagebox.showinfo("Sucesso", f"Sugestão de compra de {total} produtos exportada para {caminho}", parent=janela)
+
+        executor.executar(loja.exportar_sugestao, caminho, ao_concluir=concluir, ao_falhar=mostrar_falha)
+
+    tk.Button(frame_ponto, text="Definir para o selecionado", command=definir_ponto).pack(side=tk.LEFT, padx=5)
+    tk.Button(frame_ponto, text="Exportar sugestão de compra", command=exportar_sugestao).pack(side=tk.LEFT, padx=5)
+
+    def mostrar(situacao):
+        if not janela.winfo_exists():
+            return
+        abaixo, urgentes, alertas = situacao
+        rotulo_resumo.config(text=f"{abaixo} produtos no ponto de reposição ou abaixo")
+        linhas = [f"  {'ID':>7} {'Estoque':>8} {'Ponto':>6}  Nome"]
+        linhas += [formatar_reposicao(*produto) for produto in urgentes]
+        linhas += ["", "Alertas recentes:"]
+        linhas += [f"{formatar_data(instante)}  ID {produto_id} {nome}: {quantidade} (ponto {ponto})"
+                   for instante, produto_id, nome, quantidade, ponto in alertas]
+        texto.config(state=tk.NORMAL)
+        texto.delete('1.0', tk.END)
+        texto.insert(tk.END, '\n'.join(linhas))
+        texto.config(state=tk.DISABLED)
+        janela.after(INTERVALO_REPOSICAO_MS, atualizar)
+
+    def falhar(erro):
+        if not janela.winfo_exists():
+            return
+        rotulo_resumo.config(text=f"Falha ao ler a reposição: {erro}")
+        janela.after(INTERVALO_REPOSICAO_MS, atualizar)
+
+    # A leitura roda no executor; a próxima só é agendada quando a anterior termina
+    def atualizar():
+        if janela.winfo_exists():
+            executor.executar(monitor_reposicao.situacao, LIMITE_PAINEL_REPOSICAO, ao_concluir=mostrar, ao_falhar=falhar)
+
+    atualizar()
 
 # Função para gerar o relatório em Excel com gráfico
+# A geração roda numa thread de trabalho com progresso e pode ser cancelada.
 def gerar_relatorio():
-    produtos = carregar_produtos()
-    if not produtos:
+    if cache_produtos.total() == 0:
         messagebox.showwarning("Aviso", "Nenhum produto disponível para gerar relatório.")
         return
 
-    dados = {
-        "Produto": [],
-        "Quantidade Atual": [],
-        "Quantidade Vendida": []
-    }
-
-    for produto in produtos:
-        produto_id = produto[0]
-        nome = produto[1]
-        quantidade_atual = produto[3]
+    janela, atualizar_progresso = abrir_janela_progresso("Gerando relatório", lambda: tarefa.cancelar())
 
-        # Simulação de quantidades vendidas para o relatório
-        quantidade_vendida = max(0, 15 - quantidade_atual)  # Exemplo de cálculo de vendas
+    def concluir(caminhos):
+        janela.destroy()
+        messagebox.showinfo("Sucesso", "Relatório gerado com sucesso!")
+        exibir_grafico(caminhos[1])
 
-        dados["Produto"].append(nome)
-        dados["Quantidade Atual"].append(quantidade_atual)
-        dados["Quantidade Vendida"].append(quantidade_vendida)
+    def falhar(erro):
+        janela.destroy()
+        messagebox.showerror("Erro", f"Falha ao gerar o relatório: {erro}")
 
-    df = pd.DataFrame(dados)
-    df.to_excel("relatorio_estoque.xlsx", index=False)
+    def cancelar():
+        janela.destroy()
+        messagebox.showinfo("Aviso", "Geração do relatório cancelada.")
 
-    # Gerar gráfico
-    df.plot(x="Produto", y=["Quantidade Atual", "Quantidade Vendida"], kind="bar")
-    plt.title("Relatório de Estoque")
-    plt.ylabel("Quantidade")
-    plt.savefig("relatorio_estoque.png")
-    plt.show()
-
-    messagebox.showinfo("Sucesso", "Relatório gerado com sucesso!")
+    tarefa = executor.executar(
+        loja.gerar_relatorio,
+        ao_concluir=concluir, ao_falhar=falhar, ao_progresso=atualizar_progresso, ao_cancelar=cancelar,
+        com_tarefa=True,
+    )
 
 # Função para abrir a janela de simulação de vendas
 def abrir_janela_simular_venda():
@@ -621,40 +444,55 @@ def abrir_janela_simular_venda():
 # Função para simular uma venda
 def simular_venda(quantidade_venda):
     try:
-        selecionado = lista_produtos.curselection()[0]
-        produto_id = carregar_produtos()[selecionado][0]
+        produto_id = lista_produtos.produto_selecionado()
     except IndexError:
         messagebox.showwarning("Aviso", "Nenhum produto selecionado!")
         return
 
-    conn = conectar_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT quantidade FROM produtos WHERE id = ?', (produto_id,))
-    quantidade_atual = cursor.fetchone()[0]
-
-    if quantidade_venda > quantidade_atual:
-        messagebox.showwarning("Aviso", "Quantidade vendida é maior que a disponível!")
+    if quantidade_venda <= 0:
+        messagebox.showerror("Erro", "Por favor, insira um número válido.")
         return
 
-    nova_quantidade = quantidade_atual - quantidade_venda
-    cursor.execute('UPDATE produtos SET quantidade = ? WHERE id = ?', (nova_quantidade, produto_id))
-    conn.commit()
-
-    # Adiciona ao histórico
-    adicionar_historico(produto_id, "Venda simulada", quantidade_atual, nova_quantidade, cursor.execute('SELECT preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()[0], cursor.execute('SELECT preco FROM produtos WHERE id = ?', (produto_id,)).fetchone()[0])
-
-    conn.close()
-
-    atualizar_lista_produtos()
-    messagebox.showinfo("Sucesso", "Venda simulada com sucesso!")
-
-# Inicialização do banco de dados e criação da tabela
-criar_tabela()
+    def concluir(resultado):
+        # No modo de gravação 'atraso' (gravador.py) chega um Future: a confirmação espera o
+        # lote ser gravado numa thread de trabalho, não na do Tk
+        if isinstance(resultado, Future):
+            executor.executar(resultado.result, ao_concluir=concluir, ao_falhar=mostrar_falha)
+            return
+        lista_produtos.produto_alterado(produto_id)
+        messagebox.showinfo("Sucesso", "Venda simulada com sucesso!")
+
+    # Baixa o estoque e adiciona ao histórico numa única transação
+    executor.executar(loja.registrar_movimento, produto_id, -quantidade_venda, ACAO_VENDA, ao_concluir=concluir, ao_falhar=mostrar_falha)
+
+# Com o serviço de estoque configurado (estoque.py --servico ou ESTOQUE_SERVICO) a interface
+# é um terminal cliente: escritas e leituras passam pelo serviço, que é o dono do banco
+servico = cliente.conectar_servico()
+if servico is None:
+    # Inicialização do banco de dados e criação da tabela
+    criar_tabela()
+
+    # Cache dos produtos em memória, mantido pelas funções de escrita
+    cache_produtos = CacheProdutos()
+    loja = cliente.OperacoesLocais()
+
+    # Produtos perto do ponto de reposição, reavaliados a cada escrita
+    monitor_reposicao = MonitorReposicao()
+    monitor_reposicao.carregar()
+else:
+    # As páginas da lista e o painel de reposição vêm da memória do serviço
+    cache_produtos = servico
+    loja = servico
+    monitor_reposicao = servico
+cache_produtos.carregar()
 
 # Configuração da interface gráfica
 root = tk.Tk()
 root.title("Controle de Estoque")
 
+# Threads de trabalho para banco e relatórios; os resultados voltam pelo root.after
+executor = ExecutorTarefas(root)
+
 # Frame para os controles
 frame_controles = tk.Frame(root)
 frame_controles.pack(pady=10)
@@ -698,13 +536,53 @@ btn_relatorio.grid(row=3, column=4, padx=5, pady=5)
 btn_simular_venda = tk.Button(frame_controles, text="Simular Venda", command=abrir_janela_simular_venda)
 btn_simular_venda.grid(row=3, column=5, padx=5, pady=5)
 
-# Listbox para exibir produtos
-lista_produtos = tk.Listbox(root, width=70, height=15)  # Ajustado para maior largura
+# Botão Estatísticas
+btn_estatisticas = tk.Button(frame_controles, text="Estatísticas", command=exibir_estatisticas)
+btn_estatisticas.grid(row=3, column=6, padx=5, pady=5)
+
+# Botão Reposição (mostra quantos produtos estão no ponto ou abaixo)
+btn_reposicao = tk.Button(frame_controles, text="Reposição", command=exibir_reposicao)
+btn_reposicao.grid(row=3, column=7, padx=5, pady=5)
+
+# Frame para a busca e os filtros
+frame_busca = tk.Frame(root)
+frame_busca.pack(pady=5)
+
+tk.Label(frame_busca, text="Buscar:").grid(row=0, column=0, padx=5, pady=5)
+entry_busca = tk.Entry(frame_busca, width=30)
+entry_busca.grid(row=0, column=1, padx=5, pady=5)
+
+tk.Label(frame_busca, text="Preço de:").grid(row=0, column=2, padx=5, pady=5)
+entry_preco_min = tk.Entry(frame_busca, width=8)
+entry_preco_min.grid(row=0, column=3, padx=5, pady=5)
+
+tk.Label(frame_busca, text="até:").grid(row=0, column=4, padx=5, pady=5)
+entry_preco_max = tk.Entry(frame_busca, width=8)
+entry_preco_max.grid(row=0, column=5, padx=5, pady=5)
+
+var_estoque_baixo = tk.BooleanVar()
+tk.Checkbutton(frame_busca, text="Estoque baixo", variable=var_estoque_baixo, command=agendar_busca).grid(row=0, column=6, padx=5, pady=5)
+
+for entrada in (entry_busca, entry_preco_min, entry_preco_max):
+    entrada.bind('<KeyRelease>', agendar_busca)
+
+# Listbox virtualizada para exibir produtos
+lista_produtos = ListaVirtual(root, cache_produtos, formatar_produto, altura=15, largura=70)  # Ajustado para maior largura
 lista_produtos.pack(pady=10)
 
 # Carregar produtos no início
 atualizar_lista_produtos()
+root.after(INTERVALO_VERIFICACAO_MS, verificar_alteracoes_externas)
+root.after(INTERVALO_REPOSICAO_MS, atualizar_indicador_reposicao)
 
 # Removido o preenchimento de itens iniciais
 
 root.mainloop()
+
+executor.encerrar()
+if 'gravador' in sys.modules:
+    sys.modules['gravador'].encerrar_gravacao()
+cache_produtos.fechar()
+if servico is None:
+    monitor_reposicao.fechar()
+fechar_conexoes()
@@ -0,0 +1,278 @@
+# Serviço local de estoque: um único processo é dono do banco e atende vários terminais
+# (interface ou linha de comando em modo cliente, ver cliente.py) por TCP em localhost.
+#
+# - Escritas entram numa fila única; um escritor tira da fila tudo o que estiver esperando
+#   (até LOTE_ESCRITA pedidos) e aplica numa só transação (gravação em grupo). Um pedido
+#   recusado (ex.: estoque insuficiente) não desfaz os outros do lote.
+# - Leituras de produtos vêm do CacheProdutos em memória, atualizado a cada COMMIT.
+# - Buscas, histórico e relatórios rodam num pool de threads de leitura (WAL permite ler
+#   enquanto o escritor grava).
+# - Os clientes perguntam por "alteracoes" para saber se a lista precisa ser relida.
+# - O painel de reposição ("reposicao") vem do MonitorReposicao, também em memória.
+
+import asyncio
+import json
+import os
+import signal
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+import banco
+import busca
+import cliente
+import historico
+import reposicao
+from cache_produtos import CacheProdutos
+
+# Pedidos de escrita aplicados por transação
+LOTE_ESCRITA = 256
+
+# Threads para as consultas que vão ao banco
+THREADS_LEITURA = 4
+
+# Tamanho máximo de uma linha do protocolo (lotes de vendas grandes)
+LIMITE_LINHA = 64 * 2 ** 20
+
+# Intervalo para conferir se outro processo alterou o banco por fora do serviço
+INTERVALO_VERIFICACAO = 2.0
+
+# Quantas versões recentes ficam guardadas para responder "alteracoes"
+VERSOES_GUARDADAS = 1000
+
+# Escritas aceitas pelo serviço; cadastro e edição validam os campos como a interface
+def criar_produto(nome, preco, quantidade):
+    return banco.criar_produto(*banco.validar_produto(nome, preco, quantidade))
+
+def editar_produto(produto_id, nome, preco, quantidade):
+    return banco.editar_produto(produto_id, *banco.validar_produto(nome, preco, quantidade))
+
+ESCRITAS = {
+    'criar_produto': criar_produto,
+    'editar_produto': editar_produto,
+    'excluir_produto': banco.excluir_produto,
+    'registrar_movimento': banco.registrar_movimento,
+    'registrar_vendas_em_lote': banco.registrar_vendas_em_lote,
+    'definir_ponto_reposicao': banco.definir_ponto_reposicao,
+}
+
+# Consultas ao banco; argumentos None ficam com o padrão da função local
+def buscar_produtos(termo='', preco_min=None, preco_max=None, estoque_max=None, limite=None):
+    return busca.buscar_produtos(termo, preco_min, preco_max, estoque_max, limite or busca.LIMITE_RESULTADOS)
+
+def gerar_relatorio(caminho_saida, formato, caminho_png, periodo, inicio, fim, grafico, limite_grafico, produto_id):
+    import relatorio
+
+    opcoes = {'caminho_png': caminho_png, 'limite_grafico': limite_grafico}
+    caminhos, png = relatorio.gerar_relatorio(
+        caminho_saida, formato, periodo=periodo, inicio=inicio, fim=fim, grafico=grafico, produto_id=produto_id,
+        **{nome: valor for nome, valor in opcoes.items() if valor is not None},
+    )
+    return [os.path.abspath(caminho) for caminho in caminhos], os.path.abspath(png) if png else None
+
+def pagina_historico(produto_id, inicio, fim, posicao, limite, apos=None):
+    return historico.pagina_historico(produto_id, inicio, fim, posicao, limite, tuple(apos) if apos else None)
+
+CONSULTAS = {
+    'buscar_produtos': buscar_produtos,
+    'contar_historico': historico.contar_historico,
+    'pagina_historico': pagina_historico,
+    'exportar_historico': historico.exportar_historico,
+    'gerar_relatorio': gerar_relatorio,
+    'exportar_sugestao': reposicao.exportar_sugestao,
+}
+
+class ServicoEstoque:
+    def __init__(self, lote=LOTE_ESCRITA):
+        self.lote = lote
+        self.escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='estoque-escrita')
+        self.leitores = ThreadPoolExecutor(max_workers=THREADS_LEITURA, thread_name_prefix='estoque-leitura')
+        self.cache = CacheProdutos()
+        self.monitor = reposicao.MonitorReposicao()
+        self.fila = None
+        self.servidor = None
+        self.tarefas = []
+
+        # Versão das alterações: sobe a cada COMMIT com produtos alterados
+        self.trava_versao = threading.Lock()
+        self.versao = 0
+        self.versoes = deque(maxlen=VERSOES_GUARDADAS)
+
+        # Leituras servidas do cache, respondidas direto na thread do asyncio
+        self.leituras = {
+            'total': self.cache.total,
+            'produto': self.cache.produto,
+            'pagina': self.cache.pagina,
+            'alteracoes': self.alteracoes_desde,
+            'reposicao': self.monitor.situacao,
+        }
+
+    # Observador do módulo banco (roda na thread do escritor, após o COMMIT)
+    def registrar_versao(self, caminho, alteracoes):
+        with self.trava_versao:
+            self.versao += 1
+            self.versoes.append((self.versao, list(alteracoes)))
+
+    # Versão atual e os produtos alterados depois de "versao" (None = releia tudo)
+    def alteracoes_desde(self, versao=None):
+        with self.trava_versao:
+            if versao is None or versao == self.versao:
+                return self.versao, []
+            if not self.versoes or versao < self.versoes[0][0] - 1:
+                return self.versao, None
+            ids = {produto_id for numero, alterados in self.versoes if numero > versao for produto_id in alterados}
+            return self.versao, sorted(ids)
+
+    async def iniciar(self, host, porta):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.escritor, banco.criar_tabela)
+        await loop.run_in_executor(self.leitores, self.cache.carregar)
+        await loop.run_in_executor(self.leitores, self.monitor.carregar)
+        banco.observar_produtos(self.registrar_versao)
+
+        self.fila = asyncio.Queue()
+        self.tarefas = [asyncio.create_task(self.escrever()), asyncio.create_task(self.vigiar_banco())]
+        self.servidor = await asyncio.start_server(self.atender, host, porta, limit=LIMITE_LINHA)
+        return self.servidor.sockets[0].getsockname()[:2]
+
+    # Para de aceitar conexões, grava o que estiver na fila e libera o banco
+    async def encerrar(self):
+        self.servidor.close()
+        await self.servidor.wait_closed()
+        await self.fila.put(None)
+        await self.tarefas[0]
+        self.tarefas[1].cancel()
+
+        banco.remover_observador(self.registrar_versao)
+        self.leitores.shutdown(wait=True)
+        self.escritor.shutdown(wait=True)
+        self.cache.fechar()
+        self.monitor.fechar()
+        banco.fechar_conexoes()
+
+    # Escritor único: junta os pedidos que estiverem na fila e grava numa transação
+    async def escrever(self):
+        loop = asyncio.get_running_loop()
+        encerrar = False
+        while not encerrar:
+            pedidos = [await self.fila.get()]
+            while len(pedidos) < self.lote and not self.fila.empty():
+                pedidos.append(self.fila.get_nowait())
+            if None in pedidos:
+                encerrar = True
+                pedidos = [pedido for pedido in pedidos if pedido is not None]
+            if not pedidos:
+                continue
+
+            try:
+                resultados = await loop.run_in_executor(self.escritor, self.aplicar_lote, pedidos)
+            except Exception as erro:
+                resultados = [(False, erro)] * len(pedidos)
+
+            for (_, _, futuro), (sucesso, valor) in zip(pedidos, resultados):
+                if futuro.done():
+                    continue
+                if sucesso:
+                    futuro.set_result(valor)
+                else:
+                    futuro.set_exception(valor)
+
+    # Roda na thread do escritor: um COMMIT para o lote inteiro
+    # Vendas e movimentos seguidos são gravados juntos por banco.aplicar_movimentos; os
+    # demais pedidos (e os movimentos, se o grupo falhar inteiro) usam um SAVEPOINT cada.
+    def aplicar_lote(self, pedidos):
+        resultados = []
+        with banco.transacao():
+            for funcao, grupo in groupby(pedidos, key=lambda pedido: pedido[0]):
+                grupo = list(grupo)
+                if funcao is banco.registrar_movimento and len(grupo) > 1:
+                    try:
+                        with banco.ponto_salvamento():
+                            movimentos = banco.aplicar_movimentos(args for _, args, _ in grupo)
+                        resultados.extend((not isinstance(resultado, Exception), resultado) for resultado in movimentos)
+                        continue
+                    except Exception:
+                        pass
+
+                for _, args, _ in grupo:
+                    try:
+                        with banco.ponto_salvamento():
+                            resultados.append((True, funcao(*args)))
+                    except Exception as erro:
+                        resultados.append((False, erro))
+        return resultados
+
+    # Recarrega o cache se outro processo (ex.: uma importação) alterou o arquivo do banco
+    async def vigiar_banco(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(INTERVALO_VERIFICACAO)
+            await loop.run_in_executor(self.leitores, self.monitor.validar)
+            if await loop.run_in_executor(self.leitores, self.cache.validar):
+                self.registrar_versao(banco.CAMINHO_DB, {})
+                with self.trava_versao:
+                    self.versoes.clear()
+
+    async def executar(self, operacao, args):
+        if operacao in self.leituras:
+            return self.leituras[operacao](*args)
+        if operacao in ESCRITAS:
+            futuro = asyncio.get_running_loop().create_future()
+            await self.fila.put((ESCRITAS[operacao], args, futuro))
+            return await futuro
+        if operacao in CONSULTAS:
+            return await asyncio.get_running_loop().run_in_executor(self.leitores, CONSULTAS[operacao], *args)
+        raise ValueError(f"Operação desconhecida: {operacao}")
+
+    # Atende um terminal: uma linha JSON por pedido, respondida na ordem em que chegou
+    # Pedidos malformados recebem uma resposta de erro e a conexão continua aberta.
+    async def atender(self, leitor, escritor):
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                resposta = {'id': None}
+                try:
+                    pedido = ler_pedido(linha)
+                    resposta['id'] = pedido.get('id')
+                    resposta['resultado'] = await self.executar(pedido['op'], pedido.get('args', []))
+                except Exception as erro:
+                    resposta['erro'], resposta['dados'] = cliente.codificar_erro(erro)
+                escritor.write(json.dumps(resposta, ensure_ascii=False).encode() + b'\n')
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            escritor.close()
+
+# Função para interpretar uma linha do protocolo: objeto JSON com "op" (texto) e "args" (lista)
+def ler_pedido(linha):
+    try:
+        pedido = json.loads(linha)
+    except ValueError:
+        raise ValueError("Pedido não é JSON válido") from None
+    if not isinstance(pedido, dict) or not isinstance(pedido.get('op'), str) or not isinstance(pedido.get('args', []), list):
+        raise ValueError("Pedido deve ser um objeto JSON com \"op\" (texto) e \"args\" (lista)")
+    return pedido
+
+# Função para rodar o serviço até receber SIGINT/SIGTERM
+# "ao_iniciar" (opcional) recebe o endereço (host, porta) quando o serviço está pronto.
+async def servir(host=cliente.HOST_PADRAO, porta=cliente.PORTA_PADRAO, lote=LOTE_ESCRITA, ao_iniciar=None):
+    servico = ServicoEstoque(lote)
+    endereco = await servico.iniciar(host, porta)
+    if ao_iniciar is not None:
+        ao_iniciar(endereco)
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sinal, parar.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await parar.wait()
+    finally:
+        await servico.encerrar()
@@ -0,0 +1,87 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Intervalo com que a thread do Tk confere o andamento das tarefas
+INTERVALO_ACOMPANHAMENTO_MS = 50
+
+# Erro lançado dentro de uma tarefa quando o usuário pede o cancelamento
+class TarefaCancelada(Exception):
+    def __init__(self):
+        super().__init__("Operação cancelada.")
+
+# Tarefa em execução numa thread de trabalho: recebe pedidos de cancelamento e
+# publica o progresso numa fila lida pela thread do Tk.
+class Tarefa:
+    def __init__(self):
+        self.evento_cancelar = threading.Event()
+        self.fila_progresso = queue.SimpleQueue()
+        self.future = None
+
+    def cancelar(self):
+        self.evento_cancelar.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelada(self):
+        return self.evento_cancelar.is_set()
+
+    # Chamado pela tarefa entre as etapas para interromper o trabalho se cancelada
+    def verificar_cancelamento(self):
+        if self.cancelada():
+            raise TarefaCancelada()
+
+    # Chamado pela tarefa: fração de 0 a 1 e uma mensagem curta
+    def informar_progresso(self, fracao, mensagem=""):
+        self.fila_progresso.put((fracao, mensagem))
+
+# Executor que roda funções fora da thread do Tk e devolve o resultado pelo root.after,
+# então os callbacks podem mexer nos widgets com segurança.
+# Cada thread de trabalho usa a própria conexão SQLite (banco.conectar_db é por thread).
+class ExecutorTarefas:
+    def __init__(self, root, max_threads=2):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='estoque')
+        self.tarefas = set()
+
+    # Agenda "funcao(*args)" numa thread de trabalho; com com_tarefa=True a função recebe a
+    # Tarefa no argumento nomeado "tarefa" para informar progresso e checar cancelamento.
+    # Os callbacks rodam na thread do Tk: ao_concluir(resultado), ao_falhar(erro),
+    # ao_progresso(fracao, mensagem) e ao_cancelar().
+    def executar(self, funcao, *args, ao_concluir=None, ao_falhar=None, ao_progresso=None, ao_cancelar=None, com_tarefa=False):
+        tarefa = Tarefa()
+        kwargs = {'tarefa': tarefa} if com_tarefa else {}
+        tarefa.future = self.pool.submit(funcao, *args, **kwargs)
+        self.tarefas.add(tarefa)
+        self.root.after(INTERVALO_ACOMPANHAMENTO_MS, self.acompanhar, tarefa, ao_concluir, ao_falhar, ao_progresso, ao_cancelar)
+        return tarefa
+
+    def acompanhar(self, tarefa, ao_concluir, ao_falhar, ao_progresso, ao_cancelar):
+        while True:
+            try:
+                fracao, mensagem = tarefa.fila_progresso.get_nowait()
+            except queue.Empty:
+                break
+            if ao_progresso is not None:
+                ao_progresso(fracao, mensagem)
+
+        future = tarefa.future
+        if not future.done():
+            self.root.after(INTERVALO_ACOMPANHAMENTO_MS, self.acompanhar, tarefa, ao_concluir, ao_falhar, ao_progresso, ao_cancelar)
+            return
+
+        self.tarefas.discard(tarefa)
+        if future.cancelled() or isinstance(future.exception(), TarefaCancelada):
+            if ao_cancelar is not None:
+                ao_cancelar()
+        elif future.exception() is not None:
+            if ao_falhar is not None:
+                ao_falhar(future.exception())
+        elif ao_concluir is not None:
+            ao_concluir(future.result())
+
+    # Cancela o que estiver pendente e espera as tarefas em andamento terminarem
+    def encerrar(self):
+        for tarefa in list(self.tarefas):
+            tarefa.cancelar()
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,20 @@
+# Testes com pytest, rodados da pasta do projeto: python -m pytest -q
+# Cada teste usa um banco novo numa pasta temporária.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banco  # noqa: E402
+
+# Banco temporário já migrado; as conexões são fechadas no fim do teste
+@pytest.fixture
+def banco_temporario(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'mercadinho.db')
+    monkeypatch.setattr(banco, 'CAMINHO_DB', caminho)
+    banco.criar_tabela()
+    yield caminho
+    banco.fechar_conexoes()
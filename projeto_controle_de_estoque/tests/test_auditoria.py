@@ -0,0 +1,54 @@
+import auditoria
+import banco
+
+DIA = 86400
+
+# Função para montar um histórico com datas conhecidas: a movimentação de id N fica N dias
+# depois de "base" (30 dias atrás). Retorna base.
+def popular():
+    primeiro = banco.criar_produto("Arroz", 20.0, 10)
+    segundo = banco.criar_produto("Feijão", 8.0, 5)
+    banco.registrar_movimento(primeiro, -3, banco.ACAO_VENDA)
+    banco.excluir_produto(segundo)
+    base = banco.agora() - 30 * DIA
+    with banco.transacao() as conn:
+        conn.execute('UPDATE historico SET data_movimentacao = ? + id * ?', (base, DIA))
+    return base
+
+def test_estoque_em_cada_data(banco_temporario):
+    base = popular()
+    banco.registrar_movimento(1, -2, banco.ACAO_VENDA)
+
+    assert auditoria.estoque_em(base) == {}
+    assert auditoria.estoque_em(base + DIA) == {1: 10}
+    assert auditoria.estoque_em(base + 2 * DIA + 3600) == {1: 10, 2: 5}
+    assert auditoria.estoque_em(base + 3 * DIA) == {1: 7, 2: 5}
+    assert auditoria.estoque_em(base + 4 * DIA) == {1: 7}
+    assert auditoria.estoque_em(banco.agora()) == {1: 5}
+    assert auditoria.estoque_em(base + 3 * DIA, produto_id=2) == {2: 5}
+
+# O retrato só encurta a leitura: as respostas são as mesmas de antes dele
+def test_retrato_nao_muda_o_estoque_em(banco_temporario):
+    base = popular()
+    instantes = [base + dias * DIA for dias in range(6)]
+    antes = [auditoria.estoque_em(instante) for instante in instantes]
+
+    assert auditoria.tirar_snapshot() is not None
+    assert auditoria.tirar_snapshot() is None
+    banco.registrar_movimento(1, 4, "Entrada")
+
+    assert [auditoria.estoque_em(instante) for instante in instantes] == antes
+    assert auditoria.estoque_em(banco.agora()) == {1: 11}
+
+def test_verificar_estoque(banco_temporario):
+    popular()
+    assert auditoria.verificar_estoque() == []
+    auditoria.tirar_snapshot()
+
+    # Alteração direta no banco, sem histórico
+    with banco.transacao() as conn:
+        conn.execute('UPDATE produtos SET quantidade = 50 WHERE id = 1')
+    for desde_snapshot in (False, True):
+        assert auditoria.verificar_estoque(desde_snapshot) == [
+            auditoria.Divergencia(1, None, 7, 50, auditoria.MOTIVO_ESTOQUE),
+        ]
@@ -0,0 +1,98 @@
+from concurrent.futures import CancelledError, Future
+
+import pytest
+
+import banco
+import gravador
+
+def quantidades():
+    return dict(banco.conectar_db().execute('SELECT id, quantidade FROM produtos'))
+
+def vendas_gravadas():
+    return banco.conectar_db().execute('SELECT COUNT(*) FROM historico WHERE acao = ?', (banco.ACAO_VENDA,)).fetchone()[0]
+
+# Com um prazo longo, os movimentos ficam na fila até o descarregar()
+def test_cancelar_antes_da_gravacao(banco_temporario):
+    produto_id = banco.criar_produto("Arroz", 20.0, 10)
+    grav = gravador.GravadorMovimentos('atraso', atraso_maximo=30)
+    try:
+        primeiro = grav.registrar_movimento(produto_id, -2, banco.ACAO_VENDA)
+        cancelado = grav.registrar_movimento(produto_id, -3, banco.ACAO_VENDA)
+        ultimo = grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA)
+        assert cancelado.cancel()
+
+        grav.descarregar()
+
+        assert primeiro.result(0) == 8
+        assert ultimo.result(0) == 7
+        with pytest.raises(CancelledError):
+            cancelado.result(0)
+        assert quantidades() == {produto_id: 7}
+        assert vendas_gravadas() == 2
+
+        # A thread gravadora segue atendendo depois do lote com o movimento cancelado
+        seguinte = grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA)
+        grav.descarregar()
+        assert seguinte.result(0) == 6
+    finally:
+        grav.fechar()
+
+def test_fechar_grava_a_fila(banco_temporario):
+    produto_id = banco.criar_produto("Arroz", 20.0, 10)
+    grav = gravador.GravadorMovimentos('atraso', atraso_maximo=30)
+    futuros = [grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA) for _ in range(4)]
+    assert not any(futuro.done() for futuro in futuros)
+
+    grav.fechar()
+
+    assert [futuro.result(0) for futuro in futuros] == [9, 8, 7, 6]
+    assert quantidades() == {produto_id: 6}
+    with pytest.raises(gravador.GravadorEncerrado):
+        grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA)
+
+def test_modo_commit_devolve_quantidade_ou_erro(banco_temporario):
+    produto_id = banco.criar_produto("Arroz", 20.0, 2)
+    grav = gravador.GravadorMovimentos('commit')
+    try:
+        assert grav.registrar_movimento(produto_id, -2, banco.ACAO_VENDA) == 0
+        with pytest.raises(banco.EstoqueInsuficiente):
+            grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA)
+        with pytest.raises(banco.ProdutoNaoEncontrado):
+            grav.registrar_movimento(999, -1, banco.ACAO_VENDA)
+        assert grav.registrar_movimento(produto_id, 5, "Entrada") == 5
+    finally:
+        grav.fechar()
+
+# Uma falha inesperada na gravação vai para os Futures do lote, sem derrubar a thread
+def test_falha_no_lote_nao_encerra_o_gravador(banco_temporario, monkeypatch):
+    produto_id = banco.criar_produto("Arroz", 20.0, 10)
+    aplicar_movimentos = banco.aplicar_movimentos
+    falhas = [RuntimeError("disco cheio")]
+
+    def aplicar_com_falha(movimentos):
+        if falhas:
+            raise falhas.pop()
+        return aplicar_movimentos(movimentos)
+
+    monkeypatch.setattr(banco, 'aplicar_movimentos', aplicar_com_falha)
+    grav = gravador.GravadorMovimentos('atraso', atraso_maximo=0)
+    try:
+        with pytest.raises(RuntimeError):
+            grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA).result(5)
+        assert grav.registrar_movimento(produto_id, -1, banco.ACAO_VENDA).result(5) == 9
+    finally:
+        grav.fechar()
+
+# Vendas locais (cliente.OperacoesLocais) no modo 'atraso': Future na hora, gravadas no encerrar
+def test_encerrar_gravacao_descarrega(banco_temporario):
+    produto_id = banco.criar_produto("Arroz", 20.0, 10)
+    gravador.configurar_gravacao('atraso')
+    try:
+        resultados = [gravador.registrar_movimento(produto_id, -1, banco.ACAO_VENDA) for _ in range(3)]
+        assert all(isinstance(resultado, Future) for resultado in resultados)
+    finally:
+        gravador.configurar_gravacao('direto')
+
+    assert [gravador.quantidade(resultado) for resultado in resultados] == [9, 8, 7]
+    assert vendas_gravadas() == 3
+    assert gravador.registrar_movimento(produto_id, -1, banco.ACAO_VENDA) == 6
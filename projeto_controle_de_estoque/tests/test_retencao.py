@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import auditoria
+import banco
+import retencao
+
+DIA = 86400
+
+# Função para cadastrar três produtos com vendas antigas (entre 460 e 390 dias atrás,
+# em meses diferentes) e vendas recentes. Retorna quantas movimentações são antigas.
+def popular(vendas_antigas, vendas_recentes):
+    ids = [banco.criar_produto(f"Produto {numero}", 2.5, 100) for numero in range(3)]
+    for indice, quantidade in vendas_antigas:
+        banco.registrar_movimento(ids[indice], -quantidade, banco.ACAO_VENDA)
+    with banco.transacao() as conn:
+        conn.execute('UPDATE historico SET data_movimentacao = data_movimentacao - (460 - 7 * id) * ?', (DIA,))
+        antigas = conn.execute('SELECT COUNT(*) FROM historico').fetchone()[0]
+    for indice, quantidade in vendas_recentes:
+        banco.registrar_movimento(ids[indice], -quantidade, banco.ACAO_VENDA)
+    return antigas
+
+# Função para tirar o estoque em alguns instantes antes, durante e depois do trecho antigo
+def retratos():
+    agora = banco.agora()
+    return {dias: auditoria.estoque_em(agora - dias * DIA) for dias in (500, 440, 420, 400, 300, 0)}
+
+def test_compactar_mantem_estoque_em_e_arquivo(banco_temporario):
+    antigas = popular([(0, 5), (1, 3), (0, 2), (2, 7), (1, 1), (0, 4)], [(0, 1), (2, 2)])
+    antes = retratos()
+
+    resultado = retencao.compactar(dias=365, lote=4)
+
+    assert resultado['arquivadas'] == antigas
+    assert banco.conectar_db().execute('SELECT COUNT(*) FROM historico').fetchone()[0] == 2
+    assert retratos() == antes
+    assert retencao.diretorio_arquivo() == os.path.join(os.path.dirname(banco_temporario), 'mercadinho_arquivo')
+    assert len(retencao.listar_arquivos()) >= 2
+    assert [linha[0] for linha in retencao.ler_arquivo()] == list(range(1, antigas + 1))
+    assert [linha[4] for linha in retencao.ler_arquivo(produto_id=1)] == [100, 95, 93, 89]
+
+def test_dois_bancos_compactados_da_mesma_pasta(banco_temporario, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    lojas = {'a': str(tmp_path / 'a' / 'loja.db'), 'b': str(tmp_path / 'b' / 'loja.db')}
+    antes = {}
+    for nome, caminho in lojas.items():
+        os.makedirs(os.path.dirname(caminho))
+        with banco.usar_banco(caminho):
+            banco.criar_tabela()
+            vendas = [(0, 5), (1, 3)] if nome == 'a' else [(2, 1), (2, 1), (1, 9)]
+            popular(vendas, [(0, 1)])
+            antes[nome] = retratos()
+            retencao.compactar(dias=365)
+
+    # Lidos de outra pasta de trabalho, cada banco continua com o seu próprio arquivo
+    outra = tmp_path / 'outra'
+    outra.mkdir()
+    monkeypatch.chdir(outra)
+    for nome, caminho in lojas.items():
+        with banco.usar_banco(caminho):
+            assert retencao.diretorio_arquivo() == os.path.join(os.path.dirname(caminho), 'loja_arquivo')
+            assert retratos() == antes[nome]
+    with banco.usar_banco(lojas['b']):
+        assert [linha[0] for linha in retencao.ler_arquivo()] == [1, 2, 3, 4, 5, 6]
+
+def test_pasta_gravada_no_primeiro_lote(banco_temporario, tmp_path, monkeypatch):
+    popular([(0, 5)], [])
+    externo = str(tmp_path / 'discos' / 'externo')
+    monkeypatch.setattr(retencao, 'DIRETORIO_ARQUIVO', externo)
+    retencao.compactar(dias=365)
+    assert banco.conectar_db().execute('SELECT diretorio_arquivo FROM retencao_controle').fetchone()[0] == externo
+
+    # Trocar a configuração depois não muda a pasta de um banco que já arquivou
+    monkeypatch.setattr(retencao, 'DIRETORIO_ARQUIVO', None)
+    assert retencao.diretorio_arquivo() == externo
+    assert len(list(retencao.ler_arquivo())) == 4
+
+def test_arquivos_ausentes_levantam_erro(banco_temporario):
+    popular([(0, 5), (1, 3)], [(0, 1)])
+    retencao.compactar(dias=365)
+    diretorio = retencao.diretorio_arquivo()
+    os.rename(diretorio, diretorio + '_movido')
+
+    with pytest.raises(retencao.ArquivoAusente):
+        auditoria.estoque_em(banco.agora() - 420 * DIA)
+    with pytest.raises(retencao.ArquivoAusente):
+        retencao.compactar(dias=365)
+    assert not os.path.exists(diretorio)
+
+# Um banco que nunca arquivou lê o arquivo vazio sem erro
+def test_banco_sem_arquivo(banco_temporario):
+    popular([(0, 5)], [])
+    assert list(retencao.ler_arquivo()) == []
+    assert not os.path.exists(retencao.diretorio_arquivo())
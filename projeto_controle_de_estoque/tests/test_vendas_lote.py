@@ -0,0 +1,57 @@
+import banco
+import cliente
+import estoque
+
+def test_linhas_malformadas_sao_rejeitadas(banco_temporario):
+    arroz = banco.criar_produto("Arroz", 20.0, 10)
+    feijao = banco.criar_produto("Feijão", 8.0, 3)
+    linhas = [
+        (arroz, 2), 'x', (arroz,), None, ('1', 1), (True, 1), (999, 1),
+        (feijao, 0), (feijao, 'dois'), (feijao, 5), (feijao, 3), (arroz, 4),
+    ]
+
+    aplicadas, rejeitadas = banco.registrar_vendas_em_lote(linhas)
+
+    assert aplicadas == 3
+    assert [(linha.posicao, linha.motivo) for linha in rejeitadas] == [
+        (1, "Linha inválida"),
+        (2, "Linha inválida"),
+        (3, "Linha inválida"),
+        (4, "Produto inválido"),
+        (5, "Produto inválido"),
+        (6, "Produto não encontrado"),
+        (7, "Quantidade inválida"),
+        (8, "Quantidade inválida"),
+        (9, "Estoque insuficiente"),
+    ]
+    conn = banco.conectar_db()
+    assert conn.execute('SELECT id, quantidade FROM produtos ORDER BY id').fetchall() == [(arroz, 4), (feijao, 0)]
+    assert conn.execute('SELECT COUNT(*) FROM historico WHERE acao = ?', (banco.ACAO_VENDA_LOTE,)).fetchone()[0] == 3
+
+# Lote só com linhas recusadas não grava nada
+def test_lote_sem_linhas_validas(banco_temporario):
+    banco.criar_produto("Arroz", 20.0, 10)
+    assert banco.registrar_vendas_em_lote([(1, 11), [], (1, -1)]) == (0, [
+        banco.LinhaRejeitada(0, 1, 11, "Estoque insuficiente"),
+        banco.LinhaRejeitada(1, None, None, "Linha inválida"),
+        banco.LinhaRejeitada(2, 1, -1, "Quantidade inválida"),
+    ])
+    assert banco.conectar_db().execute('SELECT quantidade FROM produtos').fetchone()[0] == 10
+
+# O comando vender --arquivo informa a linha do arquivo de cada venda recusada
+def test_vender_arquivo_informa_a_linha(banco_temporario, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(cliente, 'ENDERECO_SERVICO', None)
+    banco.criar_produto("Arroz", 20.0, 10)
+    banco.criar_produto("Feijão", 8.0, 3)
+    vendas = tmp_path / 'vendas.csv'
+    vendas.write_text('produto_id,quantidade\n1,2\n\nabc,1\n2\n1,x\n2,1\n', encoding='utf-8')
+
+    assert estoque.main(['--banco', banco_temporario, 'vender', '--arquivo', str(vendas)]) == 1
+
+    assert capsys.readouterr().out.splitlines() == [
+        "2 vendas aplicadas, 3 rejeitadas",
+        "Linha 4: produto abc, quantidade 1: Produto inválido",
+        "Linha 5: produto 2, quantidade None: Quantidade inválida",
+        "Linha 6: produto 1, quantidade x: Quantidade inválida",
+    ]
+    assert banco.conectar_db().execute('SELECT quantidade FROM produtos ORDER BY id').fetchall() == [(8,), (2,)]